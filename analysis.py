@@ -0,0 +1,159 @@
+import pandas as pd
+
+from correlation import target_slice, top_correlations
+from figures import cached_figure, memory_figure
+from ingestion import category_counts, indicator_means, load_cohort_index, pair_correlation, student_counts
+from panel import split_year_column
+
+# Conteúdo das páginas de análise que depende só dos dados: usado pelas páginas
+# e pelo pacote estático (static_bundle), que geram as mesmas imagens e tabelas
+
+# Indicadores da página de análise
+PARAMETERS = ['IPV', 'INDE', 'IAA', 'IEG', 'IPS', 'IDA', 'IPP', 'IAN']
+
+# Campos de performance do ano N e targets do ano N+1 na página de correlação
+PERFORMANCE_FIELDS = ['PEDRA', 'INDE', 'IAA', 'IEG', 'IPS', 'IDA', 'IPP', 'IPV', 'IAN']
+TARGET_FIELDS = ['IPV', 'INDE', 'PEDRA', 'PONTO_VIRADA']
+
+
+# Quantidade de alunos por ano; um aluno conta num ano se tiver algum dado naquele ano.
+# Vem dos agregados anuais da ingestão, então novos anos aparecem sem reprocessar os anteriores
+def students_per_year():
+    students_count = {str(year): count for year, count in student_counts().items()}
+    return pd.DataFrame(list(students_count.items()), columns=['Year', 'Number of Students'])
+
+
+def students_figure(version):
+    """Gráfico de barras da quantidade de alunos por ano."""
+    def draw(ax):
+        students_df = students_per_year()
+        ax.bar(students_df['Year'], students_df['Number of Students'], color='skyblue')
+        ax.set_xlabel('Ano')
+        ax.set_ylabel('Número de Alunos')
+        ax.set_title('Número de Alunos por Ano')
+
+        # Adicionar os valores no topo de cada barra
+        for i, v in enumerate(students_df['Number of Students']):
+            ax.text(i, v + 5, str(v), ha='center', va='bottom', fontweight='bold')
+
+    return cached_figure('students_per_year', version, draw)
+
+
+# Os agregados só são lidos quando um gráfico precisa ser renderizado: com as imagens
+# em cache, a página abre sem recalcular nada. Sem filtros, os valores vêm dos agregados
+# anuais da ingestão; com filtros, do índice de bitmaps (só as linhas selecionadas)
+# Médias de todos os parâmetros por ano
+def create_dataframe(param, filters=None):
+    means = load_cohort_index().indicator_means(filters, PARAMETERS) if filters else indicator_means(PARAMETERS)
+    return pd.DataFrame({'Year': means.index.astype(str), f'{param}_Mean': means[param].values})
+
+
+# Manter apenas valores que aparecem mais de 5 vezes somando todos os anos (descarta códigos inválidos)
+def frequent_values(counts):
+    return counts[counts.sum(axis=1) > 5]
+
+
+# Contagem por ano dos valores válidos de um campo (os frequentes no conjunto completo)
+def filtered_counts(field, filters):
+    counts = frequent_values(category_counts(field))
+    if filters:
+        # Mesmos valores e anos do conjunto completo, com zero onde a seleção não tem ninguém
+        # (uma seleção sem nenhum valor contado ainda gera um gráfico, só com zeros)
+        counts = load_cohort_index().category_counts(field, filters).reindex(
+            index=counts.index, columns=counts.columns, fill_value=0).astype(int)
+    return counts
+
+
+# Contar a quantidade de cada pedra por ano
+def pedra_counts(filters=None):
+    counts = filtered_counts('PEDRA', filters)
+    return counts.rename_axis('Pedra').reset_index()
+
+
+# Contar a quantidade de "Sim" e "Não" para PONTO_VIRADA por ano
+def ponto_virada_counts(filters=None):
+    counts = filtered_counts('PONTO_VIRADA', filters)
+    counts.index = counts.index.astype(str)
+    counts.index.name = None
+    return counts
+
+
+def _filtered_figure(name, version, draw, filters, **params):
+    # Sem filtros, a imagem também vai para o disco (uma por versão dos dados). As combinações
+    # de filtros não têm limite: essas imagens ficam só no cache em memória, que é limitado
+    figure = memory_figure if filters else cached_figure
+    return figure(name, version, draw, filters=filters or {}, **params)
+
+
+def indicator_figure(param, version, filters=None):
+    """Média do indicador por ano (a imagem é renderizada uma vez por versão dos dados e filtros)."""
+    color = 'b' if param in ['INDE', 'IAN'] else 'g'
+
+    def draw(ax):
+        df = create_dataframe(param, filters)
+        ax.plot(df['Year'], df[f'{param}_Mean'], marker='o', linestyle='-', color=color)
+        ax.set_xlabel('Ano')
+        ax.set_ylabel(f'Média do {param}')
+        ax.set_title(f'Média do {param} por Ano')
+
+    return _filtered_figure('indicator_mean', version, draw, filters, param=param, color=color)
+
+
+def pedra_figure(version, filters=None):
+    """Quantidade de alunos em cada pedra por ano."""
+    def draw(ax):
+        pedra_counts(filters).plot(kind='bar', x='Pedra', ax=ax, alpha=0.75)
+        ax.set_title('Quantidade de alunos em cada Pedra por Ano')
+        ax.set_xlabel('Pedra')
+        ax.set_ylabel('Quantidade')
+
+    return _filtered_figure('pedra_counts', version, draw, filters)
+
+
+def ponto_virada_figure(version, filters=None):
+    """Quantidade de alunos que atingiram o Ponto de Virada por ano."""
+    def draw(ax):
+        ponto_virada_counts(filters).plot(kind='bar', ax=ax)
+        ax.set_xlabel('Resposta')
+        ax.set_ylabel('Quantidade')
+        ax.set_title('Quantidade de alunos que atingiram o Ponto de Virada por Ano')
+
+    return _filtered_figure('ponto_virada_counts', version, draw, filters)
+
+
+def correlation_columns(year):
+    """Colunas de performance do ano `year` e targets do ano seguinte."""
+    return ([f'{field}_{year}' for field in PERFORMANCE_FIELDS],
+            [f'{field}_{year + 1}' for field in TARGET_FIELDS])
+
+
+# Uma única matriz com todas as colunas, calculada uma vez por versão dos dados;
+# as matrizes de cada target são recortes dela
+def target_correlation(year):
+    performance_columns, targets = correlation_columns(year)
+    return pair_correlation(performance_columns + targets, year)
+
+
+def heatmap_title(target):
+    field, year = split_year_column(target)
+    return f"Matriz de Correlação de {field.replace('_', ' ')} {year}"
+
+
+def heatmap_figure(year, target, version):
+    """Heatmap da correlação da performance do ano `year` com um target do ano seguinte."""
+    performance_columns, _ = correlation_columns(year)
+    title = heatmap_title(target)
+
+    def draw(ax):
+        # O seaborn só é importado quando a imagem ainda não está em cache
+        import seaborn as sns
+        sns.heatmap(target_slice(target_correlation(year), performance_columns, target), annot=True, cmap='coolwarm', vmin=-1, vmax=1, ax=ax)
+        ax.set_title(title)
+
+    return cached_figure('correlation_heatmap', version, draw, figsize=(15, 10),
+                         columns=performance_columns, target=target, title=title)
+
+
+def target_top_correlations(year, target, k=7):
+    """As k maiores correlações absolutas da performance do ano `year` com o target."""
+    return top_correlations(target_correlation(year), target, k).to_frame()
@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from correlation import correlation_matrix, streaming_correlation, target_slice
+from dataset import BASE_DIR, CACHE_ROOT, SOURCES, coerce_types, dataset_version, source_path
+from figures import render_png
+from panel import ID_COLUMN, build_panel, category_counts, indicator_means, student_counts
+from scoring import predict_inde, predict_ponto_virada, score_frame
+from training import (
+    DEFAULT_ENGINE, ENGINES, classification_data, fit_classifier, fit_regressor,
+    prepare_training_frame, regression_data,
+)
+
+# Cópias ampliadas dos CSVs (geradas uma vez por versão dos dados), junto com os demais caches dos dados
+BENCHMARK_DIR = os.path.join(CACHE_ROOT, 'benchmark')
+# Resultados versionados junto com o código, para comparar execuções
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmarks')
+
+# Tamanhos relativos ao dataset atual
+SCALES = [1, 10, 100, 1000]
+# Repetições de cada etapa (a partir de 100× cada etapa roda uma vez só)
+REPEAT = 3
+# Chamadas de previsão de um aluno por vez
+SINGLE_ROW_CALLS = 200
+# Variação de tempo a partir da qual uma etapa é considerada regressão
+THRESHOLD = 1.2
+
+# Mesmas colunas da página de correlação
+CORRELATION_COLUMNS = ['PEDRA_2021', 'INDE_2021', 'IAA_2021', 'IEG_2021', 'IPS_2021', 'IDA_2021', 'IPP_2021',
+                       'IPV_2021', 'IAN_2021', 'IPV_2022', 'INDE_2022', 'PEDRA_2022', 'PONTO_VIRADA_2022']
+CORRELATION_TARGET = 'PONTO_VIRADA_2022'
+
+
+class Skipped(Exception):
+    """Etapa não executada porque uma etapa anterior falhou."""
+
+
+def scaled_copy(name, factor):
+    """
+    CSV da fonte repetido `factor` vezes, com o NOME de cada cópia alterado
+    para os alunos continuarem distintos. O arquivo é escrito cópia a cópia,
+    sem montar o DataFrame ampliado em memória.
+    """
+    if factor == 1:
+        return source_path(name)
+    _, delimiter = SOURCES[name]
+    path = os.path.join(BENCHMARK_DIR, f'{name}-{dataset_version(name)[:16]}-x{factor}.csv')
+    if os.path.exists(path):
+        return path
+    # Texto original preservado (sem conversão de ausentes) para o parse ser o mesmo do CSV real
+    base = pd.read_csv(source_path(name), delimiter=delimiter, dtype=str, keep_default_na=False)
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        for copy in range(factor):
+            chunk = base
+            if copy:
+                chunk = base.assign(**{ID_COLUMN: base[ID_COLUMN] + f'-{copy}'})
+            chunk.to_csv(f, sep=delimiter, header=copy == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def measure(func, repeat):
+    """Executa `func` `repeat` vezes; retorna o último resultado e os tempos (melhor e mediana)."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, {'seconds': min(times), 'median_seconds': statistics.median(times), 'repeat': repeat}
+
+
+def _draw_counts(counts):
+    def draw(ax):
+        ax.bar(counts.index.astype(str), counts.to_numpy(), color='skyblue')
+        ax.set_xlabel('Ano')
+        ax.set_ylabel('Número de Alunos')
+    return draw
+
+
+def _draw_heatmap(matrix):
+    import seaborn as sns
+
+    def draw(ax):
+        columns = [c for c in CORRELATION_COLUMNS if c != CORRELATION_TARGET]
+        sns.heatmap(target_slice(matrix, columns, CORRELATION_TARGET), annot=True, cmap='coolwarm',
+                    vmin=-1, vmax=1, ax=ax)
+    return draw
+
+
+def run_scale(factor, engine=DEFAULT_ENGINE, repeat=REPEAT, log=print):
+    """Mede todas as etapas em uma escala; etapas que falham são registradas com o erro."""
+    repeat = repeat if factor < 100 else 1
+    state = {}
+    results = []
+
+    def stage(name, func, rows=None, calls=1):
+        try:
+            result, timing = measure(func, repeat)
+        except Skipped:
+            results.append({'scale': factor, 'stage': name, 'skipped': True})
+            log(f'  {name:<24} pulada')
+            return None
+        except MemoryError as error:
+            results.append({'scale': factor, 'stage': name, 'error': type(error).__name__})
+            log(f'  {name:<24} {type(error).__name__}')
+            return None
+        if calls > 1:
+            timing = {key: value / calls if key != 'repeat' else value for key, value in timing.items()}
+            timing['calls'] = calls
+        row = {'scale': factor, 'stage': name, 'rows': rows(result) if callable(rows) else rows, **timing}
+        results.append(row)
+        log(f"  {name:<24} {row['seconds']:.4f}s")
+        return result
+
+    def need(*keys):
+        # Sem argumentos serve para registrar uma etapa pulada
+        if not keys or any(state.get(key) is None for key in keys):
+            raise Skipped()
+        return [state[key] for key in keys]
+
+    paths = {name: scaled_copy(name, factor) for name in SOURCES}
+
+    state['pede_raw'] = stage('csv_parse', lambda: pd.read_csv(paths['pede'], delimiter=SOURCES['pede'][1]),
+                              rows=len)
+    state['pede'] = stage('coerce_types', lambda: coerce_types(need('pede_raw')[0].copy()),
+                          rows=len)
+    state.pop('pede_raw', None)
+    state['panel'] = stage('panel_build', lambda: build_panel(need('pede')[0]), rows=len)
+
+    def aggregations():
+        panel, = need('panel')
+        counts = student_counts(panel)
+        indicator_means(panel)
+        category_counts(panel, 'PEDRA')
+        category_counts(panel, 'PONTO_VIRADA')
+        return counts
+
+    state['counts'] = stage('indicator_aggregations', aggregations, rows=lambda counts: int(counts.sum()))
+    state.pop('panel', None)
+    rows = len(state['pede']) if state['pede'] is not None else None
+    state['corr'] = stage('correlation', lambda: correlation_matrix(need('pede')[0], CORRELATION_COLUMNS), rows=rows)
+    state.pop('pede', None)
+    stage('correlation_streaming',
+          lambda: streaming_correlation(paths['pede'], CORRELATION_COLUMNS, SOURCES['pede'][1]), rows=rows)
+
+    def load_training():
+        merged = coerce_types(pd.read_csv(paths['merged'], delimiter=SOURCES['merged'][1]))
+        return prepare_training_frame(merged)
+
+    state['train'] = stage('training_frame', load_training, rows=len)
+    for key, name, data, fit_model in (('classifier', 'fit_classifier', classification_data, fit_classifier),
+                                       ('regressor', 'fit_regressor', regression_data, fit_regressor)):
+        state[key] = None
+        if state['train'] is None:
+            stage(name, need)
+            continue
+        # A preparação das features fica fora da medição do treino
+        X, y, pipeline = data(state['train'], engine)
+        fitted = stage(name, lambda: fit_model(X, y, {}, engine, pipeline), rows=len(X))
+        if fitted is not None:
+            state[key] = (fitted[0], pipeline)
+
+    def single_row():
+        classifier, regressor = need('classifier', 'regressor')
+        row = state['train'].iloc[[0]]
+        for _ in range(SINGLE_ROW_CALLS):
+            predict_ponto_virada(row, classifier)
+            predict_inde(row, regressor)
+
+    stage('predict_single_row', single_row, rows=1, calls=SINGLE_ROW_CALLS)
+    stage('predict_batch', lambda: score_frame(state['train'], *need('classifier', 'regressor')),
+          rows=len(state['train']))
+    stage('figure_render', lambda: (render_png(_draw_counts(need('counts')[0])),
+                                    render_png(_draw_heatmap(need('corr')[0]), figsize=(15, 10))))
+    # Pico de memória do processo até aqui (o Linux reporta em KB)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results, peak_mb
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import sklearn
+    return {
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'datasets': {name: dataset_version(name) for name in SOURCES},
+    }
+
+
+def run(scales=SCALES, engine=DEFAULT_ENGINE, repeat=REPEAT, log=print):
+    """Executa o benchmark em todas as escalas e retorna o relatório (serializável em JSON)."""
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'engine': engine,
+        'environment': environment(),
+        'peak_memory_mb': {},
+        'results': [],
+    }
+    for factor in scales:
+        log(f'Escala {factor}×')
+        results, peak_mb = run_scale(factor, engine, repeat, log)
+        report['results'].extend(results)
+        report['peak_memory_mb'][str(factor)] = round(peak_mb, 1)
+    return report
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """
+    Tabela de tempos da execução atual contra uma anterior (mesma etapa e
+    escala). `regressao` marca as etapas que ficaram mais lentas que o limite.
+    """
+    def timings(report):
+        return {(r['scale'], r['stage']): r['seconds'] for r in report['results'] if 'seconds' in r}
+
+    before, after = timings(baseline), timings(current)
+    rows = [
+        {'escala': scale, 'etapa': stage, 'antes_s': before[(scale, stage)], 'depois_s': seconds,
+         'razao': seconds / before[(scale, stage)] if before[(scale, stage)] else np.nan}
+        for (scale, stage), seconds in after.items() if (scale, stage) in before
+    ]
+    table = pd.DataFrame(rows, columns=['escala', 'etapa', 'antes_s', 'depois_s', 'razao'])
+    table['regressao'] = table['razao'] > threshold
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de leitura, agregação, treino e previsão.')
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES, help='tamanhos relativos ao dataset atual')
+    parser.add_argument('--engine', choices=list(ENGINES), default=DEFAULT_ENGINE)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--output', help='arquivo JSON de saída (padrão: benchmarks/<data>-<commit>.json)')
+    parser.add_argument('--compare', help='JSON de uma execução anterior para comparação')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    report = run(args.scales, args.engine, args.repeat)
+    output = args.output
+    if output is None:
+        stamp = datetime.fromisoformat(report['created_at']).strftime('%Y%m%dT%H%M%SZ')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['environment']['git_commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Resultados em {output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            table = compare(json.load(f), report, args.threshold)
+        print(table.to_string(index=False))
+        if table['regressao'].any():
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from cube import MISSING, SOURCE_FIELDS, dimension_frame, dimension_labels, member_sort_key
+from panel import INDICATORS
+
+# Campos filtráveis no painel de indicadores
+FILTER_FIELDS = ['INSTITUICAO_ENSINO_ALUNO', 'FASE', 'TURMA', 'PEDRA', 'BOLSISTA']
+
+# Campos categóricos contados por ano
+COUNTED_FIELDS = ['PEDRA', 'PONTO_VIRADA']
+
+# Colunas do painel usadas pelo índice (as demais nem são lidas)
+PANEL_COLUMNS = SOURCE_FIELDS + ['PEDRA', 'BOLSISTA', 'PONTO_VIRADA'] + INDICATORS
+
+
+class CohortIndex:
+    """
+    Índice de bitmaps do painel (aluno × ano) para filtros combinados.
+
+    Para cada valor de cada campo filtrável guarda um bitmap compactado (um bit
+    por linha, np.packbits) das linhas que têm aquele valor. Um filtro é a união
+    dos bitmaps dos valores escolhidos de um campo e a interseção entre campos,
+    operações bit a bit sobre n/8 bytes, sem montar máscaras sobre o DataFrame.
+    As agregações usam apenas as linhas selecionadas, com bincount por ano.
+    """
+
+    def __init__(self, panel, indicators=INDICATORS):
+        self.size = len(panel)
+        self.years, self.year_labels = pd.factorize(panel['ANO'].astype(int), sort=True)
+        self.indicators = [i for i in indicators if i in panel.columns]
+        self.values = panel[self.indicators].to_numpy(dtype='float64').T.copy()
+
+        dims = dimension_frame(panel)
+        fields = {field: dims[field] for field in ('INSTITUICAO_ENSINO_ALUNO', 'FASE', 'TURMA')}
+        for field in ('PEDRA', 'BOLSISTA'):
+            fields[field] = dimension_labels(panel[field]) if field in panel else pd.Series(MISSING, index=panel.index)
+        self.members = {}
+        self.bitmaps = {}
+        for field, labels in fields.items():
+            codes, members = pd.factorize(labels)
+            order = sorted(range(len(members)), key=lambda i: member_sort_key(field, members[i]))
+            self.members[field] = [members[i] for i in order]
+            self.bitmaps[field] = {members[i]: np.packbits(codes == i) for i in order}
+
+        # Códigos (-1 = ausente) dos campos contados, para as contagens por ano
+        self.counted = {}
+        for field in COUNTED_FIELDS:
+            series = panel[field].astype(object).where(panel[field].notna(), None) if field in panel else None
+            if series is not None:
+                codes, members = pd.factorize(series)
+                self.counted[field] = (codes, list(members))
+
+    def select(self, filters):
+        """Bitmap das linhas que atendem a todos os filtros ({campo: [valores]}); None = todas."""
+        selected = None
+        for field, values in (filters or {}).items():
+            if not values:
+                continue
+            bitmaps = self.bitmaps[field]
+            union = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+            for value in values:
+                if value in bitmaps:
+                    union |= bitmaps[value]
+            selected = union if selected is None else selected & union
+        return selected
+
+    def rows(self, filters):
+        """Posições das linhas selecionadas."""
+        selected = self.select(filters)
+        if selected is None:
+            return np.arange(self.size)
+        return np.flatnonzero(np.unpackbits(selected, count=self.size))
+
+    def _year_index(self, counts):
+        present = np.flatnonzero(counts)
+        return present, pd.Index(self.year_labels[present], name='ANO')
+
+    def student_counts(self, filters=None):
+        """Quantidade de alunos por ano entre as linhas selecionadas."""
+        rows = self.rows(filters)
+        counts = np.bincount(self.years[rows], minlength=len(self.year_labels))
+        present, index = self._year_index(counts)
+        return pd.Series(counts[present], index=index, dtype='int64')
+
+    def indicator_means(self, filters=None, indicators=INDICATORS):
+        """Média de cada indicador por ano (linhas = anos, colunas = indicadores) entre as linhas selecionadas."""
+        rows = self.rows(filters)
+        years = self.years[rows]
+        size = len(self.year_labels)
+        present, index = self._year_index(np.bincount(years, minlength=size))
+        means = {}
+        for indicator in indicators:
+            values = self.values[self.indicators.index(indicator), rows]
+            valid = ~np.isnan(values)
+            count = np.bincount(years[valid], minlength=size)[present]
+            total = np.bincount(years[valid], weights=values[valid], minlength=size)[present]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means[indicator] = np.where(count > 0, total / count, np.nan)
+        return pd.DataFrame(means, index=index)
+
+    def category_counts(self, field, filters=None):
+        """Contagem de cada valor de um campo por ano (linhas = valores, colunas = anos) entre as linhas selecionadas."""
+        codes, members = self.counted[field]
+        rows = self.rows(filters)
+        codes, years = codes[rows], self.years[rows]
+        valid = codes >= 0
+        size = len(self.year_labels)
+        flat = np.bincount(codes[valid] * size + years[valid], minlength=len(members) * size)
+        counts = pd.DataFrame(flat.reshape(len(members), size), index=pd.Index(members, name=field),
+                              columns=[str(year) for year in self.year_labels])
+        counts = counts[counts.sum(axis=1) > 0].sort_index()
+        return counts.loc[:, counts.sum(axis=0) > 0]
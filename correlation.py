@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+from dataset import NUMERIC_THRESHOLD
+from tracing import traced
+
+# Linhas lidas por vez no modo streaming
+CHUNKSIZE = 50_000
+
+
+class CorrelationAccumulator:
+    """
+    Matriz de correlação de Pearson acumulada por blocos de linhas.
+
+    Para cada par de colunas guarda contagem, médias e co-momentos apenas das
+    linhas em que as duas estão presentes (mesmo critério do `.corr()` do
+    pandas), todos como matrizes k×k. Os blocos são combinados com a fórmula
+    de Chan/Welford, que evita o cancelamento numérico das somas brutas.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.n = np.zeros((k, k))
+        self.mean_x = np.zeros((k, k))
+        self.m2_x = np.zeros((k, k))
+        self.comoment = np.zeros((k, k))
+
+    def update(self, values):
+        """Adiciona um bloco (n × k, com NaN para valores ausentes)."""
+        values = np.asarray(values, dtype='float64')
+        present = ~np.isnan(values)
+        mask = present.astype('float64')
+        # Centraliza o bloco na própria média para estabilidade numérica
+        filled = np.where(present, values, 0.0)
+        counts = mask.sum(axis=0)
+        shift = np.divide(filled.sum(axis=0), counts, out=np.zeros_like(counts), where=counts > 0)
+        centered = np.where(present, filled - shift, 0.0)
+
+        n_b = mask.T @ mask
+        sum_x = centered.T @ mask
+        sum_xx = (centered ** 2).T @ mask
+        sum_xy = centered.T @ centered
+        mean_b = np.divide(sum_x, n_b, out=np.zeros_like(n_b), where=n_b > 0)
+        m2_b = sum_xx - mean_b * sum_x
+        comoment_b = sum_xy - mean_b * sum_x.T
+        mean_b = mean_b + shift[:, None]
+        self._merge(n_b, mean_b, m2_b, comoment_b)
+        return self
+
+    def _merge(self, n_b, mean_b, m2_b, comoment_b):
+        n_a = self.n
+        n = n_a + n_b
+        ratio = np.divide(n_b, n, out=np.zeros_like(n), where=n > 0)
+        weight = np.divide(n_a * n_b, n, out=np.zeros_like(n), where=n > 0)
+        # mean_x[i, j] é a média da coluna i nas linhas em que i e j estão presentes
+        delta = mean_b - self.mean_x
+        self.mean_x = self.mean_x + delta * ratio
+        self.comoment = self.comoment + comoment_b + delta * delta.T * weight
+        self.m2_x = self.m2_x + m2_b + delta * delta * weight
+        self.n = n
+
+    def matrix(self):
+        """Matriz de correlação (NaN onde há menos de 2 pares ou variância nula)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Arredondamentos podem deixar a variância de uma coluna constante levemente negativa
+            denominator = np.sqrt(self.m2_x * self.m2_x.T)
+            corr = np.where((self.n >= 2) & (denominator > 0), self.comoment / denominator, np.nan)
+        corr = np.clip(corr, -1.0, 1.0)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+def encode_labels(series, categories=None):
+    """Códigos inteiros (ordem alfabética) para colunas de texto; ausentes continuam NaN."""
+    if categories is None:
+        categories = sorted(series.dropna().unique())
+    codes = pd.Categorical(series, categories=categories).codes.astype('float64')
+    codes[codes < 0] = np.nan
+    return codes
+
+
+@traced('label_encoding')
+def encode_for_correlation(df, columns):
+    """Matriz numérica (n × k) das colunas, codificando apenas as que são texto."""
+    values = np.empty((len(df), len(columns)))
+    for index, column in enumerate(columns):
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series):
+            values[:, index] = series.to_numpy(dtype='float64', na_value=np.nan)
+        else:
+            values[:, index] = encode_labels(series)
+    return values
+
+
+@traced('correlation')
+def correlation_matrix(df, columns):
+    """Matriz de correlação de todas as colunas em uma única passada vetorizada."""
+    return CorrelationAccumulator(columns).update(encode_for_correlation(df, columns)).matrix()
+
+
+def target_slice(matrix, columns, target):
+    """Submatriz das colunas de entrada com um target."""
+    subset = list(columns) + [target]
+    return matrix.loc[subset, subset]
+
+
+def top_correlations(matrix, target, k=7):
+    """As k maiores correlações absolutas com o target (excluindo ele próprio)."""
+    return matrix[target].drop(target, errors='ignore').abs().sort_values(ascending=False).head(k)
+
+
+def _text_categories(path, columns, delimiter, chunksize):
+    # Primeira passada: decide quais colunas são texto e coleta seus valores
+    present = dict.fromkeys(columns, 0)
+    numeric = dict.fromkeys(columns, 0)
+    labels = {column: set() for column in columns}
+    for chunk in pd.read_csv(path, delimiter=delimiter, usecols=columns, dtype=str, chunksize=chunksize):
+        for column in columns:
+            series = chunk[column].dropna()
+            converted = pd.to_numeric(series, errors='coerce')
+            present[column] += len(series)
+            numeric[column] += converted.notna().sum()
+            labels[column].update(series[converted.isna()].unique())
+    return {
+        column: sorted(labels[column])
+        for column in columns
+        if present[column] and numeric[column] < NUMERIC_THRESHOLD * present[column]
+    }
+
+
+def streaming_correlation(path, columns, delimiter=',', chunksize=CHUNKSIZE):
+    """
+    Matriz de correlação de um CSV grande demais para a memória: o arquivo é
+    lido em blocos (só as colunas pedidas) e a memória usada depende apenas do
+    tamanho do bloco e da quantidade de colunas.
+    """
+    columns = list(columns)
+    categories = _text_categories(path, columns, delimiter, chunksize)
+    accumulator = CorrelationAccumulator(columns)
+    for chunk in pd.read_csv(path, delimiter=delimiter, usecols=columns, dtype=str, chunksize=chunksize):
+        values = np.empty((len(chunk), len(columns)))
+        for index, column in enumerate(columns):
+            if column in categories:
+                values[:, index] = encode_labels(chunk[column], categories[column])
+            else:
+                values[:, index] = pd.to_numeric(chunk[column], errors='coerce').to_numpy(dtype='float64')
+        accumulator.update(values)
+    return accumulator.matrix()
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+
+from panel import INDICATORS
+
+# Dimensões de detalhamento, na ordem em que as células são guardadas
+DIMENSIONS = ['ANO', 'INSTITUICAO_ENSINO_ALUNO', 'FASE', 'TURMA', 'FAIXA_ETARIA']
+
+# Campos do painel de onde as dimensões saem (FASE_TURMA existe só em alguns anos)
+SOURCE_FIELDS = ['ANO', 'INSTITUICAO_ENSINO_ALUNO', 'FASE', 'TURMA', 'FASE_TURMA', 'IDADE_ALUNO']
+
+# Faixas de idade (limite inferior inclusivo)
+AGE_BINS = [0, 10, 13, 16, 19, np.inf]
+AGE_LABELS = ['Até 9', '10 a 12', '13 a 15', '16 a 18', '19 ou mais']
+
+# Valor da dimensão quando o campo não foi informado naquele ano
+MISSING = 'Não informado'
+
+# Estatísticas guardadas por indicador em cada célula
+STATISTICS = ['count', 'sum', 'sumsq']
+
+
+def member_sort_key(dimension, value):
+    # Faixas etárias na ordem das idades, números em ordem numérica e 'Não informado' no fim
+    if value == MISSING:
+        return (2, 0, value)
+    if dimension == 'FAIXA_ETARIA':
+        return (0, AGE_LABELS.index(value), value)
+    try:
+        return (0, float(value), value)
+    except ValueError:
+        return (1, 0, value)
+
+
+def dimension_labels(series):
+    text = series.astype(object).where(series.notna(), None)
+    return text.map(lambda value: MISSING if value is None else str(value))
+
+
+def dimension_frame(partition):
+    """
+    Dimensões de cada linha de um ano do painel. Em alguns anos a fase e a turma
+    vêm juntas em FASE_TURMA ('2H'); FASE vira texto sem casas decimais ('2').
+    """
+    fase = partition['FASE'] if 'FASE' in partition else pd.Series(np.nan, index=partition.index)
+    turma = partition['TURMA'] if 'TURMA' in partition else pd.Series(None, index=partition.index, dtype=object)
+    if 'FASE_TURMA' in partition:
+        combined = partition['FASE_TURMA'].astype(object).str.extract(r'^(?P<fase>\d+)(?P<turma>\D.*)?$')
+        fase = fase.where(fase.notna(), pd.to_numeric(combined['fase'], errors='coerce'))
+        turma = turma.where(turma.notna(), combined['turma'])
+    fase = fase.map(lambda value: None if pd.isna(value) else f'{value:g}')
+    age = partition['IDADE_ALUNO'] if 'IDADE_ALUNO' in partition else pd.Series(np.nan, index=partition.index)
+    institution = partition.get('INSTITUICAO_ENSINO_ALUNO', pd.Series(None, index=partition.index, dtype=object))
+    return pd.DataFrame({
+        'ANO': partition['ANO'].astype(int).astype(str),
+        'INSTITUICAO_ENSINO_ALUNO': dimension_labels(institution),
+        'FASE': dimension_labels(fase),
+        'TURMA': dimension_labels(turma),
+        'FAIXA_ETARIA': dimension_labels(pd.cut(age, AGE_BINS, right=False, labels=AGE_LABELS)),
+    }, index=partition.index)
+
+
+def build_cells(partition, indicators=INDICATORS):
+    """
+    Parciais de um ano: uma linha por combinação de dimensões presente, com a
+    quantidade de alunos e contagem, soma e soma dos quadrados de cada indicador.
+    """
+    dims = dimension_frame(partition)
+    values = partition[[i for i in indicators if i in partition.columns]].astype('float64')
+    frame = pd.concat([dims, values, (values ** 2).add_suffix('__sumsq')], axis=1)
+    grouped = frame.groupby(DIMENSIONS, sort=True, observed=True)
+    cells = grouped.size().rename('ALUNOS').to_frame()
+    for indicator in values.columns:
+        cells[f'{indicator}__count'] = grouped[indicator].count()
+        cells[f'{indicator}__sum'] = grouped[indicator].sum()
+        cells[f'{indicator}__sumsq'] = grouped[f'{indicator}__sumsq'].sum()
+    return cells.reset_index()
+
+
+class AggregateCube:
+    """
+    Agregados materializados ano × instituição × fase × turma × faixa etária.
+
+    Cada célula não vazia guarda a quantidade de alunos e, por indicador,
+    contagem, soma e soma dos quadrados. Qualquer combinação de filtros e
+    agrupamentos é respondida somando as células (np.bincount sobre os códigos
+    das dimensões), sem voltar às linhas; médias e desvios saem das somas.
+    """
+
+    def __init__(self, cells, indicators=INDICATORS):
+        self.indicators = [i for i in indicators if f'{i}__count' in cells.columns]
+        self.members = {}
+        codes = np.empty((len(cells), len(DIMENSIONS)), dtype=np.intp)
+        for index, dimension in enumerate(DIMENSIONS):
+            members = sorted(cells[dimension].unique(), key=lambda value: member_sort_key(dimension, value))
+            codes[:, index] = pd.Categorical(cells[dimension], categories=members).codes
+            self.members[dimension] = members
+        self.codes = codes
+        # Índices do pandas montados uma vez (criá-los a cada consulta custa mais que a própria soma)
+        self._levels = {dimension: pd.Index(members, dtype=object, name=dimension)
+                        for dimension, members in self.members.items()}
+        self._columns = pd.Index(self.indicators)
+        # Linhas: alunos e, por estatística, um vetor por indicador (todas as somas num único bincount)
+        self.values = np.stack([cells['ALUNOS'].to_numpy(dtype='float64')] + [
+            cells[f'{i}__{stat}'].to_numpy(dtype='float64') for stat in STATISTICS for i in self.indicators
+        ])
+
+    @classmethod
+    def from_partials(cls, partials, indicators=INDICATORS):
+        """Junta as parciais anuais (sem somar nada: cada célula pertence a um só ano)."""
+        cells = pd.concat(partials, ignore_index=True)
+        for column in cells.columns:
+            if column not in DIMENSIONS:
+                cells[column] = cells[column].fillna(0)
+        return cls(cells, indicators)
+
+    def _selection(self, filters):
+        selected = np.ones(len(self.codes), dtype=bool)
+        for dimension, allowed in (filters or {}).items():
+            members = self.members[dimension]
+            if isinstance(allowed, (str, int)):
+                allowed = [allowed]
+            wanted = [members.index(str(value)) for value in allowed if str(value) in members]
+            selected &= np.isin(self.codes[:, DIMENSIONS.index(dimension)], wanted)
+        return selected
+
+    def rollup(self, by=(), filters=None, statistic='mean'):
+        """
+        Agrega as células por `by` (dimensões) depois de aplicar `filters`
+        ({dimensão: valor ou lista de valores}). Colunas: ALUNOS e, por
+        indicador, a estatística pedida ('mean', 'std', 'count' ou 'sum').
+        Grupos sem nenhum aluno não aparecem.
+        """
+        by = list(by)
+        selected = self._selection(filters)
+        shape = tuple(len(self.members[d]) for d in by)
+        size = int(np.prod(shape)) if by else 1
+        if by:
+            group = np.ravel_multi_index(self.codes[selected][:, [DIMENSIONS.index(d) for d in by]].T, shape)
+        else:
+            group = np.zeros(int(selected.sum()), dtype=np.intp)
+
+        # Um único bincount para todas as linhas de valores: cada linha soma em sua faixa de `size` grupos
+        values = self.values[:, selected]
+        keys = (np.arange(len(values))[:, None] * size + group).ravel()
+        sums = np.bincount(keys, weights=values.ravel(), minlength=len(values) * size).reshape(len(values), size)
+        present = np.flatnonzero(sums[0])
+        sums = sums[:, present]
+        k = len(self.indicators)
+        totals = {stat: sums[1 + index * k:1 + (index + 1) * k].T for index, stat in enumerate(STATISTICS)}
+        count, total, sumsq = totals['count'], totals['sum'], totals['sumsq']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if statistic == 'mean':
+                result = np.where(count > 0, total / count, np.nan)
+            elif statistic == 'std':
+                # Desvio padrão amostral, como o .std() do pandas
+                variance = (sumsq - total * total / count) / (count - 1)
+                result = np.where(count > 1, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+            elif statistic in ('count', 'sum'):
+                result = totals[statistic]
+            else:
+                raise ValueError(f'estatística desconhecida: {statistic}')
+
+        if len(by) == 1:
+            index = self._levels[by[0]].take(present)
+        elif by:
+            index = pd.MultiIndex(levels=[self._levels[d] for d in by], codes=np.unravel_index(present, shape),
+                                  names=by, verify_integrity=False)
+        else:
+            index = pd.RangeIndex(len(present))
+        frame = pd.DataFrame(result, index=index, columns=self._columns)
+        frame.insert(0, 'ALUNOS', sums[0].astype('int64'))
+        return frame
@@ -0,0 +1,249 @@
+import hashlib
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from tracing import current_page, span, traced
+
+# Diretório base do projeto (os CSVs ficam na raiz do repositório)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Pasta dos CSVs; PASSOS_DATA_DIR permite apontar o app para outra cópia (ex.: dados sintéticos)
+DATA_DIR = os.environ.get('PASSOS_DATA_DIR', BASE_DIR)
+# Caches derivados dos dados ficam junto deles: outra cópia dos dados não mistura resultados com esta
+CACHE_ROOT = os.path.join(DATA_DIR, '.cache')
+CACHE_DIR = os.path.join(CACHE_ROOT, 'dataset')
+
+# Fontes de dados conhecidas: nome -> (arquivo, delimitador)
+SOURCES = {
+    'pede': ('PEDE_PASSOS_DATASET_FIAP.csv', ';'),
+    'merged': ('Final_Merged_DataFrame.csv', ','),
+}
+
+# Proporção mínima de valores numéricos para uma coluna de texto ser convertida
+NUMERIC_THRESHOLD = 0.95
+
+# Fração máxima de valores distintos para uma coluna de texto virar categórica nos tipos compactos
+CATEGORY_RATIO = 0.5
+
+# Cache do processo: compartilhado por todas as sessões/páginas do Streamlit.
+# Uma entrada por fonte, versão e projeção (colunas e tipos compactos)
+_frames = {}
+# Colunas carregadas por (página, fonte), para o relatório de bytes economizados
+_usage = {}
+_versions = {}
+_lock = threading.Lock()
+
+
+def source_path(name):
+    """Caminho absoluto do CSV de uma fonte."""
+    filename, _ = SOURCES[name]
+    return os.path.join(DATA_DIR, filename)
+
+
+def file_version(path):
+    """Hash (sha256) do conteúdo do arquivo, recalculado só quando tamanho/mtime mudam."""
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = _versions.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    version = digest.hexdigest()
+    _versions[path] = (stamp, version)
+    return version
+
+
+def dataset_version(name):
+    """Versão (hash do conteúdo) de uma fonte de dados."""
+    return file_version(source_path(name))
+
+
+def coerce_types(df):
+    # Colunas de texto que são majoritariamente numéricas viram float (valores como '#NULO!' viram NaN)
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series):
+            continue
+        present = series.notna().sum()
+        if present == 0:
+            df[column] = series.astype('float64')
+            continue
+        numeric = pd.to_numeric(series, errors='coerce')
+        if numeric.notna().sum() >= NUMERIC_THRESHOLD * present:
+            df[column] = numeric.astype('float64')
+        else:
+            # Garante um único tipo (texto) por coluna para o armazenamento colunar
+            df[column] = series.where(series.isna(), series.astype(str))
+    return df
+
+
+def compact_types(df):
+    """
+    Tipos compactos: float64 vira float32 e texto com muitos valores repetidos
+    vira categórico (códigos inteiros e uma única cópia de cada valor).
+    """
+    for column in df.columns:
+        series = df[column]
+        if series.dtype == 'float64':
+            df[column] = series.astype('float32')
+        elif pd.api.types.is_object_dtype(series):
+            present = series.notna().sum()
+            if present and series.nunique() <= CATEGORY_RATIO * present:
+                df[column] = series.astype('category')
+    return df
+
+
+def _cache_path(name, version):
+    return os.path.join(CACHE_DIR, f'{name}-{version[:16]}.parquet')
+
+
+def _write_cache(df, path):
+    # Escrita atômica: outro processo nunca lê um arquivo parcial
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _remove_stale(name, keep):
+    prefix = f'{name}-'
+    for filename in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, filename)
+        if filename.startswith(prefix) and filename.endswith('.parquet') and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+@traced('csv_parse')
+def read_source(name):
+    """Lê e tipa o CSV original, sem passar pelo cache."""
+    _, delimiter = SOURCES[name]
+    return coerce_types(pd.read_csv(source_path(name), delimiter=delimiter))
+
+
+def _ensure_cache(name, version):
+    # O CSV é lido inteiro uma única vez por versão; as projeções saem do Parquet
+    path = _cache_path(name, version)
+    if not os.path.exists(path):
+        _write_cache(read_source(name), path)
+        _remove_stale(name, keep=path)
+    return path
+
+
+def _record(source, stats):
+    _usage[(current_page(), source)] = stats
+
+
+def _read_projection(path, columns, compact):
+    parquet = pq.ParquetFile(path, memory_map=True)
+    # Bytes descompactados de cada coluna, pelos metadados (sem ler os dados)
+    sizes = {}
+    metadata = parquet.metadata
+    for group in range(metadata.num_row_groups):
+        row_group = metadata.row_group(group)
+        for index in range(row_group.num_columns):
+            chunk = row_group.column(index)
+            sizes[chunk.path_in_schema] = sizes.get(chunk.path_in_schema, 0) + chunk.total_uncompressed_size
+    names = parquet.schema_arrow.names
+    selected = names if columns is None else [c for c in dict.fromkeys(columns) if c in names]
+    with span('parquet_read'):
+        frame = parquet.read(columns=selected).to_pandas()
+    memory = int(frame.memory_usage(deep=True).sum())
+    if compact:
+        frame = compact_types(frame)
+    stats = {
+        'columns': len(selected),
+        'total_columns': len(names),
+        'read_bytes': sum(sizes.get(c, 0) for c in selected),
+        'file_bytes': sum(sizes.values()),
+        'memory_bytes': int(frame.memory_usage(deep=True).sum()),
+    }
+    stats['compact_saved_bytes'] = memory - stats['memory_bytes']
+    return frame, stats
+
+
+def read_parquet(path, columns=None, compact=False, source=None):
+    """
+    Lê apenas as `columns` de um Parquet (as demais nem são descompactadas;
+    colunas que não existem no arquivo são ignoradas), com tipos compactos se
+    `compact`. O uso entra no relatório de colunas da página atual.
+    """
+    frame, stats = _read_projection(path, columns, compact)
+    _record(source or os.path.basename(path), stats)
+    return frame
+
+
+def source_columns(name):
+    """Colunas de uma fonte, lidas do esquema do cache Parquet (sem carregar dados)."""
+    version = dataset_version(name)
+    with _lock:
+        path = _ensure_cache(name, version)
+    return pq.read_schema(path).names
+
+
+def load(name, columns=None, compact=False):
+    """
+    Retorna o DataFrame tipado de uma fonte, só com as `columns` pedidas
+    (todas por padrão) e, com `compact`, em tipos compactos (ver compact_types).
+
+    O CSV é lido uma única vez por versão: o resultado fica num cache Parquet em disco
+    (lido com memory map por outros processos) e cada projeção num cache em memória
+    compartilhado por todas as páginas. O DataFrame retornado é compartilhado e não
+    deve ser modificado.
+    """
+    version = dataset_version(name)
+    key = (name, version, None if columns is None else tuple(columns), compact)
+    cached = _frames.get(key)
+    if cached is None:
+        with _lock:
+            cached = _frames.get(key)
+            if cached is None:
+                path = _ensure_cache(name, version)
+                # Descarta versões antigas da mesma fonte
+                for old_key in [k for k in _frames if k[0] == name and k[1] != version]:
+                    del _frames[old_key]
+                cached = _read_projection(path, columns, compact)
+                _frames[key] = cached
+    _record(name, cached[1])
+    return cached[0]
+
+
+def usage_report(page=None):
+    """
+    Colunas carregadas por página e fonte: quantas foram lidas, os MB
+    descompactados lidos e evitados (colunas fora da projeção) e a memória
+    ocupada e economizada pelos tipos compactos. Com `page`, só as daquela página.
+    """
+    rows = []
+    for (loaded_by, source), stats in sorted(_usage.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+        if page is not None and loaded_by != page:
+            continue
+        rows.append({
+            'page': loaded_by,
+            'source': source,
+            'columns': f"{stats['columns']}/{stats['total_columns']}",
+            'read_mb': round(stats['read_bytes'] / 2 ** 20, 3),
+            'skipped_mb': round((stats['file_bytes'] - stats['read_bytes']) / 2 ** 20, 3),
+            'memory_mb': round(stats['memory_bytes'] / 2 ** 20, 3),
+            'compact_saved_mb': round(stats['compact_saved_bytes'] / 2 ** 20, 3),
+        })
+    return pd.DataFrame(rows, columns=['page', 'source', 'columns', 'read_mb', 'skipped_mb', 'memory_mb',
+                                       'compact_saved_mb'])
+
+
+def load_pede(columns=None, compact=False):
+    """Dataset PEDE (formato largo, uma coluna por indicador e ano)."""
+    return load('pede', columns, compact)
+
+
+def load_merged(columns=None, compact=False):
+    """Dataset PEDE mesclado com os dados cadastrais dos alunos."""
+    return load('merged', columns, compact)
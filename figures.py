@@ -0,0 +1,122 @@
+import collections
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+
+from dataset import CACHE_ROOT
+from tracing import traced
+
+# PNGs renderizados ficam em disco para sobreviver a reinícios do servidor:
+# <gráfico>-<versão dos dados>-<chave>.png; só a versão atual de cada gráfico é mantida
+FIGURE_CACHE_DIR = os.path.join(CACHE_ROOT, 'figures')
+
+# Arquivos do formato anterior (só a chave), sem versão para saber se ainda valem
+_LEGACY_NAME = re.compile(r'[0-9a-f]{24}\.png')
+
+# Quantidade de imagens mantidas em memória (as menos usadas saem primeiro)
+MAX_ENTRIES = 256
+
+# Mesmas opções que o st.pyplot usa ao salvar a figura
+DPI = 200
+
+_images = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def figure_key(name, version, **params):
+    """Chave da figura: nome do gráfico, versão dos dados e parâmetros do plot."""
+    spec = json.dumps({'name': name, 'version': version, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(spec.encode('utf-8')).hexdigest()[:24]
+
+
+@traced('figure_render')
+def render_png(draw, figsize=None):
+    """
+    Renderiza `draw(ax)` em PNG. A figura é criada direto pela classe Figure,
+    sem passar pelo pyplot, então não fica registrada em nenhum estado global
+    e é liberada assim que a função retorna. O matplotlib só é importado aqui,
+    quando alguma imagem realmente precisa ser desenhada.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    draw(ax)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=DPI, bbox_inches='tight')
+    fig.clear()
+    return buffer.getvalue()
+
+
+def _version_tag(version):
+    return hashlib.sha256(str(version).encode('utf-8')).hexdigest()[:16]
+
+
+def _remove_stale(name, tag):
+    # Imagens deste gráfico de outras versões dos dados (que não voltam a ser pedidas)
+    stale = re.compile(rf'{re.escape(name)}-(?!{tag}-)[0-9a-f]{{16}}-[0-9a-f]{{24}}\.png')
+    for filename in os.listdir(FIGURE_CACHE_DIR):
+        if stale.fullmatch(filename) or _LEGACY_NAME.fullmatch(filename):
+            try:
+                os.remove(os.path.join(FIGURE_CACHE_DIR, filename))
+            except FileNotFoundError:
+                # Já removida por outra sessão
+                pass
+
+
+def _remember(key, image):
+    with _lock:
+        _images[key] = image
+        _images.move_to_end(key)
+        while len(_images) > MAX_ENTRIES:
+            _images.popitem(last=False)
+
+
+def memory_figure(name, version, draw, figsize=None, **params):
+    """
+    Como cached_figure, mas só em memória: para gráficos de uma entrada
+    específica (ex.: as simulações de um aluno), que não valem um arquivo em disco.
+    """
+    key = figure_key(name, version, figsize=figsize, **params)
+    with _lock:
+        image = _images.get(key)
+        if image is not None:
+            _images.move_to_end(key)
+            return image
+    image = render_png(draw, figsize)
+    _remember(key, image)
+    return image
+
+
+def cached_figure(name, version, draw, figsize=None, **params):
+    """
+    Bytes PNG do gráfico, renderizado no máximo uma vez por combinação de
+    versão dos dados e parâmetros e compartilhado por todas as sessões.
+    `params` deve conter tudo que muda o desenho além dos dados. Ao gravar
+    uma imagem nova, as do mesmo gráfico de outras versões saem do disco.
+    """
+    key = figure_key(name, version, figsize=figsize, **params)
+    with _lock:
+        image = _images.get(key)
+        if image is not None:
+            _images.move_to_end(key)
+            return image
+
+    tag = _version_tag(version)
+    path = os.path.join(FIGURE_CACHE_DIR, f'{name}-{tag}-{key}.png')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            image = f.read()
+    else:
+        image = render_png(draw, figsize)
+        os.makedirs(FIGURE_CACHE_DIR, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(image)
+        os.replace(tmp_path, path)
+        _remove_stale(name, tag)
+    _remember(key, image)
+    return image
@@ -0,0 +1,112 @@
+import argparse
+import ast
+import glob
+import json
+import os
+import subprocess
+import sys
+
+from dataset import BASE_DIR
+
+# Bibliotecas cujo custo de importação vale acompanhar
+HEAVY_LIBRARIES = ['streamlit', 'pandas', 'numpy', 'pyarrow', 'matplotlib', 'seaborn', 'scipy', 'sklearn', 'joblib']
+
+# Executado num interpretador novo: roda a página uma vez e informa tempo e bibliotecas carregadas
+_RENDER_SCRIPT = '''
+import json, sys, time
+sys.path.insert(0, {base!r})
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({page!r}, default_timeout=600).run()
+print(json.dumps({{
+    'seconds': time.perf_counter() - start,
+    'errors': [e.message for e in at.exception],
+    'modules': sorted({{name.split('.')[0] for name in sys.modules}}),
+}}))
+'''
+
+
+def pages():
+    """Scripts do app: a página inicial e as páginas em pages/."""
+    return ['Hello.py'] + sorted(os.path.relpath(p, BASE_DIR) for p in glob.glob(os.path.join(BASE_DIR, 'pages', '*.py')))
+
+
+def page_imports(page):
+    """Imports de nível de módulo da página (o que é pago antes de qualquer código rodar)."""
+    with open(os.path.join(BASE_DIR, page), encoding='utf-8') as f:
+        source = f.read()
+    tree = ast.parse(source)
+    return '\n'.join(ast.get_source_segment(source, node) for node in tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def _python(args):
+    env = {**os.environ, 'PYTHONPATH': BASE_DIR}
+    return subprocess.run([sys.executable, *args], cwd=BASE_DIR, env=env, capture_output=True, text=True)
+
+
+def import_profile(page):
+    """
+    Tempo de importação da página num interpretador novo (`-X importtime`):
+    total e custo por pacote de nível superior, em milissegundos.
+    """
+    result = _python(['-X', 'importtime', '-c', page_imports(page)])
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1000
+    return {
+        'import_ms': round(sum(packages.values()), 1),
+        'heavy_ms': {name: round(packages[name], 1) for name in HEAVY_LIBRARIES if name in packages},
+    }
+
+
+def render_profile(page):
+    """Primeira execução da página (como num servidor recém-iniciado) e bibliotecas carregadas até o fim."""
+    result = _python(['-c', _RENDER_SCRIPT.format(base=BASE_DIR, page=os.path.join(BASE_DIR, page))])
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        'first_run_ms': round(report['seconds'] * 1000, 1),
+        'loaded_after_run': [name for name in HEAVY_LIBRARIES if name in report['modules']],
+        'errors': report['errors'],
+    }
+
+
+def report(render=False):
+    rows = []
+    for page in pages():
+        row = {'page': page, **import_profile(page)}
+        if render:
+            row.update(render_profile(page))
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Custo de importação (e da primeira execução) de cada página.')
+    parser.add_argument('--render', action='store_true', help='também executa cada página uma vez num processo novo')
+    parser.add_argument('--json', action='store_true', help='saída em JSON')
+    args = parser.parse_args()
+
+    rows = report(args.render)
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+        return
+    for row in rows:
+        heavy = ', '.join(f'{name} {ms:.0f}' for name, ms in sorted(row['heavy_ms'].items(), key=lambda i: -i[1]))
+        print(f"{row['page']}: importação {row['import_ms']:.0f} ms ({heavy})")
+        if args.render:
+            print(f"    primeira execução {row['first_run_ms']:.0f} ms; carregadas: {', '.join(row['loaded_after_run'])}")
+            for error in row['errors']:
+                print(f'    erro: {error}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cohort import PANEL_COLUMNS, CohortIndex
+from correlation import correlation_matrix
+from cube import AggregateCube, build_cells
+from dataset import DATA_DIR, SOURCES, dataset_version, file_version, load_merged, read_parquet, source_path
+from panel import CATEGORICAL_FIELDS, ID_COLUMN, INDICATORS, build_panel, split_year_column
+from students import ALIAS_COLUMNS, StudentIndex
+from tracing import span, traced
+
+# Partições anuais, agregados e pares de anos ficam junto dos dados (cada pasta de dados tem os seus)
+STORE_DIR = os.path.join(DATA_DIR, 'store')
+MANIFEST_PATH = os.path.join(STORE_DIR, 'manifest.json')
+
+# Cache do processo, por versão do armazenamento
+_results = {}
+# Arquivos já ingeridos, por (tamanho, mtime) do manifesto: o sync roda a cada execução de página
+_sources = {}
+_lock = threading.RLock()
+
+
+def _partition_path(year):
+    return os.path.join(STORE_DIR, 'panel', f'ANO={year}.parquet')
+
+
+def _aggregate_path(year):
+    return os.path.join(STORE_DIR, 'aggregates', f'ANO={year}.json')
+
+
+def _cube_path(year):
+    return os.path.join(STORE_DIR, 'cube', f'ANO={year}.parquet')
+
+
+def _pair_path(year):
+    return os.path.join(STORE_DIR, 'pairs', f'{year}-{year + 1}.parquet')
+
+
+def _write_table(df, path):
+    # Escrita atômica: outro processo nunca lê um arquivo parcial
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_json(data, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_manifest():
+    """Anos armazenados (versão e linhas de cada partição), pares gerados e arquivos já ingeridos."""
+    if not os.path.exists(MANIFEST_PATH):
+        return {'sources': {}, 'years': {}, 'pairs': {}}
+    return _read_json(MANIFEST_PATH)
+
+
+def _ingested_sources():
+    try:
+        stat = os.stat(MANIFEST_PATH)
+    except FileNotFoundError:
+        return {}
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    sources = _sources.get(stamp)
+    if sources is None:
+        sources = read_manifest()['sources']
+        _sources.clear()
+        _sources[stamp] = sources
+    return sources
+
+
+def partition_version(partition):
+    """Hash do conteúdo de uma partição: reingerir o mesmo ano sem mudanças não reescreve nada."""
+    hashed = pd.util.hash_pandas_object(partition, index=False).to_numpy()
+    return hashlib.sha256(hashed.tobytes() + ','.join(partition.columns).encode()).hexdigest()
+
+
+def summarize(partition):
+    """
+    Contagens das categorias de um ano, que se combinam entre anos sem reler as
+    partições (alunos e indicadores ficam no cubo de agregados).
+    """
+    categories = {}
+    for field in CATEGORICAL_FIELDS:
+        if field in partition.columns:
+            counts = partition[field].value_counts(dropna=True)
+            categories[field] = {str(value): int(count) for value, count in counts.items() if count}
+    return {'students': int(len(partition)), 'categories': categories}
+
+
+def _wide(partition, year):
+    # Volta ao formato largo (<CAMPO>_<ANO>), com texto no lugar das categorias como nos CSVs
+    wide = partition.drop(columns='ANO').set_index(ID_COLUMN)
+    for column in wide.columns:
+        if isinstance(wide[column].dtype, pd.CategoricalDtype):
+            wide[column] = wide[column].astype(object).where(wide[column].notna(), None)
+    return wide.add_suffix(f'_{year}')
+
+
+def build_pair(year):
+    """
+    Conjunto (ano N → ano N+1): uma linha por aluno presente em algum dos dois
+    anos, com os campos dos dois anos lado a lado, no mesmo formato das colunas
+    do dataset mesclado (features *_N e targets *_N+1). É a entrada do treino e
+    das correlações entre anos.
+    """
+    pair = _wide(_read_partition(year), year).join(_wide(_read_partition(year + 1), year + 1), how='outer')
+    return pair.rename_axis(ID_COLUMN).reset_index()
+
+
+def _store_partition(year, partition, version, manifest):
+    _write_table(partition, _partition_path(year))
+    _write_json(summarize(partition), _aggregate_path(year))
+    _write_table(build_cells(partition), _cube_path(year))
+    manifest['years'][str(year)] = {
+        'version': version,
+        'rows': int(len(partition)),
+        'ingested_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def _refresh_pairs(changed, manifest):
+    # Só os pares que envolvem um ano alterado são refeitos
+    stored = {int(year) for year in manifest['years']}
+    for year in sorted({y for c in changed for y in (c - 1, c)}):
+        if year in stored and year + 1 in stored:
+            _write_table(build_pair(year), _pair_path(year))
+            manifest['pairs'][str(year)] = [manifest['years'][str(year)]['version'],
+                                            manifest['years'][str(year + 1)]['version']]
+
+
+@traced('ingest')
+def ingest_frame(df, year=None, id_column=ID_COLUMN):
+    """
+    Armazena os anos de um DataFrame largo (colunas <CAMPO>_<ANO>). Com `year`,
+    colunas sem sufixo de ano são tratadas como daquele ano (ex.: um arquivo só
+    de 2023 com INDE, PEDRA...). Apenas os anos cujo conteúdo mudou são
+    gravados, junto com os seus agregados e os pares de anos vizinhos; os anos
+    anteriores não são reprocessados. Retorna os anos gravados.
+    """
+    if year is not None:
+        df = df.rename(columns={c: f'{c}_{year}' for c in df.columns
+                                if c != id_column and not split_year_column(c)})
+    panel = build_panel(df, id_column)
+    if id_column != ID_COLUMN:
+        panel = panel.rename(columns={id_column: ID_COLUMN})
+
+    with _lock:
+        manifest = read_manifest()
+        changed = []
+        for ano, partition in panel.groupby('ANO', sort=True):
+            partition = partition.reset_index(drop=True)
+            version = partition_version(partition)
+            stored = manifest['years'].get(str(ano))
+            if stored is not None and stored['version'] == version:
+                continue
+            _store_partition(int(ano), partition, version, manifest)
+            changed.append(int(ano))
+        if changed:
+            _refresh_pairs(changed, manifest)
+            _write_json(manifest, MANIFEST_PATH)
+        return changed
+
+
+def ingest_file(path, year=None, delimiter=';', id_column=ID_COLUMN):
+    """Ingere um CSV; um arquivo já ingerido e sem alterações nem chega a ser lido."""
+    path = os.path.abspath(path)
+    version = file_version(path)
+    if _ingested_sources().get(path) == version:
+        return []
+    changed = ingest_frame(pd.read_csv(path, delimiter=delimiter), year, id_column)
+    with _lock:
+        manifest = read_manifest()
+        manifest['sources'][path] = version
+        _write_json(manifest, MANIFEST_PATH)
+    return changed
+
+
+def sync():
+    """Garante que o dataset PEDE está no armazenamento (só os anos alterados são regravados)."""
+    _, delimiter = SOURCES['pede']
+    return ingest_file(source_path('pede'), delimiter=delimiter)
+
+
+def store_version():
+    """Versão do armazenamento: muda sempre que algum ano é gravado."""
+    sync()
+    return file_version(MANIFEST_PATH)
+
+
+def _cached(key, compute):
+    full_key = (store_version(), key)
+    result = _results.get(full_key)
+    if result is None:
+        with _lock:
+            result = _results.get(full_key)
+            if result is None:
+                for old_key in [k for k in _results if k[0] != full_key[0]]:
+                    del _results[old_key]
+                # Nome da etapa: o primeiro elemento da chave ('cube', 'pair', ...)
+                with span(f"store_{key if isinstance(key, str) else key[0]}"):
+                    result = compute()
+                _results[full_key] = result
+    return result
+
+
+def years():
+    """Anos armazenados, em ordem crescente."""
+    sync()
+    return sorted(int(year) for year in read_manifest()['years'])
+
+
+def pair_years():
+    """Anos N com o conjunto (N → N+1) gerado."""
+    sync()
+    return sorted(int(year) for year in read_manifest()['pairs'])
+
+
+def _read_partition(year, columns=None, compact=False):
+    return read_parquet(_partition_path(year), columns, compact, source=f'store ANO={year}')
+
+
+def load_partition(year, columns=None, compact=False):
+    """Painel (aluno × campo) de um ano, só com as `columns` pedidas (ver dataset.read_parquet)."""
+    sync()
+    return _read_partition(year, columns, compact)
+
+
+def aggregates():
+    """Agregados de todos os anos armazenados, por ano."""
+    return _cached('aggregates', lambda: {year: _read_json(_aggregate_path(year)) for year in years()})
+
+
+def _cube_partial(year):
+    path = _cube_path(year)
+    if not os.path.exists(path):
+        # Ano gravado antes do cubo existir
+        with _lock:
+            _write_table(build_cells(_read_partition(year)), path)
+    return pq.read_table(path).to_pandas()
+
+
+def load_cube():
+    """Cubo de agregados de todos os anos, montado uma vez por versão do armazenamento."""
+    return _cached('cube', lambda: AggregateCube.from_partials([_cube_partial(year) for year in years()]))
+
+
+def load_cohort_index():
+    """Índice de bitmaps de todos os anos para os filtros de coorte, montado uma vez por versão do armazenamento."""
+    return _cached('cohort_index', lambda: CohortIndex(
+        pd.concat([_read_partition(year, PANEL_COLUMNS) for year in years()], ignore_index=True)))
+
+
+def load_student_index():
+    """
+    Índice de alunos de todos os anos, com os identificadores do dataset mesclado
+    como apelidos; montado uma vez por versão do armazenamento e do dataset mesclado.
+    """
+    key = ('students', dataset_version('merged'))
+    return _cached(key, lambda: StudentIndex(
+        pd.concat([_read_partition(year) for year in years()], ignore_index=True),
+        load_merged([ID_COLUMN] + ALIAS_COLUMNS, compact=True), version=(store_version(), key[1])))
+
+
+def _by_year(frame):
+    frame.index = frame.index.astype(int).rename('ANO')
+    return frame
+
+
+def student_counts():
+    """Quantidade de alunos por ano."""
+    return _by_year(load_cube().rollup(['ANO']))['ALUNOS']
+
+
+def indicator_means(indicators=INDICATORS):
+    """Média de cada indicador por ano (linhas = anos, colunas = indicadores)."""
+    return _by_year(load_cube().rollup(['ANO']))[list(indicators)]
+
+
+def category_counts(field):
+    """Contagem de cada valor de um campo categórico por ano (linhas = valores, colunas = anos)."""
+    columns = {str(year): summary['categories'].get(field, {}) for year, summary in aggregates().items()}
+    counts = pd.DataFrame(columns).fillna(0).astype('int64')
+    counts.index.name = field
+    return counts.sort_index()
+
+
+def training_set(year=None, columns=None):
+    """Conjunto (ano N → ano N+1), só com as `columns` pedidas; sem `year`, o par mais recente."""
+    available = pair_years()
+    if not available:
+        raise LookupError('nenhum par de anos consecutivos armazenado')
+    year = available[-1] if year is None else year
+    if year not in available:
+        raise LookupError(f'par {year} → {year + 1} não armazenado')
+    key = ('pair', year, None if columns is None else tuple(columns))
+    return _cached(key, lambda: read_parquet(_pair_path(year), columns, source=f'store {year}-{year + 1}'))
+
+
+def pair_correlation(columns, year=None):
+    """Matriz de correlação das colunas de um par de anos, calculada uma vez por versão do armazenamento."""
+    return _cached(('correlation', year, tuple(columns)), lambda: correlation_matrix(training_set(year, columns), columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingestão incremental de novos anos do PEDE.')
+    parser.add_argument('source', nargs='?', help='CSV com os dados do(s) novo(s) ano(s); sem ele, só sincroniza o PEDE')
+    parser.add_argument('--year', type=int, help='ano das colunas sem sufixo de ano (ex.: INDE em vez de INDE_2023)')
+    parser.add_argument('--delimiter', default=';', help='delimitador do CSV')
+    parser.add_argument('--id-column', default=ID_COLUMN, help='coluna que identifica o aluno')
+    args = parser.parse_args()
+
+    changed = sync()
+    if args.source:
+        changed += ingest_file(args.source, args.year, args.delimiter, args.id_column)
+    manifest = read_manifest()
+    print(f"Anos gravados agora: {', '.join(map(str, sorted(set(changed)))) or 'nenhum'}")
+    for year, info in sorted(manifest['years'].items()):
+        print(f"  {year}: {info['rows']} alunos ({info['version'][:12]})")
+    for year in sorted(manifest['pairs']):
+        print(f'  treino {year} → {int(year) + 1}: {_pair_path(int(year))}')
+
+
+if __name__ == '__main__':
+    main()
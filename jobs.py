@@ -0,0 +1,151 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Treinos simultâneos: modelos independentes (ex.: classificador e regressor) treinam em paralelo
+WORKERS = 2
+
+# Jobs terminados mantidos para consulta pelas sessões (os mais antigos saem primeiro)
+MAX_FINISHED = 32
+
+# Jobs do processo por chave, compartilhados por todas as sessões
+_jobs = {}
+_lock = threading.Lock()
+_pool = None
+
+
+class Job:
+    """
+    Tarefa em segundo plano (um treino) com estado, etapa e progresso que
+    qualquer sessão pode consultar enquanto ela roda. `state` é 'queued',
+    'running', 'done' ou 'failed'; `result` é o retorno da tarefa e `error`, a
+    mensagem da exceção se ela falhou.
+    """
+
+    def __init__(self, key, label, task=None):
+        self.key = key
+        self.label = label
+        self.task = task
+        self.state = 'queued'
+        self.stage = 'na fila'
+        self.done = None
+        self.total = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    @property
+    def finished(self):
+        return self.state in ('done', 'failed')
+
+    def update(self, stage, done=None, total=None):
+        """Etapa atual e, quando a etapa tem passos (ex.: árvores), quantos já foram feitos."""
+        with self._lock:
+            self.stage = stage
+            self.done = done
+            self.total = total
+
+    def elapsed(self):
+        """Segundos desde o início (ou na fila, se ainda não começou), até o fim se já terminou."""
+        start = self.started_at or self.submitted_at
+        return (self.finished_at or time.time()) - start
+
+    def wait(self, timeout=None):
+        """Espera o job terminar; retorna False se o tempo acabou antes."""
+        return self._finished.wait(timeout)
+
+    def snapshot(self):
+        """Estado atual como dicionário (consistente mesmo com o job rodando)."""
+        with self._lock:
+            return {
+                'key': self.key, 'label': self.label, 'state': self.state, 'stage': self.stage,
+                'done': self.done, 'total': self.total, 'elapsed': round(self.elapsed(), 1), 'error': self.error,
+            }
+
+    def _finish(self, state, result=None, error=None):
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.state = state
+            self.stage = 'concluído' if state == 'done' else 'falhou'
+            self.finished_at = time.time()
+        self._finished.set()
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='treino')
+    return _pool
+
+
+def _run(job, task):
+    with job._lock:
+        job.state = 'running'
+        job.stage = 'iniciando'
+        job.started_at = time.time()
+    try:
+        result = task(job)
+    except Exception as error:
+        job._finish('failed', error=f'{type(error).__name__}: {error}')
+    else:
+        job._finish('done', result)
+
+
+def _prune():
+    finished = sorted((job for job in _jobs.values() if job.finished), key=lambda job: job.finished_at)
+    for job in finished[:max(0, len(finished) - MAX_FINISHED)]:
+        del _jobs[job.key]
+
+
+def _schedule(key, label, task):
+    job = Job(key, label, task)
+    _jobs[key] = job
+    _prune()
+    _executor().submit(_run, job, task)
+    return job
+
+
+def submit(key, label, task):
+    """
+    Agenda `task(job)` no pool e retorna o Job. Um pedido com a mesma `key` de
+    um job já pedido recebe esse mesmo job, inclusive se ele falhou: um erro
+    que se repete não vira um ciclo de treinos, e o job só é refeito com
+    retry(). `task` informa o progresso com `job.update(...)`.
+    """
+    with _lock:
+        job = _jobs.get(key)
+        if job is not None:
+            return job
+        return _schedule(key, label, task)
+
+
+def retry(key):
+    """Refaz um job que falhou (pedido explícito do usuário) e retorna o novo Job; outros são mantidos."""
+    with _lock:
+        job = _jobs.get(key)
+        if job is None or job.state != 'failed' or job.task is None:
+            return job
+        return _schedule(key, job.label, job.task)
+
+
+def completed(key, label, result):
+    """Job já concluído com `result` (para o que não precisa rodar, ex.: um modelo já no registro)."""
+    with _lock:
+        job = _jobs.get(key)
+        if job is not None and not job.finished:
+            return job
+    job = Job(key, label)
+    job.started_at = job.submitted_at
+    job._finish('done', result)
+    return job
+
+
+def active():
+    """Jobs na fila ou rodando, de qualquer sessão, na ordem em que foram pedidos."""
+    with _lock:
+        return sorted((job for job in _jobs.values() if not job.finished), key=lambda job: job.submitted_at)
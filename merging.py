@@ -0,0 +1,212 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataset import CACHE_ROOT, SOURCES, file_version, source_path
+from panel import ID_COLUMN, split_year_column
+from students import normalize_name
+
+# Resultados intermediários de cada etapa, por hash das entradas
+MERGE_DIR = os.path.join(CACHE_ROOT, 'merge')
+
+# Linhas lidas, cruzadas e gravadas por vez
+CHUNKSIZE = 50_000
+
+# Campos do PEDE levados para o dataset mesclado (em qualquer ano em que existam)
+MERGED_FIELDS = [
+    'INSTITUICAO_ENSINO_ALUNO', 'IDADE_ALUNO', 'PONTO_VIRADA', 'INDE', 'PEDRA',
+    'IAA', 'IEG', 'IPS', 'IDA', 'IPP', 'IPV', 'IAN', 'CG', 'CF', 'CT',
+]
+
+# Coluna do cadastro com o nome do aluno ('Aluno 1', que corresponde a 'ALUNO-1' no PEDE)
+CADASTRAL_NAME = 'NomeAluno'
+
+# Chave normalizada usada no cruzamento e número sequencial do aluno (coluna nome_ajustado)
+JOIN_KEY = '_chave'
+ADJUSTED_NAME = 'nome_ajustado'
+_NUMBER = re.compile(r'(\d+)\s*$')
+
+# Versão da lógica das etapas: mudá-la invalida os intermediários em cache
+STAGE_VERSION = 1
+
+
+def _read_text(path, delimiter, chunksize):
+    # Tudo como texto e sem converter ausentes: o CSV gerado repete os valores exatamente como estão nas fontes
+    return pd.read_csv(path, delimiter=delimiter, dtype=str, keep_default_na=False, na_filter=False,
+                       chunksize=chunksize)
+
+
+def _stage_path(stage, *versions):
+    digest = '-'.join(version[:16] for version in versions)
+    return os.path.join(MERGE_DIR, f'{stage}-v{STAGE_VERSION}-{digest}.parquet')
+
+
+def _remove_stale(keep):
+    # Intermediários antigos da mesma etapa não serão mais usados
+    prefix = os.path.basename(keep).rsplit('-v', 1)[0] + '-v'
+    for filename in os.listdir(MERGE_DIR):
+        path = os.path.join(MERGE_DIR, filename)
+        if filename.startswith(prefix) and filename.endswith('.parquet') and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _write_stage(chunks, path):
+    # Grava os blocos num Parquet (escrita atômica); a memória usada é a de um bloco
+    os.makedirs(MERGE_DIR, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, path)
+    _remove_stale(path)
+    return path
+
+
+def merged_columns(columns):
+    """Colunas do PEDE mantidas no dataset mesclado, na ordem do arquivo original."""
+    return [c for c in columns if c == ID_COLUMN or (split_year_column(c) or ('', 0))[0] in MERGED_FIELDS]
+
+
+def project_pede(path, chunksize=CHUNKSIZE):
+    """
+    Etapa 1: colunas do PEDE usadas no dataset mesclado, mais a chave
+    normalizada do nome. Refeita só quando o CSV do PEDE muda.
+    """
+    output = _stage_path('pede', file_version(path))
+    if os.path.exists(output):
+        return output
+
+    def chunks():
+        for chunk in _read_text(path, SOURCES['pede'][1], chunksize):
+            chunk = chunk[merged_columns(chunk.columns)].copy()
+            chunk[JOIN_KEY] = chunk[ID_COLUMN].map(normalize_name)
+            yield chunk
+
+    return _write_stage(chunks(), output)
+
+
+def prepare_cadastral(path, delimiter=',', chunksize=CHUNKSIZE):
+    """
+    Etapa 2: cadastro dos alunos com a chave normalizada do nome e o número
+    sequencial do aluno. Refeita só quando o arquivo do cadastro muda.
+    """
+    # O delimitador muda a leitura, então faz parte da chave
+    output = _stage_path(f'cadastral-{delimiter.encode().hex()}', file_version(path))
+    if os.path.exists(output):
+        return output
+
+    def chunks():
+        for chunk in _read_text(path, delimiter, chunksize):
+            if CADASTRAL_NAME not in chunk.columns:
+                raise KeyError(f"o cadastro não tem a coluna '{CADASTRAL_NAME}'")
+            key = chunk[CADASTRAL_NAME].map(normalize_name)
+            number = key.str.extract(_NUMBER, expand=False).fillna('')
+            chunk = chunk.drop(columns=[ADJUSTED_NAME], errors='ignore')
+            chunk.insert(0, ADJUSTED_NAME, number)
+            chunk[JOIN_KEY] = key
+            yield chunk
+
+    return _write_stage(chunks(), output)
+
+
+def hash_join(pede_path, cadastral_path, destination, chunksize=CHUNKSIZE):
+    """
+    Etapa 3: junção interna pelo nome normalizado. A tabela hash é montada com
+    o cadastro (chave -> posições das linhas) e o PEDE é percorrido em blocos,
+    então só o cadastro e um bloco do PEDE ficam em memória. A ordem das linhas
+    segue a do PEDE (e a do cadastro quando há mais de uma correspondência).
+    Retorna a quantidade de linhas gravadas.
+    """
+    cadastral = pq.read_table(cadastral_path).to_pandas()
+    table = {}
+    for position, key in enumerate(cadastral[JOIN_KEY]):
+        table.setdefault(key, []).append(position)
+    cadastral = cadastral.drop(columns=JOIN_KEY)
+
+    _, delimiter = SOURCES['merged']
+    tmp_path = f'{destination}.{os.getpid()}.tmp'
+    total = 0
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as out:
+        for batch in pq.ParquetFile(pede_path).iter_batches(batch_size=chunksize):
+            chunk = batch.to_pandas()
+            left, right = [], []
+            for position, key in enumerate(chunk[JOIN_KEY]):
+                for match in table.get(key, ()):
+                    left.append(position)
+                    right.append(match)
+            joined = pd.concat([
+                chunk.drop(columns=JOIN_KEY).iloc[left].reset_index(drop=True),
+                cadastral.iloc[right].reset_index(drop=True),
+            ], axis=1)
+            joined.to_csv(out, sep=delimiter, index=False, header=(total == 0))
+            total += len(joined)
+    os.replace(tmp_path, destination)
+    return total
+
+
+def _manifest_path(destination):
+    digest = hashlib.sha256(os.path.abspath(destination).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(MERGE_DIR, f'{os.path.basename(destination)}-{digest}.json')
+
+
+def build_merged(cadastral_path, destination=None, delimiter=',', chunksize=CHUNKSIZE, force=False):
+    """
+    Refaz o dataset mesclado (PEDE × cadastro) em `destination` (por padrão, o
+    arquivo usado pelo app). Nada é refeito se nenhuma entrada mudou desde a
+    última execução e a saída está intacta; cada etapa reaproveita o seu
+    intermediário quando a sua entrada não mudou. Retorna (caminho, linhas ou
+    None se nada foi refeito).
+    """
+    destination = destination or source_path('merged')
+    pede_path = source_path('pede')
+    inputs = {'pede': file_version(pede_path), 'cadastral': file_version(cadastral_path),
+              'delimiter': delimiter, 'stage': STAGE_VERSION}
+    manifest_path = _manifest_path(destination)
+    if not force and os.path.exists(manifest_path) and os.path.exists(destination):
+        with open(manifest_path, encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous['inputs'] == inputs and previous['output'] == file_version(destination):
+            return destination, None
+
+    rows = hash_join(project_pede(pede_path, chunksize), prepare_cadastral(cadastral_path, delimiter, chunksize),
+                     destination, chunksize)
+    os.makedirs(MERGE_DIR, exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'inputs': inputs, 'output': file_version(destination), 'rows': rows}, f, indent=2)
+    return destination, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refaz o dataset mesclado a partir do PEDE e do cadastro dos alunos.')
+    parser.add_argument('cadastral', help=f"CSV do cadastro dos alunos (com a coluna {CADASTRAL_NAME}, ex.: 'Aluno 1')")
+    parser.add_argument('--output', help='arquivo de saída (padrão: o dataset mesclado usado pelo app)')
+    parser.add_argument('--delimiter', default=',', help='delimitador do CSV do cadastro')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help='linhas processadas por vez')
+    parser.add_argument('--force', action='store_true', help='refaz mesmo sem mudanças nas entradas')
+    args = parser.parse_args()
+
+    path, rows = build_merged(args.cadastral, args.output, args.delimiter, args.chunksize, args.force)
+    if rows is None:
+        print(f'{path} já está atualizado')
+    else:
+        print(f'{rows} alunos gravados em {path}')
+
+
+if __name__ == '__main__':
+    main()
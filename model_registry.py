@@ -0,0 +1,302 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+from dataset import BASE_DIR, DATA_DIR
+from preprocessing import FeaturePipeline
+from tracing import traced
+from tree_ensemble import TreeEnsemble
+
+# Diretório dos artefatos: models/<nome>/<chave>/{model.pkl, model.npz, pipeline.json, metadata.json}.
+# model.npz é o modelo exportado para arrays (quando o motor permite), usado na inferência.
+# Fica na pasta dos dados: modelos treinados com outra cópia (ex.: sintética) não são publicados para o app real
+REGISTRY_DIR = os.path.join(DATA_DIR, 'models')
+
+# Arquivo com a chave da versão publicada de cada modelo
+LATEST_FILE = 'LATEST'
+
+# Quantidade de versões antigas mantidas para rollback
+KEEP_VERSIONS = 10
+
+# Intervalo mínimo entre conferências do LATEST por um modelo já em memória
+# (publicações feitas por este processo valem na hora; as de outros processos, em até esse tempo)
+HANDLE_CHECK_SECONDS = 2.0
+
+_key_locks = {}
+_locks_guard = threading.Lock()
+
+# Versões publicadas em memória, compartilhadas por todas as sessões: (nome, raiz, em arrays) -> ModelHandle
+_handles = {}
+_handles_lock = threading.Lock()
+
+
+def artifact_key(X, y, features, estimator, params):
+    """
+    Chave do artefato: hash dos dados de treino, da lista de features, do
+    estimador e dos hiperparâmetros. Qualquer mudança gera uma nova versão.
+    """
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    digest.update(pd.util.hash_pandas_object(y, index=False).values.tobytes())
+    spec = {'features': list(features), 'estimator': estimator, 'params': params}
+    digest.update(json.dumps(spec, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()[:20]
+
+
+def _model_dir(name, root=REGISTRY_DIR):
+    return os.path.join(root, name)
+
+
+def _atomic_write_text(path, text):
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _load_pipeline(path):
+    if os.path.exists(os.path.join(path, 'pipeline.json')):
+        with open(os.path.join(path, 'pipeline.json'), encoding='utf-8') as f:
+            return FeaturePipeline.from_dict(json.load(f))
+    # Versões antigas guardavam o pipeline em pickle
+    if os.path.exists(os.path.join(path, 'pipeline.pkl')):
+        import joblib
+        return joblib.load(os.path.join(path, 'pipeline.pkl'))
+    return None
+
+
+def read_metadata(name, key, root=REGISTRY_DIR):
+    """Metadados de uma versão, sem carregar o modelo; None se ela não existir."""
+    try:
+        with open(os.path.join(_model_dir(name, root), key, 'metadata.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_artifact(name, key, root=REGISTRY_DIR, compiled=False):
+    """
+    Retorna (modelo, metadados, pipeline) de uma versão, ou None se ela não
+    existir. O pipeline é None para versões salvas sem pré-processamento.
+    Com `compiled`, o modelo vem da versão em arrays quando ela existe, sem
+    importar o sklearn nem desserializar objetos.
+    """
+    metadata = read_metadata(name, key, root)
+    if metadata is None:
+        return None
+    path = os.path.join(_model_dir(name, root), key)
+    pipeline = _load_pipeline(path)
+    if compiled and os.path.exists(os.path.join(path, 'model.npz')):
+        return TreeEnsemble.load(os.path.join(path, 'model.npz')), metadata, pipeline
+    import joblib
+    return joblib.load(os.path.join(path, 'model.pkl')), metadata, pipeline
+
+
+def save_artifact(name, key, model, metadata, pipeline=None, compiled=None, root=REGISTRY_DIR):
+    """
+    Grava o artefato de forma atômica: tudo é escrito num diretório temporário
+    que só depois é renomeado para o diretório final. Se outro processo já
+    publicou a mesma chave, a versão existente é mantida. `compiled` é a
+    versão do modelo em arrays (TreeEnsemble), se houver.
+    """
+    import joblib
+
+    model_dir = _model_dir(name, root)
+    os.makedirs(model_dir, exist_ok=True)
+    final_path = os.path.join(model_dir, key)
+    tmp_path = os.path.join(model_dir, f'.{key}.{os.getpid()}.{threading.get_ident()}.tmp')
+    os.makedirs(tmp_path, exist_ok=True)
+    metadata = dict(metadata, name=name, key=key, created_at=time.time(), compiled=compiled is not None)
+    joblib.dump(model, os.path.join(tmp_path, 'model.pkl'))
+    if compiled is not None:
+        compiled.save(os.path.join(tmp_path, 'model.npz'))
+    if pipeline is not None:
+        with open(os.path.join(tmp_path, 'pipeline.json'), 'w', encoding='utf-8') as f:
+            json.dump(pipeline.to_dict(), f, indent=2, ensure_ascii=False)
+    with open(os.path.join(tmp_path, 'metadata.json'), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, default=str)
+    try:
+        os.rename(tmp_path, final_path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return metadata
+
+
+def save_compiled(name, key, compiled, pipeline=None, root=REGISTRY_DIR):
+    """
+    Acrescenta a um artefato já salvo a versão em arrays (ou registra que não
+    há) e o pipeline em JSON, e retorna os metadados.
+    """
+    path = os.path.join(_model_dir(name, root), key)
+    with open(os.path.join(path, 'metadata.json'), encoding='utf-8') as f:
+        metadata = json.load(f)
+    if pipeline is not None and not os.path.exists(os.path.join(path, 'pipeline.json')):
+        _atomic_write_text(os.path.join(path, 'pipeline.json'),
+                           json.dumps(pipeline.to_dict(), indent=2, ensure_ascii=False))
+    if compiled is not None:
+        tmp_path = os.path.join(path, f'.model.{os.getpid()}.{threading.get_ident()}.npz')
+        compiled.save(tmp_path)
+        os.replace(tmp_path, os.path.join(path, 'model.npz'))
+    metadata['compiled'] = compiled is not None
+    _atomic_write_text(os.path.join(path, 'metadata.json'), json.dumps(metadata, indent=2, default=str))
+    _forget(name, root)
+    return metadata
+
+
+def update_metadata(name, key, root=REGISTRY_DIR, **fields):
+    """Acrescenta campos aos metadados de uma versão já salva e retorna os metadados."""
+    path = os.path.join(_model_dir(name, root), key, 'metadata.json')
+    with open(path, encoding='utf-8') as f:
+        metadata = json.load(f)
+    metadata.update(fields)
+    _atomic_write_text(path, json.dumps(metadata, indent=2, default=str))
+    _forget(name, root)
+    return metadata
+
+
+def publish(name, key, root=REGISTRY_DIR):
+    """Marca uma versão como a atual do modelo e remove versões muito antigas."""
+    _atomic_write_text(os.path.join(_model_dir(name, root), LATEST_FILE), key)
+    _forget(name, root)
+    _prune(name, keep=key, root=root)
+
+
+def latest_key(name, root=REGISTRY_DIR):
+    """Chave da versão publicada, ou None."""
+    try:
+        with open(os.path.join(_model_dir(name, root), LATEST_FILE), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_latest(name, root=REGISTRY_DIR, compiled=False):
+    """Retorna (modelo, metadados, pipeline) da versão publicada, ou None."""
+    key = latest_key(name, root)
+    return load_artifact(name, key, root, compiled) if key else None
+
+
+def list_versions(name, root=REGISTRY_DIR):
+    """Metadados de todas as versões guardadas, da mais recente para a mais antiga."""
+    model_dir = _model_dir(name, root)
+    if not os.path.isdir(model_dir):
+        return []
+    versions = []
+    for entry in os.listdir(model_dir):
+        path = os.path.join(model_dir, entry, 'metadata.json')
+        if not entry.startswith('.') and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                versions.append(json.load(f))
+    return sorted(versions, key=lambda m: m['created_at'], reverse=True)
+
+
+def rollback(name, key, root=REGISTRY_DIR):
+    """Volta a publicar uma versão anterior."""
+    if load_artifact(name, key, root) is None:
+        raise KeyError(f"Versão '{key}' do modelo '{name}' não encontrada")
+    publish(name, key, root)
+
+
+def _prune(name, keep, root=REGISTRY_DIR):
+    for metadata in list_versions(name, root)[KEEP_VERSIONS:]:
+        if metadata['key'] != keep:
+            shutil.rmtree(os.path.join(_model_dir(name, root), metadata['key']), ignore_errors=True)
+
+
+def _key_lock(name, key):
+    with _locks_guard:
+        return _key_locks.setdefault((name, key), threading.Lock())
+
+
+def get_or_train(name, key, train, activate=True, root=REGISTRY_DIR):
+    """
+    Retorna (modelo, metadados, pipeline) da versão `key`, treinando com
+    `train()` apenas se ela ainda não existir. `train` deve retornar
+    (modelo, metadados, pipeline, modelo em arrays ou None). Com `activate`, a
+    versão obtida passa a ser a atual.
+    """
+    cached = load_artifact(name, key, root)
+    if cached is None:
+        # Evita treinos duplicados da mesma versão por sessões simultâneas
+        with _key_lock(name, key):
+            cached = load_artifact(name, key, root)
+            if cached is None:
+                model, metadata, pipeline, compiled = train()
+                cached = model, save_artifact(name, key, model, metadata, pipeline, compiled, root), pipeline
+    if activate and latest_key(name, root) != key:
+        publish(name, key, root)
+    return cached
+
+
+class ModelHandle:
+    """
+    Versão publicada de um modelo carregada em memória: modelo, pipeline,
+    metadados e chave (None para o arquivo legado, que não tem pipeline nem
+    metadados).
+    """
+
+    __slots__ = ('name', 'key', 'model', 'metadata', 'pipeline', 'checked_at')
+
+    def __init__(self, name, key, model, metadata, pipeline):
+        self.name = name
+        self.key = key
+        self.model = model
+        self.metadata = metadata
+        self.pipeline = pipeline
+        self.checked_at = time.monotonic()
+
+
+def _forget(name, root):
+    with _handles_lock:
+        for pool_key in [k for k in _handles if k[:2] == (name, root)]:
+            del _handles[pool_key]
+
+
+@traced('model_load')
+def _load_handle(name, key, fallback_path, root, compiled):
+    if key is not None:
+        loaded = load_artifact(name, key, root, compiled)
+        if loaded is not None:
+            return ModelHandle(name, key, *loaded)
+    if fallback_path is None:
+        raise FileNotFoundError(f"Nenhuma versão publicada do modelo '{name}'")
+    import joblib
+    return ModelHandle(name, None, joblib.load(os.path.join(BASE_DIR, fallback_path)), {}, None)
+
+
+def model_handle(name, fallback_path=None, root=REGISTRY_DIR, compiled=True):
+    """
+    Versão publicada do modelo para inferência (a versão em arrays, se existir),
+    carregada uma vez e compartilhada por todas as sessões do processo. Sem
+    versões no registro, usa o arquivo legado `fallback_path`. Dentro de
+    HANDLE_CHECK_SECONDS o modelo em memória é devolvido sem tocar o disco;
+    depois disso só o LATEST é relido, e o modelo só é recarregado se mudou.
+    """
+    pool_key = (name, root, compiled)
+    handle = _handles.get(pool_key)
+    if handle is not None and time.monotonic() - handle.checked_at < HANDLE_CHECK_SECONDS:
+        return handle
+    with _handles_lock:
+        handle = _handles.get(pool_key)
+        if handle is not None and time.monotonic() - handle.checked_at < HANDLE_CHECK_SECONDS:
+            return handle
+        key = latest_key(name, root)
+        if handle is None or handle.key != key:
+            handle = _load_handle(name, key, fallback_path, root, compiled)
+        handle.checked_at = time.monotonic()
+        _handles[pool_key] = handle
+        return handle
+
+
+def load_model(name, fallback_path=None, root=REGISTRY_DIR, compiled=True):
+    """
+    (modelo, pipeline) publicados para inferência (ver model_handle); o
+    arquivo legado não tem pipeline (None).
+    """
+    handle = model_handle(name, fallback_path, root, compiled)
+    return handle.model, handle.pipeline
@@ -1,6 +1,9 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
+import static_bundle
+from analysis import PARAMETERS, indicator_figure, pedra_figure, ponto_virada_figure
+from ingestion import load_cohort_index, load_cube, store_version
+from panel import PEDRA_LABELS
+from utils import run_traced
 
 # Configurar a página do Streamlit
 st.set_page_config(
@@ -8,66 +11,15 @@ st.set_page_config(
     page_icon="✨",
 )
 
-# Carregar o dataset
-df = pd.read_csv('PEDE_PASSOS_DATASET_FIAP.csv', delimiter=';')
-
-# Parâmetros que vamos analisar
-parameters = ['IPV', 'INDE', 'IAA', 'IEG', 'IPS', 'IDA', 'IPP', 'IAN']
-
-# Converter colunas relevantes para numérico
-for param in parameters:
-    for year in ['2020', '2021', '2022']:
-        col_name = f'{param}_{year}'
-        df[col_name] = pd.to_numeric(df[col_name], errors='coerce')
-
-# Função para calcular a média de um parâmetro por ano
-def calculate_mean(param):
-    return {
-        '2020': df[f'{param}_2020'].mean(),
-        '2021': df[f'{param}_2021'].mean(),
-        '2022': df[f'{param}_2022'].mean()
-    }
-
-# Calcular as médias para cada parâmetro
-means = {param: calculate_mean(param) for param in parameters}
-
-# Função para criar DataFrame para um parâmetro
-def create_dataframe(param):
-    return pd.DataFrame(list(means[param].items()), columns=['Year', f'{param}_Mean'])
-
-# Criar DataFrames para cada parâmetro
-dataframes = {param: create_dataframe(param) for param in parameters}
-
-# Contar a quantidade de cada pedra por ano
-pedra_count_2020 = df['PEDRA_2020'].value_counts().reset_index().rename(columns={'PEDRA_2020': 'Pedra', 'count': '2020'})
-pedra_count_2021 = df['PEDRA_2021'].value_counts().reset_index().rename(columns={'PEDRA_2021': 'Pedra', 'count': '2021'})
-pedra_count_2022 = df['PEDRA_2022'].value_counts().reset_index().rename(columns={'PEDRA_2022': 'Pedra', 'count': '2022'})
-# Mesclar os DataFrames de pedras em um único DataFrame
-pedra_counts = pd.merge(pedra_count_2020, pedra_count_2021, on='Pedra', how='outer')
-pedra_counts = pd.merge(pedra_counts, pedra_count_2022, on='Pedra', how='outer').fillna(0)
-# Contar a frequência de cada valor de "Pedra" em todos os anos combinados
-pedra_counts['Total'] = pedra_counts[['2020', '2021', '2022']].sum(axis=1)
-# Filtrar para manter apenas "Pedras" que aparecem mais de uma vez no total
-pedra_counts = pedra_counts[pedra_counts['Total'] > 5]
-# Remover a coluna "Total" após a filtragem
-pedra_counts = pedra_counts.drop(columns=['Total'])
-
-# Contar a quantidade de "Sim" e "Não" para PONTO_VIRADA por ano
-ponto_virada_count = {
-    '2020': df['PONTO_VIRADA_2020'].value_counts(),
-    '2021': df['PONTO_VIRADA_2021'].value_counts(),
-    '2022': df['PONTO_VIRADA_2022'].value_counts()
+# Filtros de coorte da barra lateral
+filter_labels = {
+    'INSTITUICAO_ENSINO_ALUNO': 'Instituição de ensino',
+    'FASE': 'Fase',
+    'TURMA': 'Turma',
+    'PEDRA': 'Pedra',
+    'BOLSISTA': 'Bolsista',
 }
 
-# Transformar em df para plot futuro
-ponto_virada_df = pd.DataFrame.from_dict(ponto_virada_count, orient='index').transpose().fillna(0)
-# Contar a frequência de cada valor de "Pedra" em todos os anos combinados
-ponto_virada_df['Total'] = ponto_virada_df[['2020', '2021', '2022']].sum(axis=1)
-# Filtrar para manter apenas "Pedras" que aparecem mais de uma vez no total
-ponto_virada_df = ponto_virada_df[ponto_virada_df['Total'] > 5]
-# Remover a coluna "Total" após a filtragem
-ponto_virada_df = ponto_virada_df.drop(columns=['Total'])
-
 # Descrições dos indicadores
 descriptions = {
     'IPV': '''
@@ -112,15 +64,25 @@ descriptions = {
     '''
 }
 
-# Função para plotar gráficos
-def plot_parameter(param, color):
-    df = dataframes[param]
-    fig, ax = plt.subplots()
-    ax.plot(df['Year'], df[f'{param}_Mean'], marker='o', linestyle='-', color=color)
-    ax.set_xlabel('Ano')
-    ax.set_ylabel(f'Média do {param}')
-    ax.set_title(f'Média do {param} por Ano')
-    st.pyplot(fig)
+# Gráficos sem filtros vêm do pacote estático, quando ele já foi gerado para esta versão dos dados;
+# os demais são renderizados uma vez por versão dos dados e filtros
+def show_figure(figure_id, render, filters):
+    image = render() if filters else static_bundle.figure(figure_id, render)
+    st.image(image, width='stretch')
+
+# Dimensões disponíveis para detalhar os indicadores
+drill_down_labels = {
+    'INSTITUICAO_ENSINO_ALUNO': 'Instituição de ensino',
+    'FASE': 'Fase',
+    'TURMA': 'Turma',
+    'FAIXA_ETARIA': 'Faixa etária',
+}
+
+# Médias (ou outra estatística) de um indicador por ano e dimensão, a partir do cubo de agregados
+def drill_down(param, dimension, statistic, filters):
+    table = load_cube().rollup(['ANO', dimension], filters, statistic)[param].unstack('ANO')
+    table.columns.name = 'Ano'
+    return table
 
 # Função principal para a página do Streamlit
 def run():
@@ -128,31 +90,59 @@ def run():
 
     st.sidebar.success("Selecione uma demonstração acima. 🚀")
 
-    for param in parameters:
+    data_version = store_version()
+
+    # Filtros combinados por interseção dos bitmaps de cada valor escolhido
+    index = load_cohort_index()
+    st.sidebar.markdown("### Filtros")
+    filters = {}
+    for field, label in filter_labels.items():
+        options = index.members[field]
+        if field == 'PEDRA':
+            # Só as pedras de verdade: os demais valores do campo são códigos inválidos
+            options = [pedra for pedra in PEDRA_LABELS if pedra in options]
+        chosen = st.sidebar.multiselect(label, options=options)
+        if chosen:
+            filters[field] = sorted(chosen)
+    # Uma combinação válida de filtros pode não selecionar ninguém: aí não há o que desenhar
+    show_charts = True
+    if filters:
+        selected = index.student_counts(filters).sum()
+        show_charts = selected > 0
+        if show_charts:
+            st.info(f"Exibindo {selected} registros (aluno × ano) que atendem aos filtros.")
+        else:
+            st.info("Nenhum registro (aluno × ano) atende aos filtros: os gráficos não são exibidos.")
+
+    for param in PARAMETERS:
         st.write(f"## {param}")
         st.markdown(descriptions[param])
-        plot_parameter(param, 'b' if param in ['INDE', 'IAN'] else 'g')
+        if show_charts:
+            show_figure(f'indicator_mean-{param}', lambda: indicator_figure(param, data_version, filters), filters)
 
     st.markdown("### Quantidade de alunos em cada Pedra por Ano")
 
-    # Plotar o gráfico da quantidade de cada pedra
-    fig, ax = plt.subplots()
-    pedra_counts.plot(kind='bar', x='Pedra', ax=ax, alpha=0.75)
-    ax.set_title('Quantidade de alunos em cada Pedra por Ano')
-    ax.set_xlabel('Pedra')
-    ax.set_ylabel('Quantidade')
-    st.pyplot(fig)
+    if show_charts:
+        show_figure('pedra_counts', lambda: pedra_figure(data_version, filters), filters)
 
     # Quantidade de Ponto de Virada por ano
     st.markdown("### Quantidade de alunos que atingiram o Ponto de Virada por Ano")
 
-    # Plotar o gráfico de PONTO_VIRADA
-    fig, ax = plt.subplots()
-    ponto_virada_df.plot(kind='bar', ax=ax)
-    ax.set_xlabel('Resposta')
-    ax.set_ylabel('Quantidade')
-    ax.set_title('Quantidade de alunos que atingiram o Ponto de Virada por Ano')
-    st.pyplot(fig)
+    if show_charts:
+        show_figure('ponto_virada_counts', lambda: ponto_virada_figure(data_version, filters), filters)
+
+    # Detalhamento: respondido pelos agregados pré-calculados, sem voltar às linhas
+    st.markdown("## Detalhamento dos Indicadores 🔎")
+    cube = load_cube()
+    param = st.selectbox('Indicador', options=PARAMETERS)
+    dimension = st.selectbox('Detalhar por', options=list(drill_down_labels), format_func=drill_down_labels.get)
+    statistic = st.radio('Estatística', options=['mean', 'std', 'count'], horizontal=True,
+                         format_func={'mean': 'Média', 'std': 'Desvio padrão', 'count': 'Alunos avaliados'}.get)
+    # Os filtros da barra lateral que são dimensões do cubo valem também para o detalhamento
+    cube_filters = {field: values for field, values in filters.items() if field in cube.members}
+    if len(cube_filters) < len(filters):
+        st.caption("Os filtros de Pedra e Bolsista não se aplicam ao detalhamento.")
+    st.dataframe(drill_down(param, dimension, statistic, cube_filters))
 
     # Adicionar Resumo da Análise
     st.markdown("## Análise de Resultados")
@@ -176,5 +166,5 @@ def run():
     """)
 
 if __name__ == "__main__":
-    run()
+    run_traced(run, '0_Análise_de_Indicadores')
 
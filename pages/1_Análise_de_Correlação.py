@@ -1,8 +1,8 @@
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from sklearn.preprocessing import LabelEncoder
+import static_bundle
+from analysis import heatmap_figure, target_top_correlations
+from ingestion import pair_years, store_version
+from utils import run_traced
 
 # Configurar a página do Streamlit
 st.set_page_config(
@@ -26,80 +26,48 @@ def run():
         '''
     )
 
-    # Carregar o dataset final merged
-    df = pd.read_csv('PEDE_PASSOS_DATASET_FIAP.csv', delimiter=';')
+    # Par de anos mais recente: performance do ano anterior e targets do ano seguinte
+    pairs = pair_years()
+    if not pairs:
+        st.info("Os dados ainda não têm dois anos consecutivos para calcular as correlações.")
+        return
+    year = pairs[-1]
+    target_year = year + 1
 
-    # Converter colunas relevantes para numérico, tratando valores de string
-    label_encoders = {}
-    for column in df.columns:
-        if df[column].dtype == 'object':
-            label_encoders[column] = LabelEncoder()
-            df[column] = label_encoders[column].fit_transform(df[column])
-        else:
-            df[column] = pd.to_numeric(df[column], errors='coerce')
+    version = store_version()
 
-    # Listas de colunas para análise
-    performance_columns = ['PEDRA_2021', 'INDE_2021', 'IAA_2021', 'IEG_2021', 'IPS_2021', 'IDA_2021', 'IPP_2021', 'IPV_2021', 'IAN_2021']
+    # Heatmaps renderizados uma vez por versão dos dados e compartilhados entre as sessões; com o
+    # pacote estático gerado para esta versão, imagens e tabelas vêm dele, sem calcular a correlação
+    def plot_target(target):
+        image = static_bundle.figure(f'correlation_heatmap-{target}', lambda: heatmap_figure(year, target, version))
+        st.image(image, width='stretch')
 
-    # Verificar a presença de IPV_2022 e outras colunas nas listas
-    df['IPV_2022'] = pd.to_numeric(df['IPV_2022'], errors='coerce')
-    df['INDE_2022'] = pd.to_numeric(df['INDE_2022'], errors='coerce')
-
-    # Calcular correlações de performance anterior
-    performance_corr_matrix = df[performance_columns + ['IPV_2022']].corr()
-    performance_corr_with_ipv_2022 = performance_corr_matrix['IPV_2022'].drop('IPV_2022', errors='ignore').abs()
-    top3_performance_corr = performance_corr_with_ipv_2022.sort_values(ascending=False).head(7)
+    def top_correlations(target):
+        return static_bundle.table(f'top_correlations-{target}', lambda: target_top_correlations(year, target))
 
     # Plotar a matriz de correlação de performance anterior
-    st.markdown("### Matriz de Correlação de Performance do ano anterior com o IPV de 2022")
-    plt.figure(figsize=(15, 10))
-    sns.heatmap(performance_corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1)
-    plt.title('Matriz de Correlação de IPV 2022')
-    st.pyplot(plt)
-
-    st.write("Top 7 correlações de performance anterior com IPV 2022:", top3_performance_corr)
-
-    # Calcular correlações de INDE_2022
-    inde_corr_matrix = df[performance_columns + ['INDE_2022']].corr()
-    inde_corr_with_inde_2022 = inde_corr_matrix['INDE_2022'].drop('INDE_2022', errors='ignore').abs()
-    top3_inde_corr = inde_corr_with_inde_2022.sort_values(ascending=False).head(7)
-
-    # Calcular correlações de PEDRA_2022
-    pedra_corr_matrix = df[performance_columns + ['PEDRA_2022']].corr()
-    pedra_corr_with_pedra_2022 = pedra_corr_matrix['PEDRA_2022'].drop('PEDRA_2022', errors='ignore').abs()
-    top3_pedra_corr = pedra_corr_with_pedra_2022.sort_values(ascending=False).head(7)
-
-    # Calcular correlações de PONTO_VIRADA_2022
-    ponto_virada_corr_matrix = df[performance_columns + ['PONTO_VIRADA_2022']].corr()
-    ponto_virada_corr_with_ponto_virada_2022 = ponto_virada_corr_matrix['PONTO_VIRADA_2022'].drop('PONTO_VIRADA_2022', errors='ignore').abs()
-    top3_ponto_virada_corr = ponto_virada_corr_with_ponto_virada_2022.sort_values(ascending=False).head(7)
-
-    # Plotar a matriz de correlação de INDE_2022
-    st.markdown("### Matriz de Correlação de Performances do ano anterior com o INDE de 2022")
-    plt.figure(figsize=(15, 10))
-    sns.heatmap(inde_corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1)
-    plt.title('Matriz de Correlação de INDE 2022')
-    st.pyplot(plt)
-
-    st.write("Top 7 correlações de performance anterior com INDE 2022:", top3_inde_corr)
-
-    # Plotar a matriz de correlação de PEDRA_2022
-    st.markdown("### Matriz de Correlação de Performances do ano anterior com a PEDRA de 2022")
-    plt.figure(figsize=(15, 10))
-    sns.heatmap(pedra_corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1)
-    plt.title('Matriz de Correlação de PEDRA 2022')
-    st.pyplot(plt)
-
-    st.write("Top 7 correlações de performance anterior com PEDRA 2022:", top3_pedra_corr)
-
-    # Plotar a matriz de correlação de PONTO_VIRADA_2022
-    st.markdown("### Matriz de Correlação de Performance do ano anterior com o PONTO de VIRADA de 2022")
-    plt.figure(figsize=(15, 10))
-    sns.heatmap(ponto_virada_corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1)
-    plt.title('Matriz de Correlação de PONTO VIRADA 2022')
-    st.pyplot(plt)
-
-    st.write("Top 7 correlações de performance anterior com PONTO VIRADA 2022:", top3_ponto_virada_corr)
+    st.markdown(f"### Matriz de Correlação de Performance do ano anterior com o IPV de {target_year}")
+    plot_target(f'IPV_{target_year}')
+
+    st.write(f"Top 7 correlações de performance anterior com IPV {target_year}:", top_correlations(f'IPV_{target_year}'))
+
+    # Plotar a matriz de correlação de INDE
+    st.markdown(f"### Matriz de Correlação de Performances do ano anterior com o INDE de {target_year}")
+    plot_target(f'INDE_{target_year}')
+
+    st.write(f"Top 7 correlações de performance anterior com INDE {target_year}:", top_correlations(f'INDE_{target_year}'))
+
+    # Plotar a matriz de correlação de PEDRA
+    st.markdown(f"### Matriz de Correlação de Performances do ano anterior com a PEDRA de {target_year}")
+    plot_target(f'PEDRA_{target_year}')
+
+    st.write(f"Top 7 correlações de performance anterior com PEDRA {target_year}:", top_correlations(f'PEDRA_{target_year}'))
+
+    # Plotar a matriz de correlação de PONTO_VIRADA
+    st.markdown(f"### Matriz de Correlação de Performance do ano anterior com o PONTO de VIRADA de {target_year}")
+    plot_target(f'PONTO_VIRADA_{target_year}')
+
+    st.write(f"Top 7 correlações de performance anterior com PONTO VIRADA {target_year}:", top_correlations(f'PONTO_VIRADA_{target_year}'))
 
     # Adicionar uma seção de conclusão
     st.markdown("## Conclusão")
@@ -120,5 +88,5 @@ def run():
     )
 
 if __name__ == "__main__":
-    run()
+    run_traced(run, '1_Análise_de_Correlação')
 
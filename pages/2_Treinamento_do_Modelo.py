@@ -1,11 +1,13 @@
 import streamlit as st
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import GradientBoostingClassifier, GradientBoostingRegressor
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, mean_absolute_error, r2_score
-from sklearn.preprocessing import LabelEncoder
-import joblib
-import matplotlib.pyplot as plt
+import jobs
+from model_registry import latest_key, list_versions, publish, read_metadata, update_metadata
+from training import (
+    CLASSIFIER_NAME, DEFAULT_ENGINE, ENGINES, REGRESSOR_NAME,
+    classification_columns, compare_engines, training_frame, training_job,
+)
+from tuning import FOLDS, best_tuning, tune
+from utils import run_traced
 
 # Configurar a página do Streamlit
 st.set_page_config(
@@ -13,6 +15,82 @@ st.set_page_config(
     page_icon="🤖",
 )
 
+# Progresso dos treinos em segundo plano (de qualquer sessão), atualizado a cada segundo.
+# Quando os treinos que esta página espera terminam, a página inteira é refeita com os resultados
+@st.fragment(run_every=1.0)
+def show_jobs(waiting):
+    for job in jobs.active():
+        status = job.snapshot()
+        text = f"{status['label']}: {status['stage']} ({status['elapsed']:.0f} s)"
+        if status['total']:
+            st.progress(status['done'] / status['total'], text=f"{text}, {status['done']}/{status['total']} árvores")
+        else:
+            st.progress(0.0, text=text)
+    if all(job.finished for job in waiting):
+        st.rerun()
+
+
+def show_pending(job):
+    if job.state == 'failed':
+        # O job continua falho até o usuário pedir de novo (um erro que se repete não retreina sozinho)
+        st.error(f"O treino falhou: {job.error}")
+        st.button('Tentar novamente', key=f'retry-{job.key}', on_click=jobs.retry, args=(job.key,))
+    else:
+        st.info("Treinando em segundo plano: o resultado aparece aqui assim que o treino terminar.")
+
+
+def show_metrics(name, metrics):
+    if name == CLASSIFIER_NAME:
+        st.write(f"**Acurácia:** {metrics['accuracy']:.4f}")
+    else:
+        st.write(f"**MAE:** {metrics['mae']:.4f}")
+        st.write(f"**Acurácia (1-WAPE):** {metrics['wape_accuracy']:.4f}")
+
+
+def show_version(name, metadata, tuning=None):
+    """Motor, métricas e hiperparâmetros de uma versão (com o resumo da busca, se ela veio de uma)."""
+    engine = ENGINES.get(metadata.get('engine'), {}).get('label', metadata.get('estimator', ''))
+    st.write(f"**Motor:** {engine}")
+    show_metrics(name, metadata['metrics'])
+    st.write(f"**Hiperparâmetros:** {metadata.get('params') or 'padrão do motor'}")
+    tuning = tuning or metadata.get('tuning')
+    if tuning:
+        st.caption(f"Configuração da busca com validação cruzada de {tuning['folds']} folds "
+                   f"({tuning['metric']} médio: {tuning['mean_score']:.4f}).")
+
+
+# Modelo em uso pela página de previsões, lido do registro (abrir a página não treina nada)
+def show_published(name):
+    key = latest_key(name)
+    metadata = read_metadata(name, key) if key else None
+    if metadata is None:
+        st.info("Nenhuma versão publicada ainda: treine e publique um modelo abaixo.")
+        return
+    st.write("### Versão publicada")
+    show_version(name, metadata)
+
+
+def publish_version(name, key, tuning):
+    if tuning is not None:
+        update_metadata(name, key, tuning=tuning)
+    publish(name, key)
+
+
+# Um treino novo só passa a ser usado pelas previsões quando publicado pelo botão
+def show_candidate(name, job, tuning):
+    st.write(f"### Novo treino: {job.label}")
+    if job.state != 'done':
+        show_pending(job)
+        return
+    show_version(name, job.result, tuning)
+    key = job.result['key']
+    if latest_key(name) == key:
+        st.caption("Esta é a versão publicada, usada na página de previsões.")
+    else:
+        st.button('Publicar modelo', key=f'publish-{name}', on_click=publish_version, args=(name, key, tuning))
+        st.caption("Esta versão ainda não é a usada na página de previsões.")
+
+
 def run():
     st.write("# Treinamento de Modelo para Prever Ponto de Virada e INDE 📈")
 
@@ -26,66 +104,67 @@ def run():
         '''
     )
 
-    # Carregar o dataset final merged
-    df = pd.read_csv('Final_Merged_DataFrame.csv')
-
-    # Remover nulos na coluna target
-    df.dropna(subset=['PONTO_VIRADA_2022'], inplace=True)
-
-    # Converter colunas relevantes para numérico, tratando valores de string
-    label_encoders = {}
-    for column in df.columns:
-        # Remover nulos antes de codificar
-        df[column].dropna(inplace=True)
-        if df[column].dtype == 'object':
-            label_encoders[column] = LabelEncoder()
-            df[column] = label_encoders[column].fit_transform(df[column])
-        else:
-            df[column] = pd.to_numeric(df[column], errors='coerce')
+    # Frame do par de anos mais recente (a codificação é feita só nas features de cada modelo)
+    try:
+        df = training_frame()
+    except LookupError:
+        st.info("Os dados ainda não têm dois anos consecutivos para treinar os modelos.")
+        return
+    _, target = classification_columns(df)
 
     # Verificar se o target é binário
-    unique_targets = df['PONTO_VIRADA_2022'].unique()
+    unique_targets = df[target].unique()
     if len(unique_targets) > 2:
-        st.warning("O target 'PONTO_VIRADA_2022' contém mais de duas classes. Verifique os dados.")
-
-    # Selecionar colunas de performance para treino
-    performance_columns_class = [
-        'PEDRA_2021', 'IAA_2021', 'IEG_2021', 'IPS_2021', 
-        'IDA_2021', 'IPP_2021', 'IPV_2021']
-    
-    performance_columns_regress = [
-    'INDE_2021', 'IAA_2021', 'IEG_2021', 'IAN_2021', 
-    'IDA_2021', 'IPP_2021', 'IPV_2021']
-
-    target = 'PONTO_VIRADA_2022'
-    st.markdown("## Modelo de Classificação que prevê se haverá Ponto de Virada")
-
-    # Remover linhas com valores ausentes nas colunas selecionadas
-    df_performance_class = df.dropna(subset=performance_columns_class + [target])
-
-    X = df_performance_class[performance_columns_class]
-    y = df_performance_class[target]
+        st.warning(f"O target '{target}' contém mais de duas classes. Verifique os dados.")
 
-    # Dividir os dados em conjuntos de treino e teste
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    # Inicializar e treinar o modelo de Gradient Boosting
-    model = GradientBoostingClassifier(random_state=42)
-    model.fit(X_train, y_train)
-
-    # Prever e avaliar o desempenho
-    y_pred = model.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
-    precision = precision_score(y_test, y_pred, average='binary', zero_division=1)
-    recall = recall_score(y_test, y_pred, average='binary', zero_division=1)
-    f1 = f1_score(y_test, y_pred, average='binary', zero_division=1)
+    # Motor de treino dos novos treinos
+    engine = st.sidebar.selectbox(
+        'Motor de treino', options=list(ENGINES), index=list(ENGINES).index(DEFAULT_ENGINE),
+        format_func=lambda e: ENGINES[e]['label'],
+    )
+    label = ENGINES[engine]['label']
+
+    # Modo de ajuste: busca de hiperparâmetros com validação cruzada
+    if st.sidebar.checkbox('Modo de ajuste de hiperparâmetros'):
+        st.markdown("## Busca de hiperparâmetros")
+        st.markdown(
+            f'''
+            Cada combinação de hiperparâmetros é avaliada com validação cruzada de {FOLDS} folds, em paralelo.
+            Os resultados ficam salvos: uma busca interrompida continua de onde parou e, com os mesmos dados,
+            não é refeita. A melhor configuração é usada no próximo treino pedido abaixo e, ao publicar,
+            fica registrada na versão publicada.
+            '''
+        )
+        if st.button('Buscar hiperparâmetros'):
+            for name in (CLASSIFIER_NAME, REGRESSOR_NAME):
+                bar = st.progress(0.0, text=f'{name}')
+                summary = tune(df, name, engine, progress=lambda done, total: bar.progress(done / total, text=f'{name}: {done}/{total}'))
+                bar.empty()
+                st.write(f"**{name}**")
+                st.dataframe(summary[['params', 'mean_score', 'std_score', 'metric']])
+
+    # Treino só quando pedido pela sessão: os dois modelos em segundo plano, em paralelo, sem publicar
+    st.button(f'Treinar modelos ({label})', on_click=lambda: st.session_state.update(candidate_engine=engine))
+    st.caption("Treina (ou reutiliza do registro, se nada mudou) os dois modelos com a melhor configuração "
+               "da busca, se houver; a versão publicada só muda pelo botão 'Publicar modelo'.")
+    candidates = {}
+    candidate_engine = st.session_state.get('candidate_engine')
+    if candidate_engine is not None:
+        for name in (CLASSIFIER_NAME, REGRESSOR_NAME):
+            params, tuning = best_tuning(df, name, candidate_engine) or (None, None)
+            candidates[name] = training_job(name, df, params=params, engine=candidate_engine, publish=False), tuning
+    # Comparação dos motores só quando pedida pela sessão: são quatro treinos extras, com medição de memória
+    table, comparison_jobs = compare_engines(df) if st.session_state.get('compare_engines') else (None, [])
+    waiting = [j for j in [job for job, _ in candidates.values()] + comparison_jobs if not j.finished]
+    if waiting:
+        st.markdown("## Treinos em andamento ⏳")
+        show_jobs(waiting)
 
-    # Exibir métricas de desempenho
-    st.write(f"### Gradient Boosting")
-    st.write(f"**Acurácia:** {accuracy:.4f}")
+    st.markdown("## Modelo de Classificação que prevê se haverá Ponto de Virada")
 
-    # Salvar o modelo treinado
-    joblib.dump(model, 'gradient_boosting_model.pkl')
+    show_published(CLASSIFIER_NAME)
+    if CLASSIFIER_NAME in candidates:
+        show_candidate(CLASSIFIER_NAME, *candidates[CLASSIFIER_NAME])
 
     st.markdown(
         '''
@@ -96,37 +175,9 @@ def run():
 
     st.markdown("## Modelo de Regressão que prevê o INDE e a futura PEDRA")
 
-    # Remover nulos na coluna target
-    df.dropna(subset=['INDE_2022'], inplace=True)
-
-    target_regression = 'INDE_2022'
-
-    # Remover linhas com valores ausentes nas colunas selecionadas
-    df_performance_regression = df.dropna(subset=performance_columns_regress + [target_regression])
-
-    X_regression = df_performance_regression[performance_columns_regress]
-    y_regression = df_performance_regression[target_regression]
-
-    # Dividir os dados em conjuntos de treino e teste
-    X_train_regression, X_test_regression, y_train_regression, y_test_regression = train_test_split(X_regression, y_regression, test_size=0.2, random_state=42)
-
-    # Inicializar e treinar o modelo de Gradient Boosting para regressão
-    model_regression = GradientBoostingRegressor(random_state=42)
-    model_regression.fit(X_train_regression, y_train_regression)
-
-    # Prever e avaliar o desempenho
-    y_pred_regression = model_regression.predict(X_test_regression)
-    mae = mean_absolute_error(y_test_regression, y_pred_regression)
-    r2 = r2_score(y_test_regression, y_pred_regression)
-    wape = 1 - (mae / y_test_regression.mean())
-
-    # Exibir métricas de desempenho
-    st.write(f"### Gradient Boosting - Regressão")
-    st.write(f"**MAE:** {mae:.4f}")
-    st.write(f"**Acurácia (1-WAPE):** {wape:.4f}")
-
-    # Salvar o modelo treinado
-    joblib.dump(model_regression, 'gradient_boosting_model_regression.pkl')
+    show_published(REGRESSOR_NAME)
+    if REGRESSOR_NAME in candidates:
+        show_candidate(REGRESSOR_NAME, *candidates[REGRESSOR_NAME])
 
     st.markdown(
         '''
@@ -135,5 +186,26 @@ def run():
         '''
     )
 
+    with st.expander("Comparação dos motores de treino"):
+        st.markdown(
+            '''
+            O motor **Histogram Gradient Boosting** usa todos os núcleos da máquina, trata valores ausentes
+            sem descartar alunos e interrompe o treino quando a validação para de melhorar.
+            '''
+        )
+        if table is None:
+            st.button('Comparar motores', on_click=lambda: st.session_state.update(compare_engines=True))
+            st.caption("Treina os dois modelos com cada motor em segundo plano, medindo tempo e memória.")
+        else:
+            st.dataframe(table)
+            if comparison_jobs:
+                st.caption(f"{len(comparison_jobs)} modelo(s) da comparação ainda em treino.")
+
+    with st.expander("Versões salvas dos modelos"):
+        for name in (CLASSIFIER_NAME, REGRESSOR_NAME):
+            versions = list_versions(name)
+            st.write(f"**{name}**")
+            st.dataframe(pd.DataFrame([{'versão': v['key'], 'linhas': v['n_rows'], **v['metrics']} for v in versions]))
+
 if __name__ == "__main__":
-    run()
+    run_traced(run, '2_Treinamento_do_Modelo')
@@ -1,6 +1,15 @@
+import os
+import tempfile
+
 import streamlit as st
 import pandas as pd
-import joblib
+from figures import memory_figure
+from ingestion import load_student_index
+from panel import split_year_column
+from scoring import PEDRA_BINS, PEDRA_LABELS, input_bounds, load_handles, predict_inde, predict_ponto_virada, score_csv
+from students import batch_predictions
+from utils import run_traced
+from whatif import sensitivity
 
 # Configurar a página do Streamlit
 st.set_page_config(
@@ -8,6 +17,52 @@ st.set_page_config(
     page_icon="🔮",
 )
 
+# Gráficos da simulação: curvas para um indicador, superfícies para dois
+def show_whatif(grid):
+    version = str(grid.key)
+    if len(grid.fields) == 1:
+        field, axis = grid.fields[0], grid.axes[0]
+
+        def draw(ax):
+            ax.plot(axis, grid.probability, color='tab:blue')
+            ax.axhline(0.5, color='tab:blue', linestyle=':', linewidth=1)
+            ax.set_xlabel(field)
+            ax.set_ylabel('Probabilidade de Ponto de Virada', color='tab:blue')
+            ax.set_ylim(0, 1)
+            ax.axvline(float(grid.base[field]), color='gray', linestyle='--', linewidth=1)
+            inde_ax = ax.twinx()
+            inde_ax.plot(axis, grid.inde, color='tab:orange')
+            for limit in PEDRA_BINS[1:-1]:
+                inde_ax.axhline(limit, color='tab:orange', linestyle=':', linewidth=1)
+            inde_ax.set_ylabel('INDE previsto', color='tab:orange')
+            ax.set_title(f'Previsões variando {field}')
+
+        st.image(memory_figure('whatif_curve', version, draw, figsize=(8, 4)), width='stretch')
+        return
+
+    (x_field, y_field), (x_axis, y_axis) = grid.fields, grid.axes
+
+    def surface(values, label, levels, cmap):
+        def draw(ax):
+            # Eixo 0 da grade é o primeiro indicador (x); o contourf espera linhas = y
+            filled = ax.contourf(x_axis, y_axis, values.T, levels=20, cmap=cmap)
+            ax.figure.colorbar(filled, ax=ax, label=label)
+            lines = ax.contour(x_axis, y_axis, values.T, levels=levels, colors='black', linewidths=1)
+            ax.clabel(lines, fmt='%.3g', fontsize=8)
+            ax.plot(float(grid.base[x_field]), float(grid.base[y_field]), marker='o', color='white',
+                    markeredgecolor='black')
+            ax.set_xlabel(x_field)
+            ax.set_ylabel(y_field)
+            ax.set_title(label)
+        return draw
+
+    columns = st.columns(2)
+    columns[0].image(memory_figure('whatif_probability', version, surface(
+        grid.probability, 'Probabilidade de Ponto de Virada', [0.5], 'viridis'), figsize=(5, 4)), width='stretch')
+    columns[1].image(memory_figure('whatif_inde', version, surface(
+        grid.inde, 'INDE previsto', list(PEDRA_BINS[1:-1]), 'magma'), figsize=(5, 4)), width='stretch')
+
+
 def run():
     st.write("# Previsão do Ponto de Virada 🔮")
 
@@ -18,64 +73,78 @@ def run():
         '''
     )
 
-    # Carregar o modelo treinado
-    model = joblib.load('gradient_boosting_model.pkl')
-    model_regression = joblib.load('gradient_boosting_model_regression.pkl')
-
-    # Carregar o dataset original para pegar os valores máximos
-    df = pd.read_csv('Final_Merged_DataFrame.csv')
-
-    # Converter colunas de interesse para numérico
-    cols_to_numeric = [
-        'PEDRA_2021', 'INDE_2021', 'IAA_2021', 'IEG_2021', 'IPS_2021',
-        'IDA_2021', 'IPP_2021', 'IPV_2021', 'IAN_2021'
-    ]
-
-    performance_columns_class = [
-        'PEDRA_2021', 'IAA_2021', 'IEG_2021', 'IPS_2021', 
-        'IDA_2021', 'IPP_2021', 'IPV_2021']
-    
-    performance_columns_regress = [
-    'INDE_2021', 'IAA_2021', 'IEG_2021', 'IAN_2021', 
-    'IDA_2021', 'IPP_2021', 'IPV_2021']
-
-    for col in cols_to_numeric:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    # Remover valores NaN para calcular o máximo corretamente
-    df.dropna(subset=cols_to_numeric, inplace=True)
-
-    # Valores máximos para cada coluna
-    col_max = {
-        'INDE_2021': df['INDE_2021'].max(),
-        'IAA_2021': df['IAA_2021'].max(),
-        'IEG_2021': df['IEG_2021'].max(),
-        'IPS_2021': df['IPS_2021'].max(),
-        'IDA_2021': df['IDA_2021'].max(),
-        'IPP_2021': df['IPP_2021'].max(),
-        'IPV_2021': df['IPV_2021'].max(),
-        'IAN_2021': df['IAN_2021'].max()
-    }
-
-    # Mapeamento para 'PEDRA_2021'
-    pedra_mapping = {
-        0: 'Quartzo',
-        1: 'Ágata',
-        2: 'Ametista',
-        3: 'Topázio'
-    }
+    # Versão publicada dos modelos e seus pré-processamentos, em memória e compartilhada entre as sessões
+    classifier_handle, regressor_handle = load_handles()
+    classifier = (classifier_handle.model, classifier_handle.pipeline)
+    regressor = (regressor_handle.model, regressor_handle.pipeline)
+
+    # Ano base das features: o do par de anos em que os modelos publicados foram treinados
+    _, pipeline = classifier
+    _, pipeline_regression = regressor
+    year = split_year_column(pipeline.features[0])[1]
+
+    # Indicadores de interesse
+    indicators = ['INDE', 'IAA', 'IEG', 'IPS', 'IDA', 'IPP', 'IPV', 'IAN']
+
+    # Pedras conhecidas pelo classificador, na ordem das faixas de INDE
+    pedra_options = [p for p in PEDRA_LABELS if p in pipeline.categories.get(f'PEDRA_{year}', PEDRA_LABELS)]
+
+    # Valores máximos de cada indicador nos dados de treino, guardados com os modelos
+    bounds = input_bounds(classifier_handle, regressor_handle)
+    col_max = {indicator: bounds[indicator][1] for indicator in indicators}
+
+    # Busca de aluno: o formulário é preenchido com os dados dele no ano base
+    students = load_student_index()
+    st.write("## Buscar Aluno 🔎")
+    query = st.text_input('Nome ou ID do aluno (ex.: ALUNO-12, Aluno 12 ou o IdAluno)')
+    student = None
+    if query:
+        matches = students.search(query)
+        if matches:
+            student = st.selectbox('Aluno', options=matches)
+        else:
+            st.info("Nenhum aluno encontrado.")
+
+    prefill = {}
+    if student is not None:
+        st.write(f"### Histórico de {student}")
+        timeline = students.timeline(student).set_index('ANO')
+        st.dataframe(timeline[[c for c in ['PEDRA'] + indicators + ['PONTO_VIRADA'] if c in timeline.columns]])
+        row = students.row(student, year)
+        if row is None:
+            st.warning(f"{student} não tem dados de {year}: o formulário não foi preenchido.")
+        else:
+            prefill = row
+
+        # Previsões de todos os alunos, calculadas num único lote por versão dos dados e dos modelos
+        predictions = batch_predictions(students, classifier, regressor,
+                                        (classifier_handle.key, regressor_handle.key))
+        if student in predictions.index and pd.notna(predictions.loc[student, 'PROB_PONTO_VIRADA']):
+            predicted = predictions.loc[student]
+            st.write(
+                f"**Previsão com os dados de {year}:** Ponto de Virada {predicted['PONTO_VIRADA_PREVISTO']} "
+                f"({predicted['PROB_PONTO_VIRADA']:.2%}), INDE {predicted['INDE_PREVISTO']:.2f} ({predicted['PEDRA_PREVISTA']})"
+            )
+
+    # Valor inicial de um campo: o do aluno selecionado, dentro dos limites do formulário
+    def initial(indicator):
+        value = prefill.get(indicator) if len(prefill) else None
+        if value is None or pd.isna(value):
+            return 0.0
+        return min(max(float(value), 0.0), float(col_max[indicator]))
 
     # Definir os parâmetros de entrada com base nos valores min (0) e max calculados
+    pedra = prefill.get('PEDRA') if len(prefill) else None
+    values = {'PEDRA': st.selectbox('PEDRA', options=pedra_options,
+                                    index=pedra_options.index(pedra) if pedra in pedra_options else 0)}
+    for indicator in indicators:
+        values[indicator] = st.number_input(indicator, min_value=0.0, max_value=float(col_max[indicator]),
+                                            value=initial(indicator), step=0.01)
+
+    # Colunas <CAMPO>_<ANO> esperadas por cada modelo
     input_params = {
-        'PEDRA_2021': st.selectbox('PEDRA', options=[(0, 'Quartzo'), (1, 'Ágata'), (2, 'Ametista'), (3, 'Topázio')], format_func=lambda x: x[1])[0],
-        'INDE_2021': st.number_input('INDE', min_value=0.0, max_value=col_max['INDE_2021'], step=0.01),
-        'IAA_2021': st.number_input('IAA', min_value=0.0, max_value=col_max['IAA_2021'], step=0.01),
-        'IEG_2021': st.number_input('IEG', min_value=0.0, max_value=col_max['IEG_2021'], step=0.01),
-        'IPS_2021': st.number_input('IPS', min_value=0.0, max_value=col_max['IPS_2021'], step=0.01),
-        'IDA_2021': st.number_input('IDA', min_value=0.0, max_value=col_max['IDA_2021'], step=0.01),
-        'IPP_2021': st.number_input('IPP', min_value=0.0, max_value=col_max['IPP_2021'], step=0.01),
-        'IPV_2021': st.number_input('IPV', min_value=0.0, max_value=col_max['IPV_2021'], step=0.01),
-        'IAN_2021': st.number_input('IAN', min_value=0.0, max_value=col_max['IAN_2021'], step=0.01)
+        column: values[split_year_column(column)[0]]
+        for column in pipeline.features + pipeline_regression.features
     }
 
     # Botão para executar a previsão
@@ -83,35 +152,25 @@ def run():
         # Converter os parâmetros para um DataFrame
         input_df = pd.DataFrame([input_params])
 
-        # Fazer a previsão
-        prediction = model.predict(input_df[performance_columns_class])
-        prediction_proba = model.predict_proba(input_df[performance_columns_class])
+        # Fazer a previsão (com o mesmo pré-processamento usado no treino)
+        prediction = predict_ponto_virada(input_df, classifier).iloc[0]
 
         # Exibir o resultado da previsão
-        if prediction[0] == 1:
+        if prediction['PONTO_VIRADA_PREVISTO'] == 'Sim':
             st.success("O aluno provavelmente atingirá o Ponto de Virada! 🌟")
         else:
             st.warning("O aluno provavelmente não atingirá o Ponto de Virada.")
 
         # Exibir as probabilidades de previsão
         st.write("### Probabilidades de Previsão")
-        st.write(f"Probabilidade de Não: {prediction_proba[0][0]:.2%}")
-        st.write(f"Probabilidade de Sim: {prediction_proba[0][1]:.2%}")
+        st.write(f"Probabilidade de Não: {1 - prediction['PROB_PONTO_VIRADA']:.2%}")
+        st.write(f"Probabilidade de Sim: {prediction['PROB_PONTO_VIRADA']:.2%}")
 
         # Fazer a previsão
-        prediction_inde = model_regression.predict(input_df[performance_columns_regress])
-
-        inde_value = prediction_inde[0]
-        if 2.405 <= inde_value < 5.506:
-            pedra = "Quartzo"
-        elif 5.506 <= inde_value < 6.868:
-            pedra = "Ágata"
-        elif 6.868 <= inde_value < 8.230:
-            pedra = "Ametista"
-        elif 8.230 <= inde_value <= 9.294:
-            pedra = "Topázio"
-        else:
-            pedra = "Fora dos intervalos definidos"
+        prediction_inde = predict_inde(input_df, regressor).iloc[0]
+
+        inde_value = prediction_inde['INDE_PREVISTO']
+        pedra = prediction_inde['PEDRA_PREVISTA']
 
         # Exibir o resultado da previsão
         st.write(f"### Valor Previsto de INDE: {inde_value:.2f}")
@@ -119,9 +178,74 @@ def run():
             st.success(f"O aluno está previso para ser classificado na pedra: {pedra}")
         else: 
             st.warning(f"O aluno está previso para ser classificado na pedra: {pedra}")
-        
-if __name__ == "__main__":
-    run()
-
 
+    # Simulação: uma grade densa sobre um ou dois indicadores, pontuada num único lote por modelo
+    st.write("## Simulação: e se? 🧪")
+    st.markdown(
+        '''
+        Escolha um ou dois indicadores para ver como as previsões mudam quando só eles variam,
+        mantendo os demais valores do formulário. A simulação mostra a menor mudança que leva o aluno
+        ao Ponto de Virada e à próxima pedra.
+        '''
+    )
+    fields = st.multiselect('Indicadores a variar', options=indicators, max_selections=2)
+    if fields:
+        grid = sensitivity(classifier, regressor, values, fields, bounds,
+                           (classifier_handle.key, regressor_handle.key))
+        current = grid.current
+        st.write(
+            f"**Previsão atual:** Ponto de Virada {current['PONTO_VIRADA_PREVISTO']} "
+            f"({current['PROB_PONTO_VIRADA']:.2%}), INDE {current['INDE_PREVISTO']:.2f} ({current['PEDRA_PREVISTA']})"
+        )
+        show_whatif(grid)
+
+        def describe(change):
+            return ', '.join(f"{field} {values[field]:.2f} → {value:.2f} ({delta:+.2f})"
+                             for field, (value, delta) in change.items() if abs(delta) > 1e-9)
+
+        if current['PONTO_VIRADA_PREVISTO'] == 'Sim':
+            st.success("Com os valores atuais o aluno já é previsto no Ponto de Virada.")
+        else:
+            change = grid.to_ponto_virada()
+            if change is None:
+                st.info(f"Nenhuma combinação de {' e '.join(fields)} leva ao Ponto de Virada.")
+            else:
+                st.success(f"Menor mudança para o Ponto de Virada: {describe(change)}")
+
+        target = grid.next_pedra()
+        if target is None:
+            st.info("Não há pedra acima da prevista.")
+        else:
+            change = grid.to_next_pedra()
+            if change is None:
+                st.info(f"Nenhuma combinação de {' e '.join(fields)} leva à pedra {target[0]} (INDE ≥ {target[1]}).")
+            else:
+                st.success(f"Menor mudança para a pedra {target[0]} (INDE ≥ {target[1]}): {describe(change)}")
+
+    # Previsão em lote para uma turma inteira
+    st.write("## Previsão em Lote 📂")
+    st.markdown(
+        f'''
+        Envie um CSV com as colunas de {year} dos alunos (as mesmas do formulário acima) para prever
+        o Ponto de Virada, o INDE e a PEDRA de todos de uma vez. O arquivo é processado em blocos,
+        então turmas grandes não ocupam mais memória.
+        '''
+    )
+    uploaded = st.file_uploader('Arquivo CSV', type='csv')
+    delimiter = st.selectbox('Delimitador', options=[',', ';'])
+    if uploaded is not None and st.button('Prever lote'):
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as output:
+            output_path = output.name
+        try:
+            total = score_csv(uploaded, output_path, delimiter=delimiter, models=(classifier, regressor))
+        except ValueError as error:
+            # CSV sem as colunas dos modelos (ou com outro delimitador): nada é pontuado
+            st.error(f"Não foi possível prever o lote: {error}")
+        else:
+            with open(output_path, 'rb') as f:
+                st.download_button(f'Baixar previsões ({total} alunos)', f, file_name='previsoes.csv', mime='text/csv')
+        finally:
+            os.remove(output_path)
 
+if __name__ == "__main__":
+    run_traced(run, '3_Usando_o_Modelo')
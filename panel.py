@@ -0,0 +1,81 @@
+import re
+
+import pandas as pd
+
+from dataset import coerce_types
+
+# Colunas no formato <CAMPO>_<ANO>, ex.: INDE_2021, REC_EQUIPE_1_2021
+YEAR_COLUMN = re.compile(r'^(?P<field>.+)_(?P<year>\d{4})$')
+
+# Identificador do aluno no dataset PEDE
+ID_COLUMN = 'NOME'
+
+# Indicadores numéricos acompanhados ano a ano
+INDICATORS = ['INDE', 'IAA', 'IEG', 'IPS', 'IDA', 'IPP', 'IPV', 'IAN']
+
+# Pedras, na ordem das faixas de INDE (outros valores do campo PEDRA são códigos inválidos)
+PEDRA_LABELS = ['Quartzo', 'Ágata', 'Ametista', 'Topázio']
+
+# Campos repetitivos armazenados como categóricos
+CATEGORICAL_FIELDS = ['PEDRA', 'PONTO_VIRADA', 'INSTITUICAO_ENSINO_ALUNO']
+
+
+def split_year_column(column):
+    """Separa 'INDE_2021' em ('INDE', 2021); colunas sem ano retornam None."""
+    match = YEAR_COLUMN.match(column)
+    if match is None:
+        return None
+    return match.group('field'), int(match.group('year'))
+
+
+def detect_years(columns):
+    """Anos presentes nos nomes de colunas, em ordem crescente."""
+    return sorted({parsed[1] for parsed in map(split_year_column, columns) if parsed})
+
+
+def build_panel(df, id_column=ID_COLUMN):
+    """
+    Converte o formato largo (uma coluna por campo e ano) em um painel longo
+    com uma linha por (aluno, ano) e uma coluna por campo.
+
+    Um aluno só aparece em um ano se tiver algum dado naquele ano, o mesmo
+    critério usado antes pela limpeza por ano. Novos anos são detectados pelos
+    nomes das colunas, sem listas fixas.
+    """
+    year_columns = [c for c in df.columns if split_year_column(c)]
+    wide = df.set_index(id_column)[year_columns]
+    wide.columns = pd.MultiIndex.from_tuples(
+        [split_year_column(c) for c in year_columns], names=['CAMPO', 'ANO']
+    )
+    panel = wide.stack(level='ANO', future_stack=True).dropna(how='all')
+    panel.columns.name = None
+    panel = coerce_types(panel.reset_index())
+    panel['ANO'] = panel['ANO'].astype('int16')
+    for field in CATEGORICAL_FIELDS:
+        if field in panel.columns:
+            panel[field] = panel[field].astype('category')
+    return panel.sort_values(['ANO', id_column], kind='stable').reset_index(drop=True)
+
+
+def years(panel):
+    """Anos presentes no painel."""
+    return sorted(panel['ANO'].unique().tolist())
+
+
+def student_counts(panel):
+    """Quantidade de alunos por ano."""
+    return panel.groupby('ANO').size()
+
+
+def indicator_means(panel, indicators=INDICATORS):
+    """Média de cada indicador por ano (linhas = anos, colunas = indicadores)."""
+    indicators = [i for i in indicators if i in panel.columns]
+    return panel.groupby('ANO')[indicators].mean()
+
+
+def category_counts(panel, field):
+    """Contagem de cada valor de um campo categórico por ano (linhas = valores, colunas = anos)."""
+    counts = panel.groupby([field, 'ANO'], observed=True).size().unstack('ANO', fill_value=0)
+    counts.columns = counts.columns.astype(str)
+    counts.columns.name = None
+    return counts
@@ -0,0 +1,206 @@
+import argparse
+import collections
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from scoring import load_models, predict_inde, predict_ponto_virada
+
+# Janela de espera para juntar requisições num único lote
+MAX_WAIT_MS = 5
+# Quantidade máxima de alunos por chamada ao modelo
+MAX_BATCH = 512
+# Quantidade de latências guardadas para o cálculo dos percentis
+LATENCY_WINDOW = 10_000
+# Conexões aguardando aceite (o padrão do http.server é 5)
+REQUEST_QUEUE_SIZE = 256
+
+
+class RollingStats:
+    """Janela dos valores mais recentes (latências, tamanhos de lote) com percentis."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._values = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, value):
+        with self._lock:
+            self._values.append(value)
+            self.count += 1
+
+    def percentiles(self, scale=1.0):
+        """Contagem total e p50/p99 da janela, multiplicados por `scale`."""
+        with self._lock:
+            values = np.array(self._values, dtype='float64')
+        if len(values) == 0:
+            return {'count': self.count, 'p50': None, 'p99': None}
+        p50, p99 = np.percentile(values, [50, 99]) * scale
+        return {'count': self.count, 'p50': round(float(p50), 3), 'p99': round(float(p99), 3)}
+
+
+class MicroBatcher:
+    """
+    Junta as requisições que chegam dentro de `max_wait_ms` em um único
+    DataFrame e faz uma só chamada vetorizada a `predict(df)`. Cada requisição
+    recebe de volta apenas as suas linhas.
+    """
+
+    def __init__(self, predict, max_wait_ms=MAX_WAIT_MS, max_batch=MAX_BATCH):
+        self.predict = predict
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        self.batch_sizes = RollingStats()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, df):
+        future = Future()
+        self._queue.put((df, future))
+        return future
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        rows = len(pending[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(item)
+            rows += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            frames = [df for df, _ in pending]
+            try:
+                result = self.predict(pd.concat(frames, ignore_index=True))
+            except Exception as error:
+                for _, future in pending:
+                    future.set_exception(error)
+                continue
+            self.batch_sizes.record(len(result))
+            start = 0
+            for df, future in pending:
+                future.set_result(result.iloc[start:start + len(df)])
+                start += len(df)
+
+
+class PredictionService:
+    """Carrega os dois modelos uma única vez e mantém um micro-batcher por endpoint."""
+
+    def __init__(self, models=None, max_wait_ms=MAX_WAIT_MS, max_batch=MAX_BATCH):
+        classifier, regressor = models or load_models()
+        self.batchers = {
+            '/ponto-virada': MicroBatcher(lambda df: predict_ponto_virada(df, classifier), max_wait_ms, max_batch),
+            '/inde': MicroBatcher(lambda df: predict_inde(df, regressor), max_wait_ms, max_batch),
+        }
+        # Colunas (e anos) esperadas por cada endpoint: as do pipeline do modelo publicado
+        self.features = {'/ponto-virada': classifier[1].features, '/inde': regressor[1].features}
+        self.latency = {path: RollingStats() for path in self.batchers}
+
+    def predict(self, path, records):
+        start = time.perf_counter()
+        df = pd.DataFrame.from_records(records)
+        # Valida antes de entrar no lote, para um pedido inválido não derrubar os demais
+        missing = [c for c in self.features[path] if c not in df.columns]
+        if missing:
+            raise KeyError(f'colunas ausentes: {missing}')
+        result = self.batchers[path].submit(df[self.features[path]]).result()
+        self.latency[path].record(time.perf_counter() - start)
+        # NaN não é JSON válido
+        return json.loads(result.to_json(orient='records'))
+
+    def metrics(self):
+        # Latências em milissegundos; lotes em quantidade de alunos por chamada ao modelo
+        return {
+            path: {
+                'latency_ms': self.latency[path].percentiles(scale=1000),
+                'batch_rows': batcher.batch_sizes.percentiles(),
+            }
+            for path, batcher in self.batchers.items()
+        }
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._send(200, service.metrics())
+            elif self.path == '/health':
+                self._send(200, {'status': 'ok'})
+            else:
+                self._send(404, {'erro': 'endpoint não encontrado'})
+
+        def do_POST(self):
+            if self.path not in service.batchers:
+                self._send(404, {'erro': 'endpoint não encontrado'})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                # Aceita um aluno (objeto) ou vários ({"alunos": [...]} ou a lista direto)
+                if isinstance(payload, list):
+                    records = payload
+                else:
+                    records = payload['alunos'] if isinstance(payload, dict) and 'alunos' in payload else [payload]
+                self._send(200, {'previsoes': service.predict(self.path, records)})
+            except (ValueError, KeyError, TypeError) as error:
+                self._send(400, {'erro': str(error.args[0] if error.args else error)})
+
+        def log_message(self, format, *args):
+            # Sem log por requisição: o custo apareceria na latência
+            pass
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=8000, max_wait_ms=MAX_WAIT_MS, max_batch=MAX_BATCH):
+    service = PredictionService(max_wait_ms=max_wait_ms, max_batch=max_batch)
+    server = PredictionServer((host, port), make_handler(service))
+    print(f'Serviço de previsão em http://{host}:{port} (POST /ponto-virada, POST /inde, GET /metrics)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serviço HTTP de previsão de Ponto de Virada e INDE.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS, help='janela para juntar requisições')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help='máximo de alunos por lote')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.max_wait_ms, args.max_batch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from tracing import traced
+
+
+class FeaturePipeline:
+    """
+    Pré-processamento das features de um modelo, salvo junto com ele.
+
+    Apenas as colunas usadas pelo modelo são tratadas: as de texto viram
+    códigos inteiros (categorias em ordem alfabética, aprendidas no treino) e as
+    demais são convertidas para número. Valores ausentes ou categorias que não
+    existiam no treino viram NaN.
+    """
+
+    # Se o modelo aceita linhas com features ausentes
+    allow_missing = False
+
+    def __init__(self, features):
+        self.features = list(features)
+        self.categories = {}
+        self.target_classes = None
+
+    def fit(self, df, target=None):
+        self.categories = {
+            column: sorted(df[column].dropna().unique().tolist())
+            for column in self.features
+            if not pd.api.types.is_numeric_dtype(df[column])
+        }
+        if target is not None and not pd.api.types.is_numeric_dtype(df[target]):
+            self.target_classes = sorted(df[target].dropna().unique().tolist())
+        return self
+
+    def to_dict(self):
+        """Estado aprendido, serializável em JSON (salvo junto com o modelo)."""
+        return {
+            'features': self.features,
+            'categories': self.categories,
+            'target_classes': self.target_classes,
+            'allow_missing': self.allow_missing,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        pipeline = cls(state['features'])
+        pipeline.categories = state['categories']
+        pipeline.target_classes = state['target_classes']
+        pipeline.allow_missing = state['allow_missing']
+        return pipeline
+
+    @traced('feature_transform')
+    def transform(self, df):
+        """Matriz de features (DataFrame float) no formato esperado pelo modelo."""
+        X = pd.DataFrame(index=df.index)
+        for column in self.features:
+            values = df[column]
+            if column in self.categories:
+                codes = pd.Categorical(values, categories=self.categories[column]).codes
+                X[column] = np.where(codes < 0, np.nan, codes)
+            else:
+                X[column] = pd.to_numeric(values, errors='coerce')
+        return X
+
+    def transform_target(self, y):
+        """Target codificado (classes em ordem alfabética) quando ele é texto."""
+        if self.target_classes is None:
+            return pd.to_numeric(y, errors='coerce')
+        codes = pd.Categorical(y, categories=self.target_classes).codes
+        return pd.Series(np.where(codes < 0, np.nan, codes), index=y.index, name=y.name)
+
+    def target_label(self, codes):
+        """Converte códigos do target de volta para os rótulos originais."""
+        if self.target_classes is None:
+            return np.asarray(codes)
+        return np.asarray(self.target_classes, dtype=object)[np.asarray(codes, dtype=int)]
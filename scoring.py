@@ -0,0 +1,179 @@
+import argparse
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from dataset import load_merged
+from model_registry import model_handle
+from panel import PEDRA_LABELS, split_year_column
+from tracing import traced
+from training import (
+    CLASSIFIER_LEGACY_PATH, CLASSIFIER_NAME, REGRESSOR_LEGACY_PATH, REGRESSOR_NAME,
+    classification_data, feature_bounds, prepare_training_frame, regression_data, training_frame,
+)
+
+# Faixas de INDE de cada pedra (o limite superior da última faixa é inclusivo)
+PEDRA_BINS = np.array([2.405, 5.506, 6.868, 8.230, 9.294])
+OUT_OF_RANGE = 'Fora dos intervalos definidos'
+
+# Linhas lidas por vez no modo em lote
+CHUNKSIZE = 10_000
+
+_pedra_lookup = np.array(PEDRA_LABELS + [OUT_OF_RANGE], dtype=object)
+
+# Limites do formulário por versão dos dois modelos
+_bounds = {}
+
+
+def inde_to_pedra(values):
+    """Converte valores de INDE em pedras com uma busca vetorizada nas faixas."""
+    values = np.asarray(values, dtype='float64')
+    index = np.searchsorted(PEDRA_BINS[1:-1], values, side='right')
+    out_of_range = ~((values >= PEDRA_BINS[0]) & (values <= PEDRA_BINS[-1]))
+    index[out_of_range] = len(PEDRA_LABELS)
+    return _pedra_lookup[index]
+
+
+def load_handles():
+    """
+    ModelHandles publicados do classificador e do regressor, em memória e
+    compartilhados pelo processo (ver model_registry.model_handle). Os arquivos
+    legados não têm pipeline salvo: nesse caso ele é reajustado nos dados de
+    treino, o que reproduz a codificação usada quando eles foram gerados, e
+    guardado no próprio handle.
+    """
+    classifier = model_handle(CLASSIFIER_NAME, CLASSIFIER_LEGACY_PATH)
+    regressor = model_handle(REGRESSOR_NAME, REGRESSOR_LEGACY_PATH)
+    if classifier.pipeline is None or regressor.pipeline is None:
+        df = prepare_training_frame(load_merged())
+        classifier.pipeline = classifier.pipeline or classification_data(df)[2]
+        regressor.pipeline = regressor.pipeline or regression_data(df)[2]
+    return classifier, regressor
+
+
+def load_models():
+    """(classificador, pipeline) e (regressor, pipeline) publicados."""
+    classifier, regressor = load_handles()
+    return (classifier.model, classifier.pipeline), (regressor.model, regressor.pipeline)
+
+
+def input_bounds(classifier, regressor):
+    """
+    (mínimo, máximo) de cada campo (sem o ano) entre as features numéricas dos
+    dois modelos, como guardados nos metadados no treino. Modelos sem os
+    limites (legados ou treinados antes deles) usam os limites recalculados nos
+    dados de treino atuais, uma vez por processo.
+    """
+    key = (classifier.key, regressor.key)
+    bounds = _bounds.get(key)
+    if bounds is not None:
+        return bounds
+    stored = [classifier.metadata.get('input_bounds'), regressor.metadata.get('input_bounds')]
+    if None in stored:
+        df = training_frame()
+        X, _, pipeline = classification_data(df)
+        X_regression, _, pipeline_regression = regression_data(df)
+        stored = [feature_bounds(X, pipeline), feature_bounds(X_regression, pipeline_regression)]
+    bounds = {}
+    for column, (low, high) in [item for part in stored for item in part.items()]:
+        field = split_year_column(column)[0]
+        previous = bounds.get(field, (low, high))
+        bounds[field] = (min(previous[0], low), max(previous[1], high))
+    _bounds.clear()
+    _bounds[key] = bounds
+    return bounds
+
+
+def usable_rows(X, pipeline):
+    """Linhas que o modelo consegue pontuar (todas as features, ou ao menos uma se ele trata ausentes)."""
+    present = X.notna()
+    return (present.any(axis=1) if pipeline.allow_missing else present.all(axis=1)).to_numpy()
+
+
+@traced('predict_ponto_virada')
+def predict_ponto_virada(df, classifier):
+    """Probabilidade e previsão de Ponto de Virada; linhas com features ausentes ficam sem previsão."""
+    model, pipeline = classifier
+    X = pipeline.transform(df)
+    valid = usable_rows(X, pipeline)
+    probability = np.full(len(df), np.nan)
+    prediction = np.full(len(df), None, dtype=object)
+    if valid.any():
+        proba = model.predict_proba(X[valid])
+        positive = list(model.classes_).index(pipeline.target_classes.index('Sim'))
+        probability[valid] = proba[:, positive]
+        # Mesma regra do predict do sklearn: classe de maior probabilidade
+        prediction[valid] = pipeline.target_label(model.classes_.take(proba.argmax(axis=1)))
+    return pd.DataFrame({
+        'PROB_PONTO_VIRADA': probability,
+        'PONTO_VIRADA_PREVISTO': prediction,
+    }, index=df.index)
+
+
+@traced('predict_inde')
+def predict_inde(df, regressor):
+    """INDE previsto e a pedra correspondente; linhas com features ausentes ficam sem previsão."""
+    model_regression, pipeline = regressor
+    X = pipeline.transform(df)
+    valid = usable_rows(X, pipeline)
+    inde = np.full(len(df), np.nan)
+    if valid.any():
+        inde[valid] = model_regression.predict(X[valid])
+    return pd.DataFrame({
+        'INDE_PREVISTO': inde,
+        'PEDRA_PREVISTA': np.where(valid, inde_to_pedra(inde), None),
+    }, index=df.index)
+
+
+def score_frame(df, classifier, regressor):
+    """Previsões dos dois modelos para todas as linhas de uma vez."""
+    return pd.concat([predict_ponto_virada(df, classifier), predict_inde(df, regressor)], axis=1)
+
+
+def missing_columns(columns, classifier, regressor):
+    """Features dos dois modelos que não estão em `columns`, na ordem em que os modelos as usam."""
+    present = set(columns)
+    required = dict.fromkeys(classifier[1].features + regressor[1].features)
+    return [column for column in required if column not in present]
+
+
+def score_csv(source, destination, chunksize=CHUNKSIZE, delimiter=',', models=None):
+    """
+    Lê `source` em blocos de `chunksize` linhas, pontua cada bloco e anexa o
+    resultado (colunas de entrada + previsões) em `destination`. A memória usada
+    depende apenas do tamanho do bloco. Retorna a quantidade de linhas pontuadas.
+    Um CSV sem alguma das features dos modelos é recusado com ValueError antes
+    de qualquer previsão (a mensagem lista as colunas ausentes).
+    """
+    classifier, regressor = models or load_models()
+    chunks = iter(pd.read_csv(source, delimiter=delimiter, chunksize=chunksize))
+    first = next(chunks, None)
+    missing = missing_columns([] if first is None else first.columns, classifier, regressor)
+    if missing:
+        raise ValueError(f"colunas ausentes no CSV: {', '.join(missing)}")
+    total = 0
+    with open(destination, 'w', encoding='utf-8', newline='') as out:
+        for chunk in itertools.chain([first], chunks):
+            scored = pd.concat([chunk, score_frame(chunk, classifier, regressor)], axis=1)
+            scored.to_csv(out, index=False, header=(total == 0))
+            total += len(chunk)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Previsão em lote de Ponto de Virada e INDE a partir de um CSV.')
+    parser.add_argument('source', help='CSV de entrada com as colunas do ano base (ex.: *_2021) dos alunos')
+    parser.add_argument('destination', help='CSV de saída com as previsões')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help='linhas processadas por vez')
+    parser.add_argument('--delimiter', default=',', help='delimitador do CSV de entrada')
+    args = parser.parse_args()
+    try:
+        total = score_csv(args.source, args.destination, args.chunksize, args.delimiter)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f'{total} alunos pontuados em {args.destination}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+import argparse
+import html
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+from analysis import (PARAMETERS, correlation_columns, heatmap_figure, heatmap_title, indicator_figure, pedra_counts,
+                      pedra_figure, ponto_virada_counts, ponto_virada_figure, students_figure, students_per_year,
+                      target_top_correlations)
+from dataset import CACHE_ROOT
+from ingestion import indicator_means, pair_years, store_version
+
+# Pacotes estáticos das páginas de análise: .cache/static/<versão>/{index.html, *.html, img/, data/, manifest.json}.
+# Cada pacote é gerado uma vez por versão do armazenamento e pode ser servido por qualquer servidor de arquivos
+BUNDLE_DIR = os.path.join(CACHE_ROOT, 'static')
+
+# Arquivo com o nome do pacote mais recente
+LATEST_FILE = 'LATEST'
+
+# Versão do formato do pacote: mudá-la faz os pacotes antigos serem ignorados
+FORMAT_VERSION = 1
+
+# Nome dos diretórios de pacote (ver bundle_name): só eles são apagados como antigos
+_BUNDLE_NAME = re.compile(r'v\d+-[0-9a-f]{16}')
+
+# Intervalo mínimo entre conferências de um pacote que ainda não existia
+# (um pacote gerado enquanto o app roda passa a ser servido em até esse tempo)
+CHECK_SECONDS = 5.0
+
+# Pacotes já abertos ou procurados: (raiz, versão) -> (Bundle ou None, momento da conferência)
+_bundles = {}
+_lock = threading.Lock()
+
+_STYLE = '''
+body { font-family: sans-serif; max-width: 960px; margin: 2em auto; padding: 0 1em; color: #262730; }
+img { max-width: 100%; }
+table { border-collapse: collapse; margin: 1em 0; }
+th, td { border: 1px solid #ddd; padding: 4px 8px; text-align: right; }
+.caption { color: #808495; font-size: 0.9em; }
+'''
+
+
+def bundle_name(version):
+    return f'v{FORMAT_VERSION}-{version[:16]}'
+
+
+class Bundle:
+    """Pacote gerado para uma versão dos dados: imagens PNG e tabelas por identificador."""
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.figures = manifest['figures']
+        self.tables = manifest['tables']
+        self._content = {}
+
+    @classmethod
+    def open(cls, path):
+        """Pacote em `path`, ou None se ele não existe (ou ainda está sendo gerado)."""
+        try:
+            with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+                return cls(path, json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def _read(self, kind, item, parse):
+        key = (kind, item)
+        content = self._content.get(key)
+        if content is None:
+            files = self.figures if kind == 'figure' else self.tables
+            with open(os.path.join(self.path, files[item]), 'rb') as f:
+                content = parse(f.read())
+            self._content[key] = content
+        return content
+
+    def image(self, figure_id):
+        """Bytes PNG de uma figura do pacote."""
+        return self._read('figure', figure_id, bytes)
+
+    def table(self, table_id):
+        """Tabela do pacote como DataFrame."""
+        return self._read('table', table_id,
+                          lambda data: pd.read_json(io.StringIO(data.decode('utf-8')), orient='table'))
+
+
+def current(root=BUNDLE_DIR):
+    """Pacote da versão atual do armazenamento, ou None se ele ainda não foi gerado."""
+    version = store_version()
+    key = (root, version)
+    entry = _bundles.get(key)
+    if entry is not None and (entry[0] is not None or time.time() - entry[1] < CHECK_SECONDS):
+        return entry[0]
+    bundle = Bundle.open(os.path.join(root, bundle_name(version)))
+    with _lock:
+        for old_key in [k for k in _bundles if k[0] == root and k[1] != version]:
+            del _bundles[old_key]
+        _bundles[key] = (bundle, time.time())
+    return bundle
+
+
+def figure(figure_id, render):
+    """PNG do pacote atual quando ele tem a figura; senão, o de `render()`."""
+    bundle = current()
+    if bundle is not None and figure_id in bundle.figures:
+        return bundle.image(figure_id)
+    return render()
+
+
+def table(table_id, compute):
+    """Tabela do pacote atual quando ele a tem; senão, a de `compute()`."""
+    bundle = current()
+    if bundle is not None and table_id in bundle.tables:
+        return bundle.table(table_id)
+    return compute()
+
+
+# Conteúdo de cada página: (arquivo, título, seções); cada seção é
+# (título, id da figura ou None, PNG, id da tabela ou None, DataFrame)
+def _hello_page(version):
+    return 'index.html', 'Quantidade de Alunos ao Longo do Tempo 📈', [
+        ('Número de Alunos por Ano', 'students_per_year', students_figure(version),
+         'students_per_year', students_per_year()),
+    ]
+
+
+def _indicators_page(version):
+    means = indicator_means(PARAMETERS)
+    means.index = means.index.astype(str)
+    sections = [('Média dos Indicadores por Ano', None, None, 'indicator_means', means)]
+    sections += [(f'Média do {param} por Ano', f'indicator_mean-{param}', indicator_figure(param, version), None, None)
+                 for param in PARAMETERS]
+    sections.append(('Quantidade de alunos em cada Pedra por Ano', 'pedra_counts', pedra_figure(version),
+                     'pedra_counts', pedra_counts()))
+    sections.append(('Quantidade de alunos que atingiram o Ponto de Virada por Ano', 'ponto_virada_counts',
+                     ponto_virada_figure(version), 'ponto_virada_counts', ponto_virada_counts()))
+    return 'indicadores.html', 'Análise de Indicadores Educacionais ✨', sections
+
+
+def _correlation_page(version):
+    pairs = pair_years()
+    sections = []
+    if pairs:
+        year = pairs[-1]
+        for target in correlation_columns(year)[1]:
+            sections.append((heatmap_title(target), f'correlation_heatmap-{target}', heatmap_figure(year, target, version),
+                             f'top_correlations-{target}', target_top_correlations(year, target)))
+    return 'correlacao.html', 'Análise de Fatores Históricos que Influenciam o IPV 📊', sections
+
+
+PAGES = [_hello_page, _indicators_page, _correlation_page]
+
+
+def _html(title, body, version):
+    return f'''<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>{_STYLE}</style>
+</head>
+<body>
+{body}
+<p class="caption">Dados da versão {html.escape(version[:16])}.</p>
+</body>
+</html>
+'''
+
+
+def _write_page(path, filename, title, sections, links, version):
+    body = [links, f'<h1>{html.escape(title)}</h1>']
+    figures, tables = {}, {}
+    for heading, figure_id, image, table_id, frame in sections:
+        body.append(f'<h2>{html.escape(heading)}</h2>')
+        if figure_id is not None:
+            figures[figure_id] = f'img/{figure_id}.png'
+            with open(os.path.join(path, figures[figure_id]), 'wb') as f:
+                f.write(image)
+            body.append(f'<img src="{figures[figure_id]}" alt="{html.escape(heading)}">')
+        if table_id is not None:
+            tables[table_id] = f'data/{table_id}.json'
+            frame.to_json(os.path.join(path, tables[table_id]), orient='table', force_ascii=False, indent=1)
+            body.append(frame.to_html(float_format=lambda value: f'{value:.3f}', na_rep=''))
+            body.append(f'<p class="caption"><a href="{tables[table_id]}">Dados em JSON</a></p>')
+    with open(os.path.join(path, filename), 'w', encoding='utf-8') as f:
+        f.write(_html(title, '\n'.join(body), version))
+    return figures, tables
+
+
+def is_bundle_root(root):
+    """Se `root` pode receber pacotes: ainda não existe, está vazio ou já tem o LATEST de um build anterior."""
+    if not os.path.exists(root):
+        return True
+    return os.path.isdir(root) and (not os.listdir(root) or os.path.isfile(os.path.join(root, LATEST_FILE)))
+
+
+def _remove_stale(root, keep):
+    # Só pacotes antigos: qualquer outro conteúdo da raiz é mantido
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name != keep and _BUNDLE_NAME.fullmatch(name) and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def build(root=BUNDLE_DIR, force=False):
+    """
+    Gera o pacote estático da versão atual do armazenamento: uma página HTML por
+    página de análise, as figuras em PNG e as tabelas em JSON. As figuras vêm do
+    mesmo cache das páginas, então gerar o pacote também aquece o app. Tudo é
+    escrito num diretório temporário renomeado no final; nada é refeito se o
+    pacote desta versão já existe. Retorna (caminho, True se foi gerado agora).
+    Uma raiz com outros arquivos (que não seja de pacotes) é recusada com ValueError.
+    """
+    if not is_bundle_root(root):
+        raise ValueError(f'{root} não está vazio e não é um diretório de pacotes (sem o arquivo {LATEST_FILE})')
+    version = store_version()
+    name = bundle_name(version)
+    path = os.path.join(root, name)
+    if not force and Bundle.open(path) is not None:
+        return path, False
+
+    os.makedirs(root, exist_ok=True)
+    tmp_path = os.path.join(root, f'.{name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    os.makedirs(os.path.join(tmp_path, 'img'))
+    os.makedirs(os.path.join(tmp_path, 'data'))
+    try:
+        contents = [page(version) for page in PAGES]
+        links = '<p>' + ' · '.join(f'<a href="{filename}">{html.escape(title)}</a>'
+                                   for filename, title, _ in contents) + '</p>'
+        manifest = {'version': version, 'format': FORMAT_VERSION, 'built_at': time.time(),
+                    'pages': {}, 'figures': {}, 'tables': {}}
+        for filename, title, sections in contents:
+            figures, tables = _write_page(tmp_path, filename, title, sections, links, version)
+            manifest['pages'][filename] = title
+            manifest['figures'].update(figures)
+            manifest['tables'].update(tables)
+        # O manifesto por último: um pacote sem ele está incompleto e é ignorado
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+    except OSError:
+        # Outro processo publicou o mesmo pacote ao mesmo tempo
+        if Bundle.open(path) is None:
+            raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    latest = os.path.join(root, LATEST_FILE)
+    tmp_latest = f'{latest}.{os.getpid()}.tmp'
+    with open(tmp_latest, 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(tmp_latest, latest)
+    _remove_stale(root, name)
+    with _lock:
+        _bundles.pop((root, version), None)
+    return path, True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Gera o pacote estático (HTML, imagens e JSON) das páginas de análise para a versão atual dos dados.')
+    parser.add_argument('--output', default=BUNDLE_DIR, help=f'diretório raiz dos pacotes (padrão: {BUNDLE_DIR})')
+    parser.add_argument('--force', action='store_true', help='refaz o pacote mesmo que ele já exista')
+    args = parser.parse_args()
+
+    try:
+        path, built = build(args.output, args.force)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f'pacote {"gerado" if built else "já atualizado"} em {path}')
+    print(f'para servir: python -m http.server --directory {path}')
+
+
+if __name__ == '__main__':
+    main()
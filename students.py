@@ -0,0 +1,126 @@
+import bisect
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from panel import ID_COLUMN, split_year_column
+
+# Colunas do dataset mesclado que também identificam o aluno (nome_ajustado fica de fora:
+# é só o número do NOME e colidiria com os IdAluno)
+ALIAS_COLUMNS = ['IdAluno', 'NomeAluno']
+
+# Previsões em lote por versão do índice e dos modelos
+_predictions = {}
+_lock = threading.Lock()
+
+
+def normalize_name(value):
+    """
+    Forma canônica de um nome ou identificador para comparação: sem acentos,
+    minúscula e com qualquer separador virando um espaço ('ALUNO-1' e
+    'Aluno 1' viram 'aluno 1').
+    """
+    text = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^0-9a-z]+', ' ', text.lower()).strip()
+
+
+class StudentIndex:
+    """
+    Índice de alunos sobre o painel (aluno × ano).
+
+    As linhas ficam ordenadas por aluno e ano e um dicionário guarda o intervalo
+    de linhas de cada aluno, então a linha do tempo de um aluno sai com uma
+    busca no dicionário e um recorte, sem percorrer o painel. A busca por
+    prefixo usa uma lista ordenada das chaves normalizadas (NOME e os
+    identificadores do dataset mesclado) e bisseção.
+    """
+
+    def __init__(self, panel, aliases=None, version=None):
+        self.version = version
+        self.frame = panel.sort_values([ID_COLUMN, 'ANO'], kind='stable').reset_index(drop=True)
+        ids = self.frame[ID_COLUMN].to_numpy()
+        starts = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1]])) if len(ids) else np.array([], int)
+        ends = np.append(starts[1:], len(ids))
+        self._spans = dict(zip(ids[starts], zip(starts.tolist(), ends.tolist())))
+
+        # Chave normalizada -> NOME (inclui o próprio NOME)
+        self._keys = {normalize_name(name): name for name in self._spans}
+        if aliases is not None:
+            for column in ALIAS_COLUMNS:
+                if column in aliases.columns:
+                    for name, alias in zip(aliases[ID_COLUMN], aliases[column]):
+                        if name in self._spans and pd.notna(alias):
+                            self._keys.setdefault(normalize_name(alias), name)
+        self._sorted_keys = sorted(self._keys)
+
+    def __len__(self):
+        return len(self._spans)
+
+    def resolve(self, key):
+        """NOME do aluno a partir do NOME ou de um identificador (None se não existir)."""
+        return self._keys.get(normalize_name(key))
+
+    def timeline(self, key):
+        """Todas as linhas (anos) de um aluno, em ordem de ano; vazio se o aluno não existir."""
+        span = self._spans.get(self.resolve(key))
+        if span is None:
+            return self.frame.iloc[0:0]
+        return self.frame.iloc[span[0]:span[1]]
+
+    def row(self, key, year):
+        """Linha do aluno num ano (None se ele não tiver dados naquele ano)."""
+        timeline = self.timeline(key)
+        match = timeline[timeline['ANO'] == year]
+        return None if match.empty else match.iloc[0]
+
+    def search(self, prefix, limit=20):
+        """NOMEs (sem repetição) dos alunos cujo NOME ou identificador começa com `prefix`."""
+        prefix = normalize_name(prefix)
+        found = []
+        position = bisect.bisect_left(self._sorted_keys, prefix)
+        while position < len(self._sorted_keys) and len(found) < limit:
+            key = self._sorted_keys[position]
+            if not key.startswith(prefix):
+                break
+            name = self._keys[key]
+            if name not in found:
+                found.append(name)
+            position += 1
+        return found
+
+    def wide(self, years):
+        """Formato largo (<CAMPO>_<ANO>) dos anos pedidos, uma linha por aluno com dados em algum deles."""
+        frames = []
+        for year in years:
+            part = self.frame[self.frame['ANO'] == year].drop(columns='ANO').set_index(ID_COLUMN)
+            for column in part.columns:
+                if isinstance(part[column].dtype, pd.CategoricalDtype):
+                    part[column] = part[column].astype(object).where(part[column].notna(), None)
+            frames.append(part.add_suffix(f'_{year}'))
+        return pd.concat(frames, axis=1, join='outer')
+
+
+def batch_predictions(index, classifier, regressor, models_key):
+    """
+    Previsões dos dois modelos para todos os alunos do índice, numa única
+    chamada por modelo, calculadas uma vez por versão do índice e dos modelos
+    (`models_key`). Uma linha por aluno (índice = NOME), no ano base dos modelos.
+    """
+    # Importado aqui: o scoring depende do treino, que depende da ingestão, que monta este índice
+    from scoring import score_frame
+
+    key = (index.version, models_key)
+    result = _predictions.get(key)
+    if result is None:
+        with _lock:
+            result = _predictions.get(key)
+            if result is None:
+                years = sorted({split_year_column(c)[1] for c in classifier[1].features + regressor[1].features})
+                frame = index.wide(years)
+                result = score_frame(frame, classifier, regressor)
+                _predictions.clear()
+                _predictions[key] = result
+    return result
@@ -0,0 +1,196 @@
+import argparse
+import os
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+
+from correlation import CorrelationAccumulator
+from dataset import SOURCES, load
+
+# Linhas geradas e gravadas por vez
+CHUNKSIZE = 50_000
+
+# Menor autovalor mantido ao ajustar a matriz de correlação
+MIN_EIGENVALUE = 1e-6
+# Iterações do ajuste para a matriz de correlação válida mais próxima
+NEAREST_ITERATIONS = 200
+
+# Identificadores como 'ALUNO-12' ou 'Aluno 12': prefixo + número sequencial
+SEQUENTIAL_ID = re.compile(r'^(?P<prefix>.*?)(?P<number>\d+)$')
+
+
+def normal_scores(values):
+    """Posto de cada valor convertido para a escala normal padrão (empates recebem o posto médio)."""
+    series = pd.Series(values)
+    ranks = series.rank(method='average')
+    return ndtri(ranks / (series.notna().sum() + 1)).to_numpy()
+
+
+def _clip_eigenvalues(matrix, minimum):
+    eigenvalues, eigenvectors = np.linalg.eigh((matrix + matrix.T) / 2)
+    return eigenvectors @ np.diag(np.clip(eigenvalues, minimum, None)) @ eigenvectors.T
+
+
+def nearest_correlation(matrix, iterations=NEAREST_ITERATIONS, tolerance=1e-7):
+    """
+    Matriz de correlação válida (positiva definida) mais próxima de uma
+    calculada par a par, pelas projeções alternadas de Higham.
+    """
+    target = matrix.copy()
+    correction = np.zeros_like(matrix)
+    for _ in range(iterations):
+        residual = target - correction
+        projected = _clip_eigenvalues(residual, 0.0)
+        correction = projected - residual
+        target = projected.copy()
+        np.fill_diagonal(target, 1.0)
+        if np.linalg.norm(target - projected) < tolerance:
+            break
+    target = _clip_eigenvalues(target, MIN_EIGENVALUE)
+    scale = np.sqrt(np.diag(target))
+    return target / np.outer(scale, scale)
+
+
+class CohortModel:
+    """
+    Modelo generativo de uma fonte de dados (cópula gaussiana).
+
+    Cada coluna guarda sua distribuição marginal (valores observados ou
+    frequências das categorias) e a dependência entre colunas, inclusive entre
+    anos diferentes, fica numa matriz de correlação dos postos em escala normal.
+    Os padrões de valores ausentes são sorteados entre os das linhas reais, o
+    que mantém, por exemplo, alunos que só aparecem em alguns anos.
+    Identificadores únicos (NOME, IdAluno...) viram sequências.
+    """
+
+    def __init__(self, columns, identifiers, marginals, dtypes, correlation, masks):
+        self.columns = columns
+        self.identifiers = identifiers
+        self.marginals = marginals
+        self.dtypes = dtypes
+        self.correlation = correlation
+        self.masks = masks
+        self._cholesky = np.linalg.cholesky(correlation)
+
+    @classmethod
+    def fit(cls, df):
+        columns = list(df.columns)
+        identifiers = {}
+        for column in columns:
+            series = df[column]
+            if series.notna().all() and series.is_unique:
+                match = SEQUENTIAL_ID.match(str(series.iloc[0]))
+                prefix = match.group('prefix') if match and not pd.api.types.is_numeric_dtype(series) else ''
+                identifiers[column] = prefix
+        modeled = [c for c in columns if c not in identifiers]
+
+        scores = np.full((len(df), len(modeled)), np.nan)
+        numeric = [pd.api.types.is_numeric_dtype(df[c]) for c in modeled]
+        for index, column in enumerate(modeled):
+            if numeric[index]:
+                scores[:, index] = normal_scores(df[column])
+        # Categorias ordenadas pelo desempenho médio (escore numérico médio) de quem as tem,
+        # para que, por exemplo, a ordem das pedras acompanhe a do INDE
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            row_score = np.nanmean(scores[:, numeric], axis=1) if any(numeric) else np.zeros(len(df))
+
+        marginals = {}
+        for index, column in enumerate(modeled):
+            series = df[column]
+            if numeric[index]:
+                marginals[column] = ('numeric', np.sort(series.dropna().to_numpy(dtype='float64')))
+                continue
+            order = (pd.DataFrame({'value': series, 'score': row_score}).dropna(subset=['value'])
+                     .groupby('value')['score'].agg(['mean', 'size']).fillna({'mean': 0.0})
+                     .sort_values(['mean', 'size']))
+            categories = order.index.to_numpy(dtype=object)
+            cumulative = np.cumsum(order['size'].to_numpy()) / order['size'].sum()
+            marginals[column] = ('category', categories, cumulative)
+            # Escore de cada categoria: ponto médio do seu intervalo na distribuição acumulada
+            midpoints = pd.Series(cumulative - np.diff(np.concatenate([[0.0], cumulative])) / 2, index=categories)
+            scores[:, index] = ndtri(series.map(midpoints).to_numpy(dtype='float64'))
+
+        correlation = np.nan_to_num(CorrelationAccumulator(modeled).update(scores).matrix().to_numpy())
+        np.fill_diagonal(correlation, 1.0)
+        # Correlações par a par nem sempre formam uma matriz válida
+        correlation = nearest_correlation(correlation)
+
+        dtypes = {column: df[column].dtype for column in columns}
+        masks = df[modeled].isna().to_numpy()
+        return cls(columns, identifiers, marginals, dtypes, correlation, masks)
+
+    def sample(self, rows, rng, start=0):
+        """`rows` linhas sintéticas; os identificadores começam em `start + 1`."""
+        modeled = [c for c in self.columns if c not in self.identifiers]
+        uniform = ndtr(rng.standard_normal((rows, len(modeled))) @ self._cholesky.T)
+        missing = self.masks[rng.integers(len(self.masks), size=rows)]
+        data = {}
+        numbers = np.arange(start + 1, start + rows + 1)
+        for column in self.columns:
+            if column in self.identifiers:
+                prefix = self.identifiers[column]
+                data[column] = numbers if not prefix else pd.Series(numbers).map(f'{prefix}{{}}'.format)
+                continue
+            index = modeled.index(column)
+            marginal = self.marginals[column]
+            if marginal[0] == 'numeric':
+                values = marginal[1]
+                if len(values) == 0:
+                    data[column] = np.full(rows, np.nan)
+                    continue
+                picked = values[np.minimum((uniform[:, index] * len(values)).astype(int), len(values) - 1)]
+                picked[missing[:, index]] = np.nan
+                if pd.api.types.is_integer_dtype(self.dtypes[column]) and not missing[:, index].any():
+                    picked = picked.astype(self.dtypes[column])
+                data[column] = picked
+            else:
+                _, categories, cumulative = marginal
+                position = np.minimum(np.searchsorted(cumulative, uniform[:, index], side='right'),
+                                      len(categories) - 1)
+                picked = categories[position]
+                picked[missing[:, index]] = None
+                data[column] = picked
+        return pd.DataFrame(data, columns=self.columns)
+
+
+def generate(name, rows, destination, chunksize=CHUNKSIZE, seed=None, model=None):
+    """
+    Grava `rows` linhas sintéticas de uma fonte no mesmo formato (colunas,
+    ordem e delimitador) do CSV original. As linhas são geradas e gravadas em
+    blocos, então a memória usada depende só de `chunksize`.
+    """
+    _, delimiter = SOURCES[name]
+    model = model or CohortModel.fit(load(name))
+    rng = np.random.default_rng(seed)
+    tmp_path = f'{destination}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        for start in range(0, rows, chunksize):
+            chunk = model.sample(min(chunksize, rows - start), rng, start)
+            chunk.to_csv(f, sep=delimiter, header=start == 0, index=False)
+    os.replace(tmp_path, destination)
+    return destination
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera datasets sintéticos com o formato dos CSVs do projeto.')
+    parser.add_argument('--rows', type=int, required=True, help='linhas por arquivo')
+    parser.add_argument('--output-dir', required=True,
+                        help='pasta de saída; use PASSOS_DATA_DIR=<pasta> para abrir o app com esses dados')
+    parser.add_argument('--sources', nargs='+', choices=list(SOURCES), default=list(SOURCES))
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name in args.sources:
+        filename, _ = SOURCES[name]
+        path = generate(name, args.rows, os.path.join(args.output_dir, filename), args.chunksize, args.seed)
+        print(f'{name}: {args.rows} linhas em {path}')
+
+
+if __name__ == '__main__':
+    main()
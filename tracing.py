@@ -0,0 +1,163 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+# Com PASSOS_TRACE=1 todas as execuções de página são medidas e gravadas; sem ele,
+# só as sessões que ligarem a opção na barra lateral
+ENABLED = os.environ.get('PASSOS_TRACE') == '1'
+
+# Arquivo de métricas (JSON lines), rotacionado ao passar de MAX_BYTES
+# (caminho montado aqui: o dataset também é medido e não pode ser importado por este módulo)
+METRICS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'metrics', 'spans.jsonl')
+MAX_BYTES = 5 * 2 ** 20
+BACKUPS = 3
+
+# Execução em andamento na thread/contexto atual (cada sessão do Streamlit roda na sua thread)
+_current = contextvars.ContextVar('trace', default=None)
+# Página em execução, conhecida mesmo sem rastreamento (usada no relatório de colunas carregadas)
+_page = contextvars.ContextVar('page', default=None)
+_write_lock = threading.Lock()
+_null = contextlib.nullcontext()
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def rss_bytes():
+    """Memória residente do processo (Linux); fora dele, o pico de memória do processo."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Trace:
+    """Etapas medidas numa execução de página: nome, nível, início, duração e variação de memória."""
+
+    def __init__(self, page):
+        self.page = page
+        self.spans = []
+        self.depth = 0
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.seconds = None
+
+    def as_records(self):
+        base = {'page': self.page, 'run_at': round(self.started_at, 3), 'run_seconds': self.seconds}
+        return [{**base, **span} for span in self.spans]
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'start', 'rss', 'record')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        trace = self.trace
+        # Registrado na entrada para manter a ordem de início entre etapas aninhadas
+        self.record = {'span': self.name, 'depth': trace.depth}
+        trace.spans.append(self.record)
+        trace.depth += 1
+        self.rss = rss_bytes()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        self.trace.depth -= 1
+        self.record.update({
+            'offset_ms': round((self.start - self.trace.started) * 1000, 3),
+            'ms': round(seconds * 1000, 3),
+            'rss_delta_mb': round((rss_bytes() - self.rss) / 2 ** 20, 3),
+        })
+        return False
+
+
+def span(name):
+    """
+    Mede um trecho (`with span('csv_parse'): ...`). Fora de uma execução
+    rastreada devolve um contexto vazio compartilhado: o custo é uma leitura
+    de ContextVar.
+    """
+    trace = _current.get()
+    if trace is None:
+        return _null
+    return _Span(trace, name)
+
+
+def traced(name):
+    """Decorador equivalente a envolver a função inteira em `span(name)`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            with _Span(trace, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_page():
+    """Nome da página em execução (None fora de uma página, ex.: nos scripts de linha de comando)."""
+    return _page.get()
+
+
+@contextlib.contextmanager
+def page(name):
+    """Marca o trecho como execução da página `name`."""
+    token = _page.set(name)
+    try:
+        yield
+    finally:
+        _page.reset(token)
+
+
+def _rotate():
+    for index in range(BACKUPS - 1, 0, -1):
+        source = f'{METRICS_PATH}.{index}'
+        if os.path.exists(source):
+            os.replace(source, f'{METRICS_PATH}.{index + 1}')
+    os.replace(METRICS_PATH, f'{METRICS_PATH}.1')
+
+
+def to_jsonl(trace):
+    """Etapas da execução em JSON lines (o formato do arquivo de métricas)."""
+    return ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in trace.as_records())
+
+
+def write(trace):
+    """Anexa as etapas da execução ao arquivo de métricas, rotacionando-o quando fica grande."""
+    lines = to_jsonl(trace)
+    if not lines:
+        return
+    with _write_lock:
+        os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+        if os.path.exists(METRICS_PATH) and os.path.getsize(METRICS_PATH) + len(lines) > MAX_BYTES:
+            _rotate()
+        with open(METRICS_PATH, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+
+@contextlib.contextmanager
+def trace(page):
+    """Rastreia uma execução de página; as etapas vão para o arquivo de métricas ao final."""
+    current = Trace(page)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+        current.seconds = round(time.perf_counter() - current.started, 4)
+        write(current)
@@ -0,0 +1,385 @@
+import importlib
+import inspect
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+import ingestion
+import jobs
+import model_registry
+import tree_ensemble
+from dataset import load_merged, source_columns
+from panel import ID_COLUMN, detect_years
+from preprocessing import FeaturePipeline
+from tracing import traced
+
+# Campos de performance usados em cada modelo (do ano N) e targets (do ano N+1).
+# Os anos vêm dos dados: o par de anos mais recente do frame de treino
+CLASSIFICATION_FIELDS = ['PEDRA', 'IAA', 'IEG', 'IPS', 'IDA', 'IPP', 'IPV']
+REGRESSION_FIELDS = ['INDE', 'IAA', 'IEG', 'IAN', 'IDA', 'IPP', 'IPV']
+
+CLASSIFICATION_TARGET_FIELD = 'PONTO_VIRADA'
+REGRESSION_TARGET_FIELD = 'INDE'
+
+# Nomes dos modelos no registro
+CLASSIFIER_NAME = 'ponto_virada'
+REGRESSOR_NAME = 'inde'
+
+# Arquivos legados, usados enquanto o registro não tem nenhuma versão publicada
+CLASSIFIER_LEGACY_PATH = 'gradient_boosting_model.pkl'
+REGRESSOR_LEGACY_PATH = 'gradient_boosting_model_regression.pkl'
+
+# Divisão treino/teste usada para as métricas
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+# Motores de treino disponíveis. O histogram-based usa todos os núcleos (OpenMP),
+# trata valores ausentes nativamente e para cedo quando a validação não melhora.
+# Os estimadores são nomes de classes de sklearn.ensemble, importadas só no treino.
+ENGINES = {
+    'gradient_boosting': {
+        'label': 'Gradient Boosting',
+        'classifier': 'GradientBoostingClassifier',
+        'regressor': 'GradientBoostingRegressor',
+        'missing_values': False,
+        'categorical': False,
+        'defaults': {},
+    },
+    'hist_gradient_boosting': {
+        'label': 'Histogram Gradient Boosting',
+        'classifier': 'HistGradientBoostingClassifier',
+        'regressor': 'HistGradientBoostingRegressor',
+        'missing_values': True,
+        'categorical': True,
+        'defaults': {'max_iter': 500, 'early_stopping': True, 'validation_fraction': 0.1, 'n_iter_no_change': 10},
+    },
+}
+DEFAULT_ENGINE = 'gradient_boosting'
+
+# O tracemalloc é global e deixa mais lenta toda alocação do processo (de todas as sessões), então só
+# os treinos da comparação de motores medem memória; com treinos em paralelo, só para quando o último termina
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def year_columns(fields, year):
+    """Colunas <CAMPO>_<ANO> dos campos num ano."""
+    return [f'{field}_{year}' for field in fields]
+
+
+def feature_year(df):
+    """Ano N das features: o par (N → N+1) mais recente com features e target no frame."""
+    return _feature_year(df.columns)
+
+
+def _feature_year(columns):
+    available = set(columns)
+    years = [year for year in detect_years(columns)
+             if set(year_columns(CLASSIFICATION_FIELDS, year)) <= available
+             and f'{CLASSIFICATION_TARGET_FIELD}_{year + 1}' in available]
+    if not years:
+        raise KeyError('o frame não tem features e target de anos consecutivos')
+    return years[-1]
+
+
+def classification_columns(df):
+    """(features, target) do modelo de Ponto de Virada no par de anos do frame."""
+    year = feature_year(df)
+    return year_columns(CLASSIFICATION_FIELDS, year), f'{CLASSIFICATION_TARGET_FIELD}_{year + 1}'
+
+
+def regression_columns(df):
+    """(features, target) do modelo de INDE no par de anos do frame."""
+    year = feature_year(df)
+    return year_columns(REGRESSION_FIELDS, year), f'{REGRESSION_TARGET_FIELD}_{year + 1}'
+
+
+def training_columns(columns):
+    """Colunas lidas para o treino (aluno, features e targets dos dois modelos) entre `columns`."""
+    year = _feature_year(columns)
+    return list(dict.fromkeys(
+        [ID_COLUMN] + year_columns(CLASSIFICATION_FIELDS, year) + year_columns(REGRESSION_FIELDS, year)
+        + [f'{CLASSIFICATION_TARGET_FIELD}_{year + 1}', f'{REGRESSION_TARGET_FIELD}_{year + 1}']
+    ))
+
+
+def prepare_training_frame(df):
+    """Alunos com o target de classificação (o regressor usa o mesmo subconjunto)."""
+    return df.dropna(subset=[classification_columns(df)[1]])
+
+
+def training_frame():
+    """
+    Frame de treino do par de anos mais recente: o dataset mesclado enquanto ele
+    cobre esse par, senão o conjunto (N → N+1) gerado pela ingestão.
+    LookupError se ainda não há dois anos consecutivos armazenados.
+    """
+    pairs = ingestion.pair_years()
+    if not pairs:
+        raise LookupError('nenhum par de anos consecutivos armazenado: o treino precisa de dois anos seguidos')
+    year = pairs[-1]
+    columns = source_columns('merged')
+    if f'{CLASSIFICATION_TARGET_FIELD}_{year + 1}' in columns:
+        # Só as colunas do treino; os tipos ficam como estão (float32 mudaria os modelos e as chaves do registro)
+        return prepare_training_frame(load_merged(training_columns(columns)))
+    return prepare_training_frame(ingestion.training_set(year))
+
+
+def model_data(df, features, target, allow_missing=False):
+    """
+    Ajusta o pré-processamento apenas nas features do modelo e retorna
+    (X, y, pipeline). Linhas sem target são removidas; linhas com features
+    ausentes também, a menos que o motor trate valores ausentes
+    (`allow_missing`), caso em que só saem as linhas sem nenhuma feature.
+    """
+    pipeline = FeaturePipeline(features).fit(df, target)
+    pipeline.allow_missing = allow_missing
+    X = pipeline.transform(df)
+    y = pipeline.transform_target(df[target])
+    present = X.notna().any(axis=1) if allow_missing else X.notna().all(axis=1)
+    valid = present & y.notna()
+    return X[valid], y[valid].astype(int if pipeline.target_classes else float), pipeline
+
+
+def classification_data(df, engine=DEFAULT_ENGINE):
+    """Features, target e pipeline do modelo de Ponto de Virada."""
+    return model_data(df, *classification_columns(df), ENGINES[engine]['missing_values'])
+
+
+def regression_data(df, engine=DEFAULT_ENGINE):
+    """Features, target e pipeline do modelo de INDE."""
+    return model_data(df, *regression_columns(df), ENGINES[engine]['missing_values'])
+
+
+def feature_bounds(X, pipeline):
+    """
+    (mínimo, máximo) de cada feature numérica nos dados de treino, guardados nos
+    metadados do modelo para limitar as entradas sem reler os dados.
+    """
+    numeric = [c for c in X.columns if c not in pipeline.categories]
+    return {column: [float(X[column].min()), float(X[column].max())]
+            for column in numeric if X[column].notna().any()}
+
+
+def build_estimator(engine, task, params, pipeline=None):
+    """Instancia o estimador do motor com os parâmetros padrão do motor e os informados."""
+    spec = ENGINES[engine]
+    params = {**spec['defaults'], **params}
+    if spec['categorical'] and pipeline is not None and pipeline.categories:
+        # Features de texto entram como categóricas nativas (sem ordem entre os códigos)
+        params.setdefault('categorical_features', [c in pipeline.categories for c in pipeline.features])
+    # O scikit-learn só é importado quando um modelo é de fato treinado
+    estimator = getattr(importlib.import_module('sklearn.ensemble'), spec[task])
+    return estimator(random_state=RANDOM_STATE, **params)
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _, peak = tracemalloc.get_traced_memory()
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+    return peak
+
+
+@traced('model_fit')
+def timed_fit(model, X, y, progress=None, measure_memory=False):
+    """
+    Treina medindo o tempo (s) e, com `measure_memory`, o pico de memória
+    alocada (MB) durante o fit (com treinos em paralelo, o pico é o do
+    processo). `progress(etapa, feitas, total)`
+    recebe cada árvore concluída quando o estimador aceita um monitor (Gradient
+    Boosting); nos demais, só o início do treino.
+    """
+    kwargs = {}
+    if progress is not None:
+        progress('treinando')
+        if 'monitor' in inspect.signature(model.fit).parameters:
+            def monitor(i, estimator, _):
+                progress('treinando', i + 1, estimator.n_estimators)
+                return False  # True interromperia o treino
+
+            kwargs['monitor'] = monitor
+    if not measure_memory:
+        start = time.perf_counter()
+        model.fit(X, y, **kwargs)
+        return {'fit_seconds': time.perf_counter() - start}
+    _start_tracemalloc()
+    start = time.perf_counter()
+    try:
+        model.fit(X, y, **kwargs)
+    finally:
+        seconds = time.perf_counter() - start
+        peak = _stop_tracemalloc()
+    return {'fit_seconds': seconds, 'fit_peak_mb': peak / 2 ** 20}
+
+
+def fit_classifier(X, y, params, engine=DEFAULT_ENGINE, pipeline=None, progress=None, measure_memory=False):
+    """Treina o classificador e calcula as métricas no conjunto de teste."""
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+    from sklearn.model_selection import train_test_split
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    model = build_estimator(engine, 'classifier', params, pipeline)
+    cost = timed_fit(model, X_train, y_train, progress, measure_memory)
+    if progress is not None:
+        progress('avaliando')
+
+    y_pred = model.predict(X_test)
+    metrics = {
+        'accuracy': accuracy_score(y_test, y_pred),
+        'precision': precision_score(y_test, y_pred, average='binary', zero_division=1),
+        'recall': recall_score(y_test, y_pred, average='binary', zero_division=1),
+        'f1': f1_score(y_test, y_pred, average='binary', zero_division=1),
+        **cost,
+    }
+    return model, metrics
+
+
+def fit_regressor(X, y, params, engine=DEFAULT_ENGINE, pipeline=None, progress=None, measure_memory=False):
+    """Treina o regressor e calcula as métricas no conjunto de teste."""
+    from sklearn.metrics import mean_absolute_error, r2_score
+    from sklearn.model_selection import train_test_split
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    model = build_estimator(engine, 'regressor', params, pipeline)
+    cost = timed_fit(model, X_train, y_train, progress, measure_memory)
+    if progress is not None:
+        progress('avaliando')
+
+    y_pred = model.predict(X_test)
+    mae = mean_absolute_error(y_test, y_pred)
+    metrics = {
+        'mae': mae,
+        'r2': r2_score(y_test, y_pred),
+        'wape_accuracy': 1 - (mae / y_test.mean()),
+        **cost,
+    }
+    return model, metrics
+
+
+def _registry_key(engine, fit, X, y, params):
+    estimator = f"{engine}:{'classifier' if fit is fit_classifier else 'regressor'}"
+    return model_registry.artifact_key(X, y, X.columns, estimator, params)
+
+
+def train_registered(name, engine, fit, X, y, pipeline, params=None, publish=True, progress=None,
+                     measure_memory=False):
+    """
+    Retorna (modelo, metadados, pipeline) do registro, treinando apenas quando
+    dados, features, motor ou hiperparâmetros mudaram desde o último treino.
+    `progress` acompanha as etapas do treino e `measure_memory` liga a medição
+    do pico de memória (ver timed_fit).
+    """
+    params = params or {}
+    key = _registry_key(engine, fit, X, y, params)
+
+    def train():
+        model, metrics = fit(X, y, params, engine, pipeline, progress, measure_memory)
+        if progress is not None:
+            progress('salvando e publicando')
+        # Versão em arrays para a inferência, só se reproduzir o sklearn nos dados de treino (ver tree_ensemble.verify)
+        return model, {
+            'engine': engine,
+            'estimator': type(model).__name__,
+            'params': params,
+            'features': list(X.columns),
+            'target': y.name,
+            'n_rows': len(X),
+            'metrics': metrics,
+            'input_bounds': feature_bounds(X, pipeline),
+        }, pipeline, tree_ensemble.export(model, X)
+
+    model, metadata, pipeline = model_registry.get_or_train(name, key, train, activate=publish)
+    if 'compiled' not in metadata:
+        # Versão salva antes da exportação para arrays
+        metadata = model_registry.save_compiled(name, key, tree_ensemble.export(model, X), pipeline)
+    if 'input_bounds' not in metadata:
+        # Versão salva antes dos limites das features (os dados de treino são os mesmos: a chave é o hash deles)
+        metadata = model_registry.update_metadata(name, key, input_bounds=feature_bounds(X, pipeline))
+    return model, metadata, pipeline
+
+
+def train_classifier(df, params=None, engine=DEFAULT_ENGINE, publish=True, progress=None):
+    """Classificador de Ponto de Virada a partir do frame preparado."""
+    X, y, pipeline = classification_data(df, engine)
+    return train_registered(CLASSIFIER_NAME, engine, fit_classifier, X, y, pipeline, params, publish, progress)
+
+
+def train_regressor(df, params=None, engine=DEFAULT_ENGINE, publish=True, progress=None):
+    """Regressor de INDE a partir do frame preparado (apenas alunos com os dois targets)."""
+    X, y, pipeline = regression_data(df, engine)
+    return train_registered(REGRESSOR_NAME, engine, fit_regressor, X, y, pipeline, params, publish, progress)
+
+
+# Dados e treino de cada modelo, para os jobs em segundo plano
+TASKS = {
+    CLASSIFIER_NAME: (classification_data, fit_classifier, 'Ponto de Virada'),
+    REGRESSOR_NAME: (regression_data, fit_regressor, 'INDE'),
+}
+
+
+def training_job(name, df, params=None, engine=DEFAULT_ENGINE, publish=True, measure_memory=False):
+    """
+    Treina um modelo em segundo plano (jobs.submit) e retorna o Job, cujo
+    resultado são os metadados da versão. Se a versão já está completa no
+    registro, o job já vem concluído (e a versão é publicada, com `publish`).
+    Pedidos iguais (mesmos dados, motor e hiperparâmetros), de qualquer sessão,
+    compartilham o mesmo job; a publicação só acontece com o artefato gravado.
+    Com `measure_memory`, um treino novo também mede o pico de memória.
+    """
+    data, fit, task = TASKS[name]
+    params = params or {}
+    X, y, pipeline = data(df, engine)
+    key = _registry_key(engine, fit, X, y, params)
+    label = f"{task} ({ENGINES[engine]['label']})"
+    metadata = model_registry.read_metadata(name, key)
+    if metadata is not None and 'compiled' in metadata and 'input_bounds' in metadata:
+        if publish and model_registry.latest_key(name) != key:
+            model_registry.publish(name, key)
+        return jobs.completed((name, key), label, metadata)
+    # Um job já pedido sem publicar não publica; a versão é publicada na próxima chamada, já com o registro completo
+    return jobs.submit((name, key), label, lambda job: train_registered(
+        name, engine, fit, X, y, pipeline, params, publish, job.update, measure_memory)[1])
+
+
+def compare_engines(df):
+    """
+    Tempo de treino, memória e qualidade de cada motor, lado a lado, e os jobs
+    ainda treinando. Os modelos vêm do registro (sem retreinar o que não
+    mudou), são treinados em segundo plano e não são publicados. Só os treinos
+    feitos aqui medem memória: versões treinadas antes, fora da comparação,
+    ficam sem o pico de memória.
+    """
+    rows = []
+    pending = []
+    for engine, spec in ENGINES.items():
+        for name, score in ((CLASSIFIER_NAME, 'accuracy'), (REGRESSOR_NAME, 'wape_accuracy')):
+            job = training_job(name, df, engine=engine, publish=False, measure_memory=True)
+            if job.state != 'done':
+                if not job.finished:
+                    pending.append(job)
+                continue
+            metadata = job.result
+            metrics = metadata['metrics']
+            task = TASKS[name][2]
+            rows.append({
+                'Motor': spec['label'],
+                'Modelo': task,
+                'Linhas': metadata['n_rows'],
+                'Tempo de treino (s)': metrics.get('fit_seconds'),
+                'Pico de memória (MB)': metrics.get('fit_peak_mb'),
+                'Acurácia': metrics[score],
+            })
+    return pd.DataFrame(rows), pending
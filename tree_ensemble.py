@@ -0,0 +1,185 @@
+import numpy as np
+
+# Linhas percorridas por vez (limita a matriz linhas × árvores em memória)
+BLOCK_ROWS = 10_000
+
+# Diferença máxima, em ULPs, entre as probabilidades exportadas e as do sklearn: o exp
+# vetorizado do NumPy difere do da libm (usado pelo scipy.special.expit) em até 1-2 ULPs
+PROBA_ULPS = 4
+
+# Campos gravados no arquivo .npz
+FIELDS = ['feature', 'threshold', 'left', 'right', 'value', 'roots', 'init', 'learning_rate',
+          'classes', 'n_features', 'depth']
+
+
+def _expit(raw):
+    # Overflow do exp vira inf e a probabilidade, 0 (como no scipy.special.expit)
+    with np.errstate(over='ignore'):
+        return 1.0 / (1.0 + np.exp(-raw))
+
+
+def _within_ulps(a, b, scale, ulps=PROBA_ULPS):
+    return a.shape == b.shape and bool(np.all(np.abs(a - b) <= ulps * np.spacing(scale)))
+
+
+class TreeEnsemble:
+    """
+    Gradient Boosting do scikit-learn achatado em arrays do NumPy.
+
+    Os nós de todas as árvores ficam concatenados (feature, limiar, filhos e
+    valor da folha) e `roots` aponta a raiz de cada árvore, na ordem dos
+    estágios. A previsão percorre todas as árvores de um bloco de linhas ao
+    mesmo tempo, um nível por iteração, e soma as folhas estágio a estágio,
+    na mesma ordem de operações do sklearn, para dar exatamente as mesmas
+    previsões sem importar o sklearn nem desserializar objetos (as
+    probabilidades diferem em no máximo PROBA_ULPS, pelo exp do NumPy).
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, init, learning_rate,
+                 classes, n_features, depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.init = init
+        self.learning_rate = learning_rate
+        # Vazio no regressor
+        self.classes_ = classes
+        self.n_features = int(n_features)
+        self.depth = int(depth)
+        # Índices no tipo nativo (evita conversões a cada take) e filhos intercalados
+        # [direito, esquerdo] para escolher o próximo nó com um único take
+        self._feature = feature.astype(np.intp)
+        self._children = np.empty(2 * len(left), dtype=np.intp)
+        self._children[0::2] = right
+        self._children[1::2] = left
+        self._roots = roots.astype(np.intp)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Exporta um GradientBoostingClassifier (binário) ou GradientBoostingRegressor.
+        Outros modelos levantam ValueError.
+        """
+        estimators = getattr(model, 'estimators_', None)
+        classes = getattr(model, 'classes_', None)
+        if estimators is None or estimators.ndim != 2 or estimators.shape[1] != 1:
+            raise ValueError(f'{type(model).__name__} não pode ser exportado')
+        if classes is not None and len(classes) != 2:
+            raise ValueError('apenas classificadores binários podem ser exportados')
+        n_features = model.n_features_in_
+
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for tree in (estimator.tree_ for estimator in estimators[:, 0]):
+            is_leaf = tree.children_left == -1
+            roots.append(offset)
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            # Folhas apontam para elas mesmas, então mais níveis de percurso não as alteram
+            own = np.arange(tree.node_count) + offset
+            left.append(np.where(is_leaf, own, tree.children_left + offset))
+            right.append(np.where(is_leaf, own, tree.children_right + offset))
+            value.append(tree.value[:, 0, 0])
+            offset += tree.node_count
+            depth = max(depth, tree.max_depth)
+
+        # Previsão inicial (prior do modelo), constante para qualquer linha
+        init = model._raw_predict_init(np.zeros((1, n_features), dtype='float32'))[0, 0]
+        return cls(
+            feature=np.concatenate(feature).astype('int32'),
+            threshold=np.concatenate(threshold).astype('float64'),
+            left=np.concatenate(left).astype('int32'),
+            right=np.concatenate(right).astype('int32'),
+            value=np.concatenate(value).astype('float64'),
+            roots=np.asarray(roots, dtype='int32'),
+            init=np.float64(init),
+            learning_rate=np.float64(model.learning_rate),
+            classes=np.asarray(classes) if classes is not None else np.array([], dtype='int64'),
+            n_features=n_features,
+            depth=depth,
+        )
+
+    def save(self, path):
+        """Grava os arrays num .npz (sem pickle)."""
+        arrays = {name: getattr(self, 'classes_' if name == 'classes' else name) for name in FIELDS}
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{name: data[name] for name in FIELDS})
+
+    def _leaves(self, X):
+        # Matriz árvores × linhas: cada estágio fica contíguo na memória para a soma
+        n = len(X)
+        columns = np.ascontiguousarray(X.T).ravel()
+        node = np.repeat(self._roots[:, None], n, axis=1)
+        offsets = np.arange(n)
+        for _ in range(self.depth):
+            x = columns.take(self._feature.take(node) * n + offsets)
+            # Mesma comparação do sklearn: valor float32 promovido a float64 contra o limiar
+            go_left = x <= self.threshold.take(node)
+            node = self._children.take(node * 2 + go_left)
+        return self.value.take(node)
+
+    def decision_function(self, X):
+        """Soma das árvores no espaço do modelo (log-odds no classificador)."""
+        X = np.asarray(X, dtype='float32')
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f'esperadas {self.n_features} features')
+        # Como no sklearn, o Gradient Boosting não aceita valores ausentes
+        if np.isnan(X).any():
+            raise ValueError('X contém valores ausentes (NaN)')
+        raw = np.full(len(X), self.init, dtype='float64')
+        for start in range(0, len(X), BLOCK_ROWS):
+            leaves = self._leaves(X[start:start + BLOCK_ROWS])
+            block = raw[start:start + BLOCK_ROWS]
+            # Um estágio por vez, como o sklearn acumula
+            for stage_values in leaves:
+                block += self.learning_rate * stage_values
+        return raw
+
+    def predict_proba(self, X):
+        positive = _expit(self.decision_function(X))
+        return np.column_stack([1 - positive, positive])
+
+    def predict(self, X):
+        raw = self.decision_function(X)
+        if len(self.classes_) == 0:
+            return raw
+        return self.classes_[(raw >= 0).astype(int)]
+
+
+def verify(model, ensemble, X):
+    """
+    Confere se o modelo exportado dá as mesmas saídas do sklearn em `X`:
+    previsões e decision_function idênticas (no regressor, a previsão já é a
+    soma das árvores) e probabilidades a até PROBA_ULPS (a da classe positiva
+    relativa ao próprio valor; o complemento, 1 - p, relativo a 1).
+    """
+    if not np.array_equal(model.predict(X), ensemble.predict(X)):
+        return False
+    if len(ensemble.classes_):
+        if not np.array_equal(model.decision_function(X), ensemble.decision_function(X)):
+            return False
+        expected, exported = model.predict_proba(X), ensemble.predict_proba(X)
+        return (_within_ulps(expected[:, 1], exported[:, 1], np.maximum(np.abs(expected[:, 1]), np.abs(exported[:, 1])))
+                and _within_ulps(expected[:, 0], exported[:, 0], 1.0))
+    return True
+
+
+def export(model, X):
+    """
+    Versão em arrays de um modelo treinado, ou None se o modelo não puder ser
+    exportado ou se as saídas não baterem com as do sklearn em `X` (ver verify).
+    """
+    try:
+        ensemble = TreeEnsemble.from_sklearn(model)
+    except ValueError:
+        return None
+    return ensemble if verify(model, ensemble, X) else None
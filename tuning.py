@@ -0,0 +1,213 @@
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import model_registry
+from dataset import CACHE_ROOT
+from training import (
+    CLASSIFIER_NAME, DEFAULT_ENGINE, ENGINES, RANDOM_STATE, REGRESSOR_NAME, build_estimator,
+    classification_data, regression_data, train_classifier, train_regressor, training_frame,
+)
+
+# Resultados por (parâmetros, fold), um arquivo JSON lines por tarefa/motor/versão dos dados
+TUNING_DIR = os.path.join(CACHE_ROOT, 'tuning')
+
+FOLDS = 5
+
+# Grades de hiperparâmetros de cada motor
+PARAM_GRIDS = {
+    'gradient_boosting': {
+        'n_estimators': [100, 200, 400],
+        'learning_rate': [0.05, 0.1],
+        'max_depth': [2, 3, 4],
+    },
+    'hist_gradient_boosting': {
+        'learning_rate': [0.05, 0.1],
+        'max_leaf_nodes': [15, 31],
+        'min_samples_leaf': [10, 20],
+        'l2_regularization': [0.0, 1.0],
+    },
+}
+
+# Buscas de cada modelo: dados, treino final e métrica (maior é melhor)
+SEARCHES = {
+    CLASSIFIER_NAME: {'task': 'classifier', 'data': classification_data, 'train': train_classifier,
+                      'metric': 'accuracy'},
+    REGRESSOR_NAME: {'task': 'regressor', 'data': regression_data, 'train': train_regressor,
+                     'metric': 'neg_mae'},
+}
+
+# Estado de cada processo do pool, enviado uma única vez na inicialização
+_worker = {}
+
+
+def params_key(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def _init_worker(X, y, estimator, splits, metric):
+    _worker.update(X=X, y=y, estimator=estimator, splits=splits, metric=metric)
+
+
+def _evaluate(params, fold):
+    # O scikit-learn só é importado quando uma busca roda (a página de treino importa este módulo)
+    from sklearn.base import clone
+    from sklearn.metrics import accuracy_score, mean_absolute_error
+
+    train_index, test_index = _worker['splits'][fold]
+    X, y = _worker['X'], _worker['y']
+    model = clone(_worker['estimator']).set_params(**params)
+    model.fit(X.iloc[train_index], y.iloc[train_index])
+    y_pred = model.predict(X.iloc[test_index])
+    if _worker['metric'] == 'accuracy':
+        score = accuracy_score(y.iloc[test_index], y_pred)
+    else:
+        score = -mean_absolute_error(y.iloc[test_index], y_pred)
+    return params, fold, float(score)
+
+
+def _load_results(path):
+    results = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    # Linha incompleta de uma busca interrompida
+                    continue
+                results[(row['params_key'], row['fold'])] = row
+    return results
+
+
+def expand_grid(grid):
+    """Combinações da grade, na mesma ordem do ParameterGrid do scikit-learn (sem importá-lo)."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _search(df, task, engine, grid, folds):
+    spec = SEARCHES[task]
+    X, y, pipeline = spec['data'](df, engine)
+    candidates = expand_grid(grid or PARAM_GRIDS[engine])
+    data_version = model_registry.artifact_key(X, y, X.columns, f'{engine}:{task}:cv{folds}', {})
+    path = os.path.join(TUNING_DIR, f'{task}-{engine}-{data_version}.jsonl')
+    return spec, X, y, pipeline, candidates, path
+
+
+def _summarize(candidates, results, folds, metric):
+    summary = pd.DataFrame([{'params_key': params_key(p), 'params': p} for p in candidates])
+    scores = {key: [] for key in summary['params_key']}
+    for (key, fold), row in results.items():
+        if key in scores and fold < folds:
+            scores[key].append(row['score'])
+    summary['folds'] = [len(scores[k]) for k in summary['params_key']]
+    summary['mean_score'] = [np.mean(scores[k]) if scores[k] else np.nan for k in summary['params_key']]
+    summary['std_score'] = [np.std(scores[k]) if scores[k] else np.nan for k in summary['params_key']]
+    summary['metric'] = metric
+    return summary.sort_values('mean_score', ascending=False, na_position='last').reset_index(drop=True)
+
+
+def tune(df, task=CLASSIFIER_NAME, engine=DEFAULT_ENGINE, grid=None, folds=FOLDS, workers=None, progress=None):
+    """
+    Busca em grade com validação cruzada k-fold, distribuída em um pool de
+    processos. Cada resultado (parâmetros, fold) é gravado assim que termina,
+    num arquivo por versão dos dados, então uma busca interrompida ou repetida
+    só calcula o que falta. Retorna um DataFrame com a média por combinação,
+    da melhor para a pior.
+    """
+    spec, X, y, pipeline, candidates, path = _search(df, task, engine, grid, folds)
+    os.makedirs(TUNING_DIR, exist_ok=True)
+    results = _load_results(path)
+
+    pending = [(params, fold) for params in candidates for fold in range(folds)
+               if (params_key(params), fold) not in results]
+    if pending:
+        from sklearn.model_selection import KFold, StratifiedKFold
+
+        splitter = (StratifiedKFold if spec['task'] == 'classifier' else KFold)(
+            n_splits=folds, shuffle=True, random_state=RANDOM_STATE)
+        splits = list(splitter.split(X, y))
+        estimator = build_estimator(engine, spec['task'], {}, pipeline)
+        # 'spawn' evita herdar threads do servidor do Streamlit no fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(X, y, estimator, splits, spec['metric'])) as pool, \
+                open(path, 'a', encoding='utf-8') as out:
+            futures = [pool.submit(_evaluate, params, fold) for params, fold in pending]
+            for done, future in enumerate(as_completed(futures), start=1):
+                params, fold, score = future.result()
+                row = {'params_key': params_key(params), 'params': params, 'fold': fold, 'score': score}
+                out.write(json.dumps(row) + '\n')
+                out.flush()
+                results[(row['params_key'], fold)] = row
+                if progress is not None:
+                    progress(done, len(pending))
+
+    return _summarize(candidates, results, folds, spec['metric'])
+
+
+def tuning_record(summary, folds):
+    """Resumo da busca guardado nos metadados do modelo treinado com a melhor configuração."""
+    best = summary.iloc[0]
+    return {'folds': folds, 'metric': best['metric'], 'mean_score': float(best['mean_score']),
+            'std_score': float(best['std_score']), 'candidates': len(summary)}
+
+
+def best_tuning(df, task=CLASSIFIER_NAME, engine=DEFAULT_ENGINE, grid=None, folds=FOLDS):
+    """
+    (melhor configuração, resumo da busca) de uma busca já concluída para estes
+    dados, sem calcular nada; None se a busca ainda não foi feita (ou está incompleta).
+    """
+    spec, _, _, _, candidates, path = _search(df, task, engine, grid, folds)
+    summary = _summarize(candidates, _load_results(path), folds, spec['metric'])
+    if (summary['folds'] < folds).any():
+        return None
+    return summary.iloc[0]['params'], tuning_record(summary, folds)
+
+
+def best_params(df, task=CLASSIFIER_NAME, engine=DEFAULT_ENGINE, grid=None, folds=FOLDS):
+    """Melhor configuração de uma busca já concluída (ver best_tuning); None se não houve busca."""
+    best = best_tuning(df, task, engine, grid, folds)
+    return best[0] if best is not None else None
+
+
+def tune_and_publish(df, task=CLASSIFIER_NAME, engine=DEFAULT_ENGINE, folds=FOLDS, workers=None, progress=None):
+    """
+    Executa a busca e publica no registro o modelo treinado com a melhor
+    configuração; os metadados da versão guardam o resumo da busca (inclusive
+    o número de folds), que a página de treino mostra.
+    """
+    summary = tune(df, task, engine, folds=folds, workers=workers, progress=progress)
+    best = summary.iloc[0]['params']
+    _, metadata, _ = SEARCHES[task]['train'](df, params=best, engine=engine, publish=False)
+    metadata = model_registry.update_metadata(task, metadata['key'], tuning=tuning_record(summary, folds))
+    model_registry.publish(task, metadata['key'])
+    return summary, metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Busca de hiperparâmetros com validação cruzada.')
+    parser.add_argument('--task', choices=list(SEARCHES), default=CLASSIFIER_NAME)
+    parser.add_argument('--engine', choices=list(ENGINES), default=DEFAULT_ENGINE)
+    parser.add_argument('--folds', type=int, default=FOLDS)
+    parser.add_argument('--workers', type=int, default=None, help='processos no pool (padrão: núcleos da máquina)')
+    args = parser.parse_args()
+
+    df = training_frame()
+    summary, metadata = tune_and_publish(df, args.task, args.engine, args.folds, args.workers,
+                                         progress=lambda done, total: print(f'\r{done}/{total}', end='', flush=True))
+    print()
+    print(summary[['params', 'mean_score', 'std_score']].head(10).to_string())
+    print(f"Modelo publicado: {metadata['key']} ({metadata['params']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -15,8 +15,12 @@
 import inspect
 import textwrap
 
+import pandas as pd
 import streamlit as st
 
+import tracing
+from dataset import usage_report
+
 
 def show_code(demo):
     """Showing the code of the demo."""
@@ -26,3 +30,39 @@ def show_code(demo):
         st.markdown("## Code")
         sourcelines, _ = inspect.getsourcelines(demo)
         st.code(textwrap.dedent("".join(sourcelines[1:])))
+
+
+def run_traced(run, page):
+    """
+    Executa a página. Com a opção da barra lateral ligada (ou PASSOS_TRACE=1),
+    mede cada etapa desta execução, grava as medidas no arquivo de métricas e
+    mostra na barra lateral o detalhamento e as colunas carregadas pela página.
+    """
+    show = st.sidebar.checkbox('Mostrar tempos desta execução', value=False)
+    with tracing.page(page):
+        if not (show or tracing.ENABLED):
+            return run()
+        with tracing.trace(page) as current:
+            run()
+    if show:
+        st.sidebar.markdown(f"**Tempos desta execução:** {current.seconds * 1000:.0f} ms")
+        spans = pd.DataFrame([{
+            'Etapa': '\u2003' * span['depth'] + span['span'],
+            'ms': span.get('ms'),
+            'Memória (MB)': span.get('rss_delta_mb'),
+        } for span in current.spans])
+        if spans.empty:
+            st.sidebar.caption('Nenhuma etapa medida: tudo veio dos caches.')
+        else:
+            st.sidebar.dataframe(spans, hide_index=True)
+            st.sidebar.download_button('Exportar tempos (JSON lines)', tracing.to_jsonl(current),
+                                       file_name=f'tempos-{page}.jsonl', mime='application/jsonl')
+
+        # Projeção de colunas: o que a página leu e quanto deixou de ler/ocupar neste processo
+        usage = usage_report(page)
+        if not usage.empty:
+            st.sidebar.markdown("**Colunas carregadas pela página**")
+            st.sidebar.dataframe(usage.drop(columns='page').rename(columns={
+                'source': 'Fonte', 'columns': 'Colunas', 'read_mb': 'Lidos (MB)', 'skipped_mb': 'Evitados (MB)',
+                'memory_mb': 'Memória (MB)', 'compact_saved_mb': 'Economia dos tipos (MB)',
+            }), hide_index=True)
@@ -0,0 +1,117 @@
+import collections
+import threading
+
+import numpy as np
+import pandas as pd
+
+from panel import split_year_column
+from scoring import PEDRA_BINS, PEDRA_LABELS, score_frame
+
+# Pontos por eixo: uma curva de 1001 pontos ou uma grade de 64 × 64 (4096 alunos simulados)
+POINTS = {1: 1001, 2: 64}
+
+# Grades mantidas em memória (as menos usadas saem primeiro)
+MAX_ENTRIES = 64
+
+_grids = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+class SensitivityGrid:
+    """
+    Previsões dos dois modelos numa grade densa sobre um ou dois indicadores,
+    com os demais campos fixos nos valores do aluno. A grade inteira (mais o
+    ponto do próprio aluno) é pontuada numa única chamada por modelo.
+
+    `probability` e `inde` têm uma dimensão por indicador variado (na ordem de
+    `fields`); `axes` traz os valores de cada eixo. `key` identifica a entrada
+    (modelos, aluno, indicadores e limites).
+    """
+
+    def __init__(self, classifier, regressor, base, fields, bounds, points=None, key=None):
+        self.key = key
+        self.fields = list(fields)
+        self.base = dict(base)
+        points = points or POINTS[len(self.fields)]
+        # O valor atual do aluno entra em cada eixo: mudanças só num dos indicadores também são pontos da grade
+        self.axes = [np.union1d(np.linspace(bounds[field][0], bounds[field][1], points),
+                                np.clip(float(self.base[field]), *bounds[field]))
+                     for field in self.fields]
+        self.ranges = {field: bounds[field][1] - bounds[field][0] for field in self.fields}
+        mesh = np.meshgrid(*self.axes, indexing='ij')
+        shape = mesh[0].shape
+
+        # Linha 0: o aluno como está; depois, a grade achatada
+        varied = dict(zip(self.fields, mesh))
+        frame = {}
+        for column in dict.fromkeys(classifier[1].features + regressor[1].features):
+            field = split_year_column(column)[0]
+            if field in varied:
+                frame[column] = np.concatenate([[float(self.base[field])], varied[field].ravel()])
+            else:
+                frame[column] = np.repeat(self.base[field], mesh[0].size + 1)
+        scored = score_frame(pd.DataFrame(frame), classifier, regressor)
+
+        self.current = scored.iloc[0]
+        self.probability = scored['PROB_PONTO_VIRADA'].to_numpy()[1:].reshape(shape)
+        self.inde = scored['INDE_PREVISTO'].to_numpy()[1:].reshape(shape)
+        self.ponto_virada = (scored['PONTO_VIRADA_PREVISTO'].to_numpy()[1:] == 'Sim').reshape(shape)
+        self._mesh = mesh
+
+    def minimal_change(self, reached):
+        """
+        Ponto da grade que atende `reached` (máscara no formato da grade) com a
+        menor mudança em relação ao aluno, somando as mudanças de cada
+        indicador como fração da sua faixa. Retorna {indicador: (valor, variação)}
+        ou None se nenhum ponto da grade atende.
+        """
+        if not reached.any():
+            return None
+        distance = sum(np.abs(values - float(self.base[field])) / (self.ranges[field] or 1.0)
+                       for field, values in zip(self.fields, self._mesh))
+        best = np.unravel_index(np.argmin(np.where(reached, distance, np.inf)), reached.shape)
+        return {field: (float(values[best]), float(values[best]) - float(self.base[field]))
+                for field, values in zip(self.fields, self._mesh)}
+
+    def to_ponto_virada(self):
+        """Menor mudança para o classificador prever Ponto de Virada (None se não há)."""
+        return self.minimal_change(self.ponto_virada)
+
+    def next_pedra(self):
+        """Pedra acima da prevista hoje e o INDE que ela exige (None se já está na mais alta ou fora das faixas)."""
+        inde = self.current['INDE_PREVISTO']
+        if pd.isna(inde) or self.current['PEDRA_PREVISTA'] not in PEDRA_LABELS:
+            return None
+        index = PEDRA_LABELS.index(self.current['PEDRA_PREVISTA'])
+        if index + 1 >= len(PEDRA_LABELS):
+            return None
+        return PEDRA_LABELS[index + 1], float(PEDRA_BINS[index + 1])
+
+    def to_next_pedra(self):
+        """Menor mudança para o INDE previsto alcançar a pedra seguinte (None se não há)."""
+        target = self.next_pedra()
+        if target is None:
+            return None
+        return self.minimal_change(self.inde >= target[1])
+
+
+def sensitivity(classifier, regressor, base, fields, bounds, models_key, points=None):
+    """
+    SensitivityGrid calculada uma vez por combinação de modelos (`models_key`),
+    valores do aluno, indicadores variados e limites, e compartilhada entre as
+    sessões.
+    """
+    key = (models_key, tuple(fields), points,
+           tuple(sorted((field, str(value)) for field, value in base.items())),
+           tuple(tuple(bounds[field]) for field in fields))
+    with _lock:
+        grid = _grids.get(key)
+        if grid is not None:
+            _grids.move_to_end(key)
+            return grid
+    grid = SensitivityGrid(classifier, regressor, base, fields, bounds, points, key)
+    with _lock:
+        _grids[key] = grid
+        while len(_grids) > MAX_ENTRIES:
+            _grids.popitem(last=False)
+    return grid